@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import threading
+import time
+import tracemalloc
+
+from roomba import RoombaWorld
+import protocolo
+import servidor
+from replicacion import EstadoReplicado, ReplicadorCliente
+from salas import GestorSalas
+from snapshots import Snapshot
+
+# ---------------------------
+# Funciones auxiliares
+# ---------------------------
+
+def resumen(muestras):
+    """Mediana, p99 y media (en ms) de una lista de duraciones en segundos."""
+    ordenadas = sorted(muestras)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(round(0.99 * (len(ordenadas) - 1))))]
+    return {
+        "n": len(ordenadas),
+        "mediana_ms": statistics.median(ordenadas) * 1000,
+        "p99_ms": p99 * 1000,
+        "media_ms": statistics.fmean(ordenadas) * 1000,
+    }
+
+def poblar(world, n):
+    """Inserta `n` personas en posiciones aleatorias repartidas entre las zonas (en un solo lote)."""
+    zonas = list(world.zone_rects.items())
+    xs, ys, nombres = [], [], []
+    for i in range(n):
+        zona, (x0, y0, w, h) = zonas[i % len(zonas)]
+        xs.append(world.rng.randint(x0, x0 + w))
+        ys.append(world.rng.randint(y0, y0 + h))
+        nombres.append(zona)
+    world.particulas.insertar_lote(xs, ys, nombres)
+    world.publicar()
+
+def crear_mundo(n_particulas, n_mosquitos=1):
+    world = RoombaWorld(window_size=(600, 600), seed=1234, verbose=False, n_mosquitos=n_mosquitos)
+    poblar(world, n_particulas)
+    return world
+
+def medir_asignaciones(funcion, repeticiones, preparar=None):
+    """
+    Pico medio de memoria asignada (KiB) por llamada, medido con tracemalloc.
+    `preparar`, si se indica, se llama antes de cada una, fuera de la medida.
+    """
+    tracemalloc.start()
+    picos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        funcion()
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return statistics.fmean(picos) / 1024
+
+def servidor_en_hilo(world, puerto):
+    """
+    Ejecuta servidor.servidor_async sobre `world` en 127.0.0.1:`puerto`, en un
+    hilo con su propio bucle de asyncio. Devuelve una función que lo detiene:
+    cancela el servidor y las tareas que queden (conexiones, difusor), cierra
+    el bucle y espera al hilo.
+    """
+    bucle = asyncio.new_event_loop()
+    tarea = bucle.create_task(servidor.servidor_async(
+        {servidor.SALA_POR_DEFECTO: world}, "127.0.0.1", puerto, 1024))
+
+    def ejecutar():
+        asyncio.set_event_loop(bucle)
+        try:
+            bucle.run_until_complete(tarea)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            pendientes = asyncio.all_tasks(bucle)
+            for pendiente in pendientes:
+                pendiente.cancel()
+            bucle.run_until_complete(asyncio.gather(*pendientes, return_exceptions=True))
+            bucle.close()
+
+    hilo = threading.Thread(target=ejecutar, name="servidor")
+    hilo.start()
+
+    def detener():
+        bucle.call_soon_threadsafe(tarea.cancel)
+        hilo.join()
+
+    return detener
+
+def puerto_libre():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ==============================================================
+# BENCHMARKS
+# ==============================================================
+
+def bench_tick(n_particulas, ticks, n_mosquitos=1):
+    """
+    Duración de RoombaWorld.step() con `n_particulas` personas y `n_mosquitos`
+    mosquitos en el mundo. Antes de cada tick, fuera de la medida, se repone
+    la gente picada en el anterior, para que todos se midan con la misma
+    población (con muchos mosquitos el mundo se vaciaría en pocos ticks);
+    "repuestas_por_tick" dice cuántas se reponen de media.
+    """
+    world = crear_mundo(n_particulas, n_mosquitos)
+    repuestas = 0
+
+    def reponer():
+        nonlocal repuestas
+        falta = max(0, n_particulas - len(world.particulas))
+        repuestas += falta
+        poblar(world, falta)
+
+    muestras = []
+    for _ in range(ticks):
+        reponer()
+        t0 = time.perf_counter()
+        world.step()
+        muestras.append(time.perf_counter() - t0)
+    resultado = resumen(muestras)
+    resultado["ticks_por_s"] = 1000 / resultado["mediana_ms"] if resultado["mediana_ms"] else float('inf')
+    resultado["repuestas_por_tick"] = repuestas / ticks
+    resultado["asignado_kib_por_tick"] = medir_asignaciones(world.step, min(ticks, 200), reponer)
+    resultado["particulas_final"] = len(world.particulas)
+    return resultado
+
+def bench_codificacion(n_particulas, repeticiones, binario=False):
+    """
+    Tiempo y tamaño de la codificación del estado que envía servidor.py,
+    en JSON (protocolo v1) o en tramas binarias (protocolo v2).
+    """
+    world = crear_mundo(n_particulas)
+
+    def codificar():
+        # Snapshot nuevo en cada repetición para medir captura + codificación
+        snapshot = Snapshot(world)
+        return snapshot.binario() if binario else snapshot.json()
+
+    muestras = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        mensaje = codificar()
+        muestras.append(time.perf_counter() - t0)
+    resultado = resumen(muestras)
+    resultado["bytes"] = len(mensaje)
+    resultado["asignado_kib"] = medir_asignaciones(codificar, min(repeticiones, 50))
+    return resultado
+
+def bench_delta(n_particulas, repeticiones):
+    """
+    Tiempo y tamaño de un delta de un tick (protocolo v3) para un cliente
+    que confirma cada estado recibido.
+    """
+    world = crear_mundo(n_particulas)
+    replicador = ReplicadorCliente(intervalo_clave=10 ** 9)
+    replicador.siguiente_trama(world.snapshot)
+    muestras, tamaños = [], []
+    for _ in range(repeticiones):
+        replicador.confirmar(world.seq)
+        world.step()
+        t0 = time.perf_counter()
+        mensaje = replicador.siguiente_trama(world.snapshot)
+        muestras.append(time.perf_counter() - t0)
+        tamaños.append(len(mensaje))
+    resultado = resumen(muestras)
+    resultado["bytes_medio"] = statistics.fmean(tamaños)
+    return resultado
+
+def bench_lock(n_particulas, duracion):
+    """
+    Contención de world.lock (medida por LockInstrumentado) con el hilo de
+    simulación en tiempo real y un hilo lector que toma el snapshot publicado
+    y lo codifica continuamente, como hace el servidor.
+    """
+    world = crear_mundo(n_particulas)
+    parar = threading.Event()
+    lectura = []
+
+    def lector():
+        while not parar.is_set():
+            t0 = time.perf_counter()
+            world.snapshot.binario()
+            lectura.append(time.perf_counter() - t0)
+            time.sleep(0.005)
+
+    simulacion = threading.Thread(target=world.mover_mosquito)
+    hilo_lector = threading.Thread(target=lector)
+    simulacion.start()
+    hilo_lector.start()
+    time.sleep(duracion)
+    parar.set()
+    world.mosquito_stop_event.set()
+    simulacion.join()
+    hilo_lector.join()
+    return {
+        "lock": world.lock.estadisticas(),
+        "lectura_snapshot": resumen(lectura),
+    }
+
+def bench_render(n_particulas, frames):
+    """
+    Duración de RoombaRenderer.dibujar() sin ventana (drivers "dummy" de SDL),
+    con el jugador moviéndose y el mundo avanzando un tick cada 3 frames.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from renderizador import RoombaRenderer
+    world = crear_mundo(n_particulas)
+    renderer = RoombaRenderer(world)
+    player_pos = [100, 100]
+    muestras = []
+
+    def frame(i):
+        if i % 3 == 0:
+            world.step()
+        player_pos[0] = 100 + i % 50
+        renderer.dibujar(player_pos)
+
+    for i in range(frames):
+        t0 = time.perf_counter()
+        frame(i)
+        muestras.append(time.perf_counter() - t0)
+    resultado = resumen(muestras)
+    contador = iter(range(frames, 2 * frames))
+    resultado["asignado_kib_por_frame"] = medir_asignaciones(lambda: frame(next(contador)), min(frames, 20))
+    return resultado
+
+def bench_servidor(n_clientes, n_particulas, duracion, version=protocolo.VERSION):
+    """
+    Tasa de estados y de bytes recibidos de extremo a extremo con `n_clientes`
+    conexiones locales (protocolo `version`) contra un servidor real en un
+    puerto libre, que se detiene al terminar.
+    """
+    world = crear_mundo(n_particulas)
+    puerto = puerto_libre()
+    simulacion = threading.Thread(target=world.mover_mosquito)
+    simulacion.start()
+    detener_servidor = servidor_en_hilo(world, puerto)
+    time.sleep(0.2)
+
+    recibidos = [0] * n_clientes
+    bytes_recibidos = [0] * n_clientes
+    parar = threading.Event()
+
+    def cliente(i):
+        s = socket.create_connection(("127.0.0.1", puerto))
+        s.sendall(b"ROOMBA %d\n" % version)
+        s.settimeout(0.5)
+        decodificador = protocolo.DecodificadorTramas()
+        replica = EstadoReplicado()
+        try:
+            while not parar.is_set():
+                try:
+                    data = s.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                bytes_recibidos[i] += len(data)
+                for tipo, cuerpo in decodificador.alimentar(data):
+                    if tipo == protocolo.TIPO_ESTADO or replica.aplicar(tipo, cuerpo):
+                        recibidos[i] += 1
+                if version >= 3 and replica.seq is not None:
+                    s.sendall(protocolo.codificar_ack(replica.seq))
+        finally:
+            s.close()
+
+    hilos = [threading.Thread(target=cliente, args=(i,), daemon=True) for i in range(n_clientes)]
+    for h in hilos:
+        h.start()
+    time.sleep(duracion)
+    parar.set()
+    for h in hilos:
+        h.join(timeout=2)
+    detener_servidor()
+    world.mosquito_stop_event.set()
+    simulacion.join()
+    tasas = sorted(r / duracion for r in recibidos)
+    return {
+        "clientes": n_clientes,
+        "snapshots_por_s_total": sum(tasas),
+        "snapshots_por_s_mediana": statistics.median(tasas),
+        "snapshots_por_s_min": tasas[0],
+        "bytes_por_s_mediana": statistics.median(bytes_recibidos) / duracion,
+    }
+
+def bench_salas(n_salas, n_procesos, duracion):
+    """
+    Ticks por segundo (sumados entre todas las salas) que llegan al proceso
+    principal con `n_salas` salas repartidas entre `n_procesos` procesos.
+    Cada sala intenta avanzar a 1/dt ticks por segundo.
+    """
+    gestor = GestorSalas(n_salas, n_procesos, window_size=(600, 600))
+    gestor.iniciar()
+
+    async def medir():
+        gestor.conectar(asyncio.get_running_loop())
+        inicio = sum(sala.seq for sala in gestor.salas.values())
+        await asyncio.sleep(duracion)
+        return sum(sala.seq for sala in gestor.salas.values()) - inicio
+
+    try:
+        ticks = asyncio.run(medir())
+    finally:
+        gestor.detener()
+    return {
+        "salas": n_salas,
+        "procesos": gestor.n_procesos,
+        "ticks_por_s_total": ticks / duracion,
+        "fraccion_del_ideal": ticks * gestor.dt / (duracion * n_salas),
+    }
+
+# ==============================================================
+# COMPARACIÓN DE RESULTADOS
+# ==============================================================
+
+def aplanar(datos, prefijo=""):
+    plano = {}
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}{clave}"
+        if isinstance(valor, dict):
+            plano.update(aplanar(valor, nombre + "."))
+        elif isinstance(valor, (int, float)):
+            plano[nombre] = valor
+    return plano
+
+def comparar(ruta_base, ruta_nueva):
+    """Muestra, métrica a métrica, el valor de dos ejecuciones y su cociente."""
+    with open(ruta_base) as f:
+        base = aplanar(json.load(f)["resultados"])
+    with open(ruta_nueva) as f:
+        nueva = aplanar(json.load(f)["resultados"])
+    for clave in sorted(set(base) | set(nueva)):
+        a, b = base.get(clave), nueva.get(clave)
+        if a is None or b is None:
+            print(f"{clave:60s} {a!s:>12} {b!s:>12}")
+            continue
+        cociente = f"x{b / a:.2f}" if a else "-"
+        print(f"{clave:60s} {a:12.4g} {b:12.4g} {cociente:>8}")
+
+# ==============================================================
+# FUNCION MAIN
+# ==============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la simulación y del servidor.")
+    parser.add_argument("--particulas", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--mosquitos", type=int, nargs="+", default=[10, 100],
+                        help="mosquitos por mundo para las pruebas de tick con enjambre")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--salas", type=int, default=64, help="salas para la prueba de procesos")
+    parser.add_argument("--duracion", type=float, default=3.0, help="segundos por prueba con hilos")
+    parser.add_argument("--salida", default="bench_resultados.json")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"),
+                        help="compara dos ficheros de resultados en lugar de medir")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    resultados = {}
+    for n in args.particulas:
+        print(f"Tick con {n} partículas...")
+        resultados[f"tick.{n}"] = bench_tick(n, args.ticks)
+        for m in args.mosquitos:
+            print(f"Tick con {n} partículas y {m} mosquitos...")
+            resultados[f"tick_mosquitos.{n}.{m}"] = bench_tick(n, args.ticks, m)
+        print(f"Codificación con {n} partículas...")
+        resultados[f"codificacion.{n}"] = bench_codificacion(n, max(10, args.ticks // 10))
+        resultados[f"codificacion_binaria.{n}"] = bench_codificacion(n, max(10, args.ticks // 10), binario=True)
+        resultados[f"codificacion_delta.{n}"] = bench_delta(n, max(10, args.ticks // 10))
+    for n in args.particulas:
+        print(f"Render con {n} partículas...")
+        resultados[f"render.{n}"] = bench_render(n, max(10, args.ticks // 10))
+    n_lock = args.particulas[len(args.particulas) // 2]
+    print(f"Lock con {n_lock} partículas...")
+    resultados[f"lock.{n_lock}"] = bench_lock(n_lock, args.duracion)
+    for c in args.clientes:
+        print(f"Servidor con {c} clientes...")
+        for version in (2, 3):
+            resultados[f"servidor.v{version}.{c}"] = bench_servidor(c, 1000, args.duracion, version)
+
+    for procesos in sorted({1, os.cpu_count() or 1}):
+        print(f"{args.salas} salas en {procesos} proceso(s)...")
+        resultados[f"salas.{args.salas}.p{procesos}"] = bench_salas(args.salas, procesos, args.duracion)
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+    with open(args.salida, "w") as f:
+        json.dump(informe, f, indent=2)
+    for clave, valor in aplanar(resultados).items():
+        print(f"{clave:60s} {valor:12.4g}")
+    print(f"Resultados guardados en {args.salida}")
+
+if __name__ == '__main__':
+    main()
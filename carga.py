@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import numpy as np
+import protocolo
+from red_cliente import ReceptorEstado
+
+# ==============================================================
+# GENERADOR DE CARGA (BOTS SIN INTERFAZ CONTRA servidor.py)
+# ==============================================================
+#
+# Cada bot es una conexión v3 que recibe y aplica el estado igual que
+# cliente.py (ReceptorEstado), confirma cada tick y envía entradas con un
+# guion fijo: recorre un cuadrado con "MOVE" numerados con "SEQ" y pide un
+# "SQUASH" de vez en cuando. Por cada estado recibido se mide:
+#
+#   entre_llegadas  tiempo desde el estado anterior
+#   jitter          |entre_llegadas - periodo esperado| (1 / frecuencia pedida)
+#   decodificacion  tiempo de decodificar y aplicar la lectura
+#   latencia        llegada - instante de publicación del snapshot en el
+#                   servidor (cola de la trama); sólo tiene sentido si el
+#                   reloj de los bots es el del servidor (mismo equipo o NTP)
+#
+# Los bots se reparten entre --procesos procesos, cada uno con su bucle de
+# asyncio, para que el propio generador no sea el cuello de botella; al
+# final se juntan las muestras y se informa de sus percentiles en ms.
+
+PERCENTILES = (50, 90, 99, 99.9)
+# Guion de movimiento: pasos en cada dirección antes de girar
+_GUION = ("MOVE RIGHT",) * 20 + ("MOVE DOWN",) * 20 + ("MOVE LEFT",) * 20 + ("MOVE UP",) * 20
+
+def percentiles(muestras):
+    """Número de muestras, percentiles de PERCENTILES y máximo (en ms) de una lista en segundos."""
+    if not muestras:
+        return {"n": 0}
+    valores = np.asarray(muestras) * 1000
+    resultado = {"n": len(valores)}
+    for p, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES)):
+        resultado[f"p{p:g}_ms"] = float(v)
+    resultado["max_ms"] = float(valores.max())
+    return resultado
+
+async def bot(indice, args, muestras, contadores, fin):
+    """Una conexión: lee y confirma el estado, envía el guion de entradas y anota las medidas."""
+    sala = str(indice % args.salas) if args.salas > 1 else None
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.puerto)
+    except OSError:
+        contadores["fallos_conexion"] += 1
+        return
+    writer.write(protocolo.saludo(sala))
+    comandos = [f"RATE {args.frecuencia}"]
+    if args.radio:
+        comandos.append(f"RADIUS {args.radio}")
+    writer.write(b"".join(protocolo.codificar_comando(c) for c in comandos))
+
+    async def enviar_entradas():
+        numero = 0
+        paso = indice  # cada bot empieza en un punto distinto del guion
+        while True:
+            await asyncio.sleep(1 / args.entradas_hz)
+            numero += 1
+            lote = [_GUION[paso % len(_GUION)], f"SEQ {numero}"]
+            if numero % args.squash_cada == 0:
+                lote.append("SQUASH")
+            paso += 1
+            writer.write(b"".join(protocolo.codificar_comando(c) for c in lote))
+
+    receptor = ReceptorEstado()
+    periodo = 1 / args.frecuencia
+    medir_desde = time.monotonic() + args.calentamiento
+    anterior = None
+    entradas = asyncio.create_task(enviar_entradas())
+    try:
+        while time.monotonic() < fin:
+            try:
+                data = await asyncio.wait_for(reader.read(65536), max(0.0, fin - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                contadores["desconexiones"] += 1
+                break
+            llegada, reloj = time.monotonic(), time.time()
+            contadores["bytes"] += len(data)
+            if not receptor.alimentar(data):
+                continue
+            writer.write(receptor.ack())
+            contadores["estados"] += 1
+            if llegada >= medir_desde:
+                muestras["decodificacion"].append(receptor.decodificacion)
+                publicado = receptor.estado.get("publicado")
+                if publicado:
+                    muestras["latencia"].append(reloj - publicado)
+                if anterior is not None:
+                    muestras["entre_llegadas"].append(llegada - anterior)
+                    muestras["jitter"].append(abs(llegada - anterior - periodo))
+            anterior = llegada
+    except (ConnectionError, OSError):
+        contadores["desconexiones"] += 1
+    finally:
+        entradas.cancel()
+        writer.close()
+
+async def ejecutar_bots(indices, args):
+    muestras = {"entre_llegadas": [], "jitter": [], "decodificacion": [], "latencia": []}
+    contadores = {"estados": 0, "bytes": 0, "fallos_conexion": 0, "desconexiones": 0}
+    fin = time.monotonic() + args.duracion
+    tareas = []
+    for i in indices:
+        tareas.append(asyncio.create_task(bot(i, args, muestras, contadores, fin)))
+        # Escalonar las conexiones para no medir sólo la avalancha inicial
+        await asyncio.sleep(args.escalonado)
+    await asyncio.gather(*tareas)
+    return muestras, contadores
+
+def _proceso(indices, args):
+    return asyncio.run(ejecutar_bots(indices, args))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga: bots sin interfaz contra servidor.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8809)
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--procesos", type=int, default=1, help="procesos entre los que repartir los bots")
+    parser.add_argument("--duracion", type=float, default=30.0, help="segundos de prueba")
+    parser.add_argument("--calentamiento", type=float, default=2.0,
+                        help="segundos iniciales de cada bot que no se miden")
+    parser.add_argument("--escalonado", type=float, default=0.005, help="segundos entre dos conexiones")
+    parser.add_argument("--salas", type=int, default=1, help="repartir los bots entre las salas 0..N-1")
+    parser.add_argument("--frecuencia", type=int, default=20, help="frecuencia de envío pedida (RATE)")
+    parser.add_argument("--radio", type=int, default=0, help="área de interés (RADIUS) de cada bot; 0 = todo")
+    parser.add_argument("--entradas-hz", type=float, default=10.0, help="lotes de entradas por segundo")
+    parser.add_argument("--squash-cada", type=int, default=20, help="un SQUASH cada N lotes de entradas")
+    parser.add_argument("--salida", default=None, help="guardar el resultado en este fichero JSON")
+    args = parser.parse_args()
+
+    procesos = max(1, min(args.procesos, args.bots))
+    repartos = [list(range(p, args.bots, procesos)) for p in range(procesos)]
+    print(f"{args.bots} bots en {procesos} proceso(s) contra {args.host}:{args.puerto} durante {args.duracion:g} s...")
+    if procesos == 1:
+        partes = [_proceso(repartos[0], args)]
+    else:
+        with multiprocessing.Pool(procesos) as pool:
+            partes = pool.starmap(_proceso, [(indices, args) for indices in repartos])
+
+    muestras = {nombre: [] for nombre in partes[0][0]}
+    contadores = dict.fromkeys(partes[0][1], 0)
+    for parte_muestras, parte_contadores in partes:
+        for nombre, valores in parte_muestras.items():
+            muestras[nombre].extend(valores)
+        for nombre, valor in parte_contadores.items():
+            contadores[nombre] += valor
+    resultado = {
+        "bots": args.bots,
+        "duracion_s": args.duracion,
+        "estados_por_s": contadores["estados"] / args.duracion,
+        "bytes_por_s": contadores["bytes"] / args.duracion,
+        "fallos_conexion": contadores["fallos_conexion"],
+        "desconexiones": contadores["desconexiones"],
+    }
+    for nombre, valores in muestras.items():
+        resultado[nombre] = percentiles(valores)
+
+    for clave, valor in resultado.items():
+        if isinstance(valor, dict):
+            print(f"{clave:16s} " + "  ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                               for k, v in valor.items()))
+        else:
+            print(f"{clave:16s} {valor:.6g}" if isinstance(valor, float) else f"{clave:16s} {valor}")
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"Resultado guardado en {args.salida}")
+
+if __name__ == '__main__':
+    main()
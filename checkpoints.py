@@ -0,0 +1,103 @@
+import glob
+import io
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+# ==============================================================
+# CHECKPOINTS DEL MUNDO (GUARDADO PERIÓDICO Y RESTAURACIÓN)
+# ==============================================================
+#
+# Un checkpoint es un .npz comprimido con las columnas de partículas (x, y,
+# zona, ids) y los escalares de RoombaWorld.estado_checkpoint() en JSON
+# (incluidos el generador aleatorio, el planificador de apariciones y el
+# modo SEEK). Se llama "checkpoint-<instante>-<seq>.npz", con el instante
+# de escritura (time.time_ns()) delante para que el orden de los nombres sea
+# el de escritura aunque el directorio tenga checkpoints de otra ejecución
+# con un seq mayor, y se escribe primero en un temporal que luego se
+# renombra, así que en el directorio nunca hay uno a medias.
+
+log = logging.getLogger("roomba.checkpoints")
+
+def guardar(estado, directorio):
+    """Escribe `estado` (de estado_checkpoint) en `directorio` y devuelve la ruta."""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"checkpoint-{time.time_ns():020d}-{estado['escalares']['seq']:010d}.npz")
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer, x=estado["x"], y=estado["y"], zona=estado["zona"], ids=estado["ids"],
+        escalares=np.frombuffer(json.dumps(estado["escalares"]).encode(), dtype=np.uint8),
+    )
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(buffer.getbuffer())
+    os.replace(temporal, ruta)
+    return ruta
+
+def cargar(ruta):
+    """Lee un checkpoint con la forma de RoombaWorld.estado_checkpoint()."""
+    with np.load(ruta) as datos:
+        return {
+            "escalares": json.loads(datos["escalares"].tobytes()),
+            "x": datos["x"], "y": datos["y"], "zona": datos["zona"], "ids": datos["ids"],
+        }
+
+def listar(directorio):
+    """Rutas de los checkpoints de `directorio`, del escrito antes al escrito después."""
+    return sorted(glob.glob(os.path.join(directorio, "checkpoint-*.npz")))
+
+def ultimo(directorio):
+    """Ruta del último checkpoint escrito en `directorio`, o None."""
+    rutas = listar(directorio)
+    return rutas[-1] if rutas else None
+
+class GuardadoPeriodico:
+    """
+    Hilo que guarda un checkpoint de `world` cada `intervalo` segundos y
+    conserva los `conservar` más recientes. Sólo toma world.lock para
+    capturar el estado (O(zonas), las partículas son las del último
+    Snapshot); la compresión y la escritura se hacen ya sin él.
+    """
+
+    def __init__(self, world, directorio, intervalo=30.0, conservar=3):
+        self.world = world
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.conservar = conservar
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="checkpoints", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def guardar_ahora(self):
+        """Guarda un checkpoint en el acto y devuelve su ruta."""
+        # Las columnas del último snapshot se montan antes de tomar el lock
+        self.world.snapshot.columnas()
+        with self.world.lock:
+            estado = self.world.estado_checkpoint()
+        inicio = time.perf_counter()
+        ruta = guardar(estado, self.directorio)
+        log.info("Checkpoint %s (%d personas) guardado en %.1f ms", ruta, len(estado["ids"]),
+                 (time.perf_counter() - inicio) * 1000)
+        for antigua in listar(self.directorio)[:-self.conservar]:
+            os.remove(antigua)
+        return ruta
+
+    def _ejecutar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.guardar_ahora()
+            except OSError as e:
+                log.warning("No se pudo guardar el checkpoint: %s", e)
+
+    def detener(self, guardar_final=True):
+        """Para el hilo y, si se indica, guarda un último checkpoint."""
+        self._parar.set()
+        if self._hilo.is_alive():
+            self._hilo.join()
+        if guardar_final:
+            self.guardar_ahora()
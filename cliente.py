@@ -1,60 +1,25 @@
-import socket
-import threading
+import sys
 import time
-import json
 import pygame
-
-# Variables globales para almacenar el estado recibido del servidor
-server_state = None
-state_lock = threading.Lock()
-stop_receptor = False
-
-def recibir_estado(client_socket):
-    """
-    Hilo receptor que actualiza continuamente la variable global server_state
-    con el estado en formato JSON enviado por el servidor.
-    """
-    client_socket.settimeout(1.0)
-    global server_state, stop_receptor
-    while not stop_receptor:
-        try:
-            data = client_socket.recv(4096)
-            if data:
-                with state_lock:
-                    server_state = json.loads(data.decode())
-            else:
-                break
-        except socket.timeout:
-            continue
-        except Exception as e:
-            print("Error recibiendo datos:", e)
-            break
-
-def find_zone(x, y, zone_rects):
-    """
-    Retorna la clave de la zona en la que se encuentra el punto (x, y).
-    Si (x, y) no está en ninguna zona, retorna None.
-    """
-    for zone, rect in zone_rects.items():
-        rx, ry, rw, rh = rect
-        if rx <= x <= rx+rw and ry <= y <= ry+rh:
-            return zone
-    return None
+from dibujo import Escena, TextoCacheado
+from geometria import Plano
+from interpolacion import PrediccionJugador
+from red_cliente import ClienteRed
+from sonidos import SonidosEventos
 
 def main():
     host = "127.0.0.1"
     puerto = 8809
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Sala a la que unirse (opcional, primer argumento); por defecto la del servidor
+    sala = sys.argv[1] if len(sys.argv) > 1 else None
+    # Conexión con su hilo receptor: réplica del mundo, ACK y buffer de interpolación
+    red = ClienteRed(host, puerto, sala)
     try:
-        client_socket.connect((host, puerto))
+        red.conectar()
     except Exception as e:
         print("No se pudo conectar al servidor:", e)
         return
 
-    # Inicia el hilo receptor para obtener el estado del mundo desde el servidor.
-    receptor = threading.Thread(target=recibir_estado, args=(client_socket,), daemon=True)
-    receptor.start()
-
     pygame.init()
     WINDOW_WIDTH, WINDOW_HEIGHT = 600, 600
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
@@ -83,93 +48,124 @@ def main():
     player_sprite   = pygame.transform.scale(player_sprite, player_size)
     sleeping_sprite = pygame.transform.scale(sleeping_sprite, sleeping_size)
     
-    # Posición inicial del jugador (centro)
-    player_pos = [100, 100]
+    # Posición inicial del jugador; se predice localmente y se corrige con la del servidor
     player_speed = 5
+    zone_rects = fixed_zone_rects
+    prediccion = PrediccionJugador([100, 100], player_speed, Plano(zone_rects))
+    
+    # Sonidos de los eventos que reenvía el servidor (picadas, aplastamientos)
+    sonidos = SonidosEventos()
     
-    # Inicialmente, sin interpolación, establecemos la posición mostrada del mosquito
-    displayed_mosquito_pos = [300, 300]
-    alpha = 0.2  # Factor de interpolación (entre 0 y 1)
+    # Capas y textos cacheados para redibujar sólo lo que cambia
+    escena = Escena(screen, font, sleeping_sprite, color_fondo=(0, 0, 0))
+    textos_conteo = {}
+    texto_nivel = TextoCacheado(font, (255, 255, 255))
     
     running = True
     while running:
+        # Comandos de este frame, enviados juntos al servidor
+        comandos = []
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                comandos.append("SQUASH")
         
-        # Movimiento local del jugador (chancla)
+        # Movimiento del jugador (chancla), en pasos, como lo aplica el servidor
         keys = pygame.key.get_pressed()
         dx, dy = 0, 0
         if keys[pygame.K_LEFT]:
-            dx = -player_speed
+            dx -= 1
+            comandos.append("MOVE LEFT")
         if keys[pygame.K_RIGHT]:
-            dx = player_speed
+            dx += 1
+            comandos.append("MOVE RIGHT")
         if keys[pygame.K_UP]:
-            dy = -player_speed
+            dy -= 1
+            comandos.append("MOVE UP")
         if keys[pygame.K_DOWN]:
-            dy = player_speed
-        candidate_x = player_pos[0] + dx
-        candidate_y = player_pos[1] + dy
-        
-        # Actualizar posición sólo si el centro candidato está en alguna zona
-        if find_zone(candidate_x, candidate_y, fixed_zone_rects) is not None:
-            player_pos[0] = candidate_x
-            player_pos[1] = candidate_y
+            dy += 1
+            comandos.append("MOVE DOWN")
         
-        screen.fill((0, 0, 0))
+        # Corregir la predicción con el último estado del servidor y aplicar la entrada de este frame
+        with red.lock:
+            current_state = red.receptor.estado
+            confirmado, red.receptor.estado_jugador = red.receptor.estado_jugador, None
+            completo, añadidas, eliminadas = red.receptor.replica.tomar_cambios()
+            eventos = red.receptor.tomar_eventos()
+            if completo:
+                particulas = dict(red.receptor.replica.particulas)
+        sonidos.reproducir(eventos)
+        if confirmado is not None:
+            prediccion.reconciliar(*confirmado)
+        if dx or dy:
+            comandos.append(f"SEQ {prediccion.mover(dx, dy)}")
+        player_pos = prediccion.pos
+        if comandos:
+            try:
+                red.enviar(comandos)
+            except OSError as e:
+                print("Error enviando comandos:", e)
+                running = False
         
-        # Obtener estado del servidor
-        with state_lock:
-            current_state = server_state
+        # Estado del servidor
         if current_state is not None:
             mosquito_server_pos = current_state.get("mosquito_pos", [300,300])
-            dust_particles = current_state.get("dust_particles", {})
+            otros_mosquitos = current_state.get("mosquitos", [])[1:]
+            conteos = current_state.get("conteos", {})
             level = current_state.get("level", 1)
             zone_rects = current_state.get("zone_rects", fixed_zone_rects)
         else:
             mosquito_server_pos = [300,300]
-            dust_particles = {}
+            otros_mosquitos = []
+            conteos = {}
             level = 1
             zone_rects = fixed_zone_rects
+        if zone_rects != prediccion.plano.zone_rects:
+            # Mismo índice de zonas que el servidor para predecir el deslizamiento
+            prediccion.plano = Plano(zone_rects)
+        
+        # Posición del mosquito interpolada con retraso fijo entre dos ticks del
+        # servidor (o extrapolada con su velocidad); sin marcas de tiempo, la última recibida
+        with red.lock:
+            displayed_mosquito_pos = red.buffer_mosquito.posicion(time.monotonic())
+        if displayed_mosquito_pos is None:
+            displayed_mosquito_pos = mosquito_server_pos
         
-        # Interpolar la posición mostrada del mosquito:
-        # displayed = displayed + alpha * (server_pos - displayed)
-        displayed_mosquito_pos[0] += alpha * (mosquito_server_pos[0] - displayed_mosquito_pos[0])
-        displayed_mosquito_pos[1] += alpha * (mosquito_server_pos[1] - displayed_mosquito_pos[1])
+        # Zonas (fondo pre-renderizado) y gente durmiendo (sólo los cambios); encima, los elementos móviles
+        escena.fijar_zonas(zone_rects)
+        if completo:
+            escena.fijar_particulas(particulas)
+        elif añadidas or eliminadas:
+            escena.cambiar_particulas(añadidas, eliminadas)
+        elementos = []
+        for zona, rect in zone_rects.items():
+            texto = textos_conteo.setdefault(zona, TextoCacheado(font))
+            count = conteos.get(zona, 0)
+            elementos.append((texto.render(f"Gente: {count}"), (rect[0] + 5, rect[1] + 30)))
         
-        # Dibujar el mosquito usando el sprite, en la posición interpolada.
-        screen.blit(mosquito_sprite, (
+        # El mosquito, en la posición interpolada; el resto del enjambre (si lo hay), en la última recibida
+        elementos.append((mosquito_sprite, (
             int(displayed_mosquito_pos[0]) - mosquito_size[0]//2,
             int(displayed_mosquito_pos[1]) - mosquito_size[1]//2)
-        )
-        
-        # Dibujar zonas y partículas ("gente durmiendo")
-        for zona, rect in zone_rects.items():
-            pygame.draw.rect(screen, (70,70,200), rect, 2)
-            zone_text = font.render(zona, True, (200,200,200))
-            screen.blit(zone_text, (rect[0] + 5, rect[1] + 5))
-            count = len(dust_particles.get(zona, []))
-            count_text = font.render(f"Gente: {count}", True, (200,200,200))
-            screen.blit(count_text, (rect[0] + 5, rect[1] + 30))
-            for (x, y) in dust_particles.get(zona, []):
-                screen.blit(sleeping_sprite, (x - sleeping_size[0]//2, y - sleeping_size[1]//2))
+        ))
+        for x, y in otros_mosquitos:
+            elementos.append((mosquito_sprite, (int(x) - mosquito_size[0]//2, int(y) - mosquito_size[1]//2)))
         
         # Mostrar el nivel en pantalla
-        level_text = font.render(f"Nivel: {level}", True, (255,255,255))
-        screen.blit(level_text, (10, 10))
+        elementos.append((texto_nivel.render(f"Nivel: {level}"), (10, 10)))
         
-        # Dibujar el sprite del jugador (chancla)
-        screen.blit(player_sprite, (
+        # El sprite del jugador (chancla)
+        elementos.append((player_sprite, (
             int(player_pos[0]) - player_size[0]//2,
             int(player_pos[1]) - player_size[1]//2)
-        )
+        ))
         
-        pygame.display.flip()
+        # Sólo se envían a la pantalla las regiones que cambiaron
+        pygame.display.update(escena.dibujar(elementos))
         clock.tick(60)
     
-    global stop_receptor
-    stop_receptor = True
-    client_socket.close()
+    red.cerrar()
     pygame.quit()
 
 if __name__ == '__main__':
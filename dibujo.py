@@ -0,0 +1,266 @@
+import itertools
+import numpy as np
+import pygame
+
+# ==============================================================
+# DIBUJO POR RECTÁNGULOS SUCIOS (roomba.py y cliente.py)
+# ==============================================================
+
+COLOR_FONDO = (30, 30, 30)
+COLOR_ZONA = (70, 70, 200)
+COLOR_TEXTO = (200, 200, 200)
+
+class TextoCacheado:
+    """Superficie de un texto que sólo se vuelve a renderizar cuando cambia."""
+
+    def __init__(self, font, color=COLOR_TEXTO):
+        self.font = font
+        self.color = color
+        self._texto = None
+        self.superficie = None
+
+    def render(self, texto):
+        if texto != self._texto:
+            self._texto = texto
+            self.superficie = self.font.render(texto, True, self.color)
+        return self.superficie
+
+class Escena:
+    """
+    Dibuja el mundo por capas y devuelve sólo los rectángulos que cambiaron,
+    para pasarlos a pygame.display.update(rects):
+      - fondo: zonas y sus nombres, pre-renderizados al fijar las zonas;
+      - capa: fondo + gente durmiendo, que se actualiza sólo donde hay cambios;
+      - elementos: superficies móviles (sprites, textos) dibujadas encima.
+    Un elemento que no cambia de superficie ni de posición no genera trabajo,
+    así que el coste por frame no depende del tamaño de la ventana. Con
+    `rectangulos_sucios=False` se redibuja la pantalla entera en cada frame.
+
+    La gente se dibuja en lote (una llamada a Surface.blits) y la capa se
+    actualiza de forma incremental: las nuevas se dibujan encima y, donde se
+    quita una, se restaura el fondo y se redibujan sólo sus vecinas. Por
+    encima de `umbral_mapa_calor` personas se cambia a un mapa de densidad
+    por celdas de `tam_celda_calor` píxeles.
+    """
+
+    def __init__(self, screen, font, sprite_particula, rectangulos_sucios=True, color_fondo=COLOR_FONDO,
+                 umbral_mapa_calor=5000, tam_celda_calor=10):
+        self.screen = screen
+        self.font = font
+        self.sprite_particula = sprite_particula
+        self.rectangulos_sucios = rectangulos_sucios
+        self.color_fondo = color_fondo
+        self.umbral_mapa_calor = umbral_mapa_calor
+        self.tam_celda_calor = tam_celda_calor
+        self.fondo = pygame.Surface(screen.get_size()).convert()
+        self.capa = pygame.Surface(screen.get_size()).convert()
+        self._zonas = None
+        self._elementos = []
+        self._todo = True
+        # Gente dibujada (id -> (x, y)) y rejilla (celda -> ids) para encontrar vecinas
+        self._puntos = {}
+        self._celdas = {}
+        self._ancho, self._alto = sprite_particula.get_size()
+        self._sucios_capa = []
+        # Mapa de calor: conteos por celda (filas = y) o None si se dibujan sprites
+        self._calor = None
+        self._max_calor = 0
+
+    def fijar_zonas(self, zone_rects):
+        """Pre-renderiza el fondo con las zonas (si han cambiado)."""
+        if zone_rects == self._zonas:
+            return
+        self._zonas = dict(zone_rects)
+        self.fondo.fill(self.color_fondo)
+        for zona, rect in self._zonas.items():
+            pygame.draw.rect(self.fondo, COLOR_ZONA, rect, 2)
+            self.fondo.blit(self.font.render(zona, True, COLOR_TEXTO), (rect[0] + 5, rect[1] + 5))
+        self._rehacer_capa()
+
+    # ----------------------------------------------------------
+    # Capa de gente durmiendo
+    # ----------------------------------------------------------
+
+    def _esquina(self, x, y):
+        return (x - self._ancho // 2, y - self._alto // 2)
+
+    def _celda(self, x, y):
+        return (x // self._ancho, y // self._alto)
+
+    def _quiere_calor(self, n):
+        """Modo de dibujo para `n` personas, con histéresis para no alternar en el umbral."""
+        if self._calor is None:
+            return n > self.umbral_mapa_calor
+        return n >= 0.9 * self.umbral_mapa_calor
+
+    def _rehacer_capa(self):
+        """Redibuja toda la capa (y la pantalla en el próximo frame)."""
+        if self._quiere_calor(len(self._puntos)):
+            if self._calor is None:
+                self._calor = self._histograma(self._puntos.values())
+            self._max_calor = int(self._calor.max())
+        else:
+            self._calor = None
+        self.capa.blit(self.fondo, (0, 0))
+        if self._calor is not None:
+            self._dibujar_calor(self.capa.get_rect())
+        else:
+            sprite = self.sprite_particula
+            self.capa.blits([(sprite, self._esquina(x, y)) for x, y in self._puntos.values()], False)
+        self._sucios_capa = []
+        self._todo = True
+
+    def fijar_particulas(self, particulas):
+        """
+        Sustituye toda la gente dibujada: `particulas` es {id: (x, y, ...)}.
+        Si se parece a lo ya dibujado (p. ej. un fotograma clave periódico),
+        sólo se aplican las diferencias.
+        """
+        if self._puntos:
+            eliminadas = self._puntos.keys() - particulas.keys()
+            nuevas = particulas.keys() - self._puntos.keys()
+            if len(eliminadas) + len(nuevas) < len(self._puntos) // 4:
+                self.cambiar_particulas({pid: particulas[pid] for pid in nuevas}, eliminadas)
+                return
+        self._puntos = {pid: (int(p[0]), int(p[1])) for pid, p in particulas.items()}
+        self._celdas = {}
+        for pid, (x, y) in self._puntos.items():
+            self._celdas.setdefault(self._celda(x, y), set()).add(pid)
+        self._calor = None
+        self._rehacer_capa()
+
+    def cambiar_particulas(self, añadidas, eliminadas):
+        """Aplica los cambios: añadidas {id: (x, y, ...)} y eliminadas [ids]."""
+        quitadas = []
+        for pid in eliminadas:
+            punto = self._puntos.pop(pid, None)
+            if punto is not None:
+                self._celdas[self._celda(*punto)].discard(pid)
+                quitadas.append(punto)
+        nuevas = {}
+        for pid, p in añadidas.items():
+            punto = (int(p[0]), int(p[1]))
+            self._puntos[pid] = punto
+            self._celdas.setdefault(self._celda(*punto), set()).add(pid)
+            nuevas[pid] = punto
+        if not quitadas and not nuevas:
+            return
+        if self._quiere_calor(len(self._puntos)) != (self._calor is not None):
+            # Cambio de modo (sprites <-> mapa de calor)
+            self._rehacer_capa()
+        elif self._calor is not None:
+            self._cambiar_calor(quitadas, list(nuevas.values()))
+        else:
+            self._cambiar_sprites(quitadas, nuevas)
+
+    def _cambiar_sprites(self, quitadas, nuevas):
+        """`quitadas` [(x, y)] y `nuevas` {id: (x, y)}, ya aplicadas en self._puntos."""
+        sprite = self.sprite_particula
+        for x, y in quitadas:
+            rect = pygame.Rect(self._esquina(x, y), (self._ancho, self._alto))
+            cx, cy = self._celda(x, y)
+            # Las nuevas se dibujan después, encima de todo: si se repintaran
+            # también aquí, su transparencia se aplicaría dos veces
+            vecinas = [self._puntos[pid] for i in range(cx - 1, cx + 2) for j in range(cy - 1, cy + 2)
+                       for pid in self._celdas.get((i, j), ()) if pid not in nuevas]
+            self.capa.set_clip(rect)
+            self.capa.blit(self.fondo, rect, rect)
+            self.capa.blits([(sprite, self._esquina(vx, vy)) for vx, vy in vecinas], False)
+            self.capa.set_clip(None)
+            self._sucios_capa.append(rect)
+        self.capa.blits([(sprite, self._esquina(x, y)) for x, y in nuevas.values()], False)
+        self._sucios_capa.extend(pygame.Rect(self._esquina(x, y), (self._ancho, self._alto))
+                                 for x, y in nuevas.values())
+
+    # ----------------------------------------------------------
+    # Mapa de calor (nivel de detalle para mucha gente)
+    # ----------------------------------------------------------
+
+    def _histograma(self, puntos):
+        ancho, alto = self.capa.get_size()
+        c = self.tam_celda_calor
+        calor = np.zeros((alto // c + 1, ancho // c + 1), dtype=np.int32)
+        puntos = np.array(list(puntos), dtype=np.int64).reshape(-1, 2)
+        self._acumular_calor(calor, puntos, 1)
+        return calor
+
+    def _acumular_calor(self, calor, puntos, signo):
+        c = self.tam_celda_calor
+        filas = np.clip(puntos[:, 1] // c, 0, calor.shape[0] - 1)
+        columnas = np.clip(puntos[:, 0] // c, 0, calor.shape[1] - 1)
+        np.add.at(calor, (filas, columnas), signo)
+        return filas, columnas
+
+    def _cambiar_calor(self, quitadas, nuevas):
+        celdas = set()
+        for puntos, signo in ((quitadas, -1), (nuevas, 1)):
+            if puntos:
+                filas, columnas = self._acumular_calor(self._calor, np.array(puntos, dtype=np.int64), signo)
+                celdas.update(zip(filas.tolist(), columnas.tolist()))
+        if int(self._calor.max()) != self._max_calor:
+            # Cambia la escala de colores: hay que redibujar todas las celdas
+            self._rehacer_capa()
+            return
+        c = self.tam_celda_calor
+        for fila, columna in celdas:
+            rect = pygame.Rect(columna * c, fila * c, c, c)
+            self.capa.blit(self.fondo, rect, rect)
+            self._dibujar_calor(rect)
+            self._sucios_capa.append(rect)
+
+    def _dibujar_calor(self, rect):
+        """Dibuja en la capa las celdas del mapa de calor que cubren `rect`."""
+        c = self.tam_celda_calor
+        f0, f1 = rect.top // c, min(self._calor.shape[0], -(-rect.bottom // c))
+        c0, c1 = rect.left // c, min(self._calor.shape[1], -(-rect.right // c))
+        bloque = self._calor[f0:f1, c0:c1]
+        if not bloque.any():
+            return
+        # Intensidad logarítmica normalizada con la celda más poblada
+        maximo = max(1, self._max_calor)
+        intensidad = np.log1p(bloque) / np.log1p(maximo)
+        rgb = np.zeros(bloque.shape[::-1] + (3,), dtype=np.uint8)
+        rgb[..., 0] = (80 + 175 * intensidad.T).astype(np.uint8)
+        rgb[..., 1] = (160 * intensidad.T ** 2).astype(np.uint8)
+        rgb[..., 2] = 40
+        rgb[bloque.T == 0] = 0
+        celdas = pygame.surfarray.make_surface(rgb)
+        celdas.set_colorkey((0, 0, 0))
+        celdas = pygame.transform.scale(celdas, ((c1 - c0) * c, (f1 - f0) * c))
+        celdas.set_alpha(170)
+        self.capa.set_clip(rect)
+        self.capa.blit(celdas, (c0 * c, f0 * c))
+        self.capa.set_clip(None)
+
+    # ----------------------------------------------------------
+    # Frame
+    # ----------------------------------------------------------
+
+    def dibujar(self, elementos):
+        """
+        Dibuja un frame. `elementos` es una lista ordenada de (superficie,
+        (x, y)) con la esquina superior izquierda. Devuelve la lista de
+        rectángulos a actualizar.
+        """
+        sucios, self._sucios_capa = self._sucios_capa, []
+        if len(sucios) > 256:
+            self._todo = True
+        elementos = [(superficie, pygame.Rect(pos, superficie.get_size())) for superficie, pos in elementos]
+
+        if self._todo or not self.rectangulos_sucios:
+            self._todo = False
+            self._elementos = elementos
+            self.screen.blit(self.capa, (0, 0))
+            self.screen.blits(elementos, False)
+            return [self.screen.get_rect()]
+
+        for antes, ahora in itertools.zip_longest(self._elementos, elementos):
+            if antes != ahora:
+                sucios.extend(e[1] for e in (antes, ahora) if e is not None)
+        self._elementos = elementos
+        if not sucios:
+            return sucios
+        for rect in sucios:
+            self.screen.blit(self.capa, rect, rect)
+        self.screen.blits([e for e in elementos if e[1].collidelist(sucios) != -1], False)
+        return sucios
@@ -0,0 +1,118 @@
+import numpy as np
+
+# ==============================================================
+# ENJAMBRE DE MOSQUITOS (COLUMNAS + DIRECCIÓN POR LOTES)
+# ==============================================================
+#
+# Un mundo puede tener varios mosquitos (RoombaWorld(n_mosquitos=N)). Su
+# estado va en columnas NumPy, una fila por mosquito, y cada tick se evalúa
+# de una vez para todos: temporizadores del modo SEEK, elección de
+# objetivo en la rejilla de partículas (AlmacenParticulas.k_cercanas_lote y
+# pares_en_radio), orientación, movimiento con rebote
+# (geometria.Plano.deslizar_lote) y picaduras. Así el coste del tick crece
+# con el número de llamadas a NumPy, que es fijo, y no con el de mosquitos.
+#
+# Para que no persigan todos a la misma persona, los objetivos se reparten
+# con asignar_objetivos. Cada mosquito ve sus candidatos más cercanos: en
+# modo SEEK los CANDIDATOS más próximos y, si no, los que están a menos de
+# near_threshold.
+
+# Candidatos por mosquito en modo SEEK (como mucho uno por mosquito del mundo)
+CANDIDATOS = 8
+
+class Enjambre:
+    """
+    Estado de los mosquitos de un mundo: posición y velocidad (píxeles por
+    tick) y, para el modo SEEK, si está activo, cuándo empezó y la última
+    vez que el mosquito picó (reloj simulado). La fila 0 es "el" mosquito
+    de siempre (mosquito_pos/mosquito_vel del mundo y del protocolo).
+    """
+
+    def __init__(self, pos, vel, tiempo=0.0):
+        self.pos = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        self.vel = np.array(vel, dtype=np.float64).reshape(-1, 2)
+        n = len(self.pos)
+        self.en_seek = np.zeros(n, dtype=bool)
+        self.inicio_seek = np.zeros(n)
+        self.ultima_picada = np.full(n, float(tiempo))
+
+    def __len__(self):
+        return len(self.pos)
+
+    def estado(self):
+        """Columnas como listas (serializables en JSON, para los checkpoints)."""
+        return {
+            "pos": self.pos.tolist(),
+            "vel": self.vel.tolist(),
+            "en_seek": self.en_seek.tolist(),
+            "inicio_seek": self.inicio_seek.tolist(),
+            "ultima_picada": self.ultima_picada.tolist(),
+        }
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Enjambre con el estado de estado()."""
+        enjambre = cls(estado["pos"], estado["vel"])
+        enjambre.en_seek[:] = estado["en_seek"]
+        enjambre.inicio_seek[:] = estado["inicio_seek"]
+        enjambre.ultima_picada[:] = estado["ultima_picada"]
+        return enjambre
+
+    def orientar(self, filas, xs, ys):
+        """
+        Gira la velocidad de los mosquitos `filas` hacia los puntos (xs, ys)
+        conservando su módulo; los que ya están encima no cambian.
+        """
+        dx = xs - self.pos[filas, 0]
+        dy = ys - self.pos[filas, 1]
+        norma = np.sqrt(dx * dx + dy * dy)
+        movibles = norma > 0
+        filas, dx, dy, norma = filas[movibles], dx[movibles], dy[movibles], norma[movibles]
+        vx, vy = self.vel[filas, 0], self.vel[filas, 1]
+        rapidez = np.sqrt(vx * vx + vy * vy)
+        self.vel[filas, 0] = rapidez * dx / norma
+        self.vel[filas, 1] = rapidez * dy / norma
+
+def asignar_objetivos(puntos, filas, d2, n):
+    """
+    Reparte las partículas candidatas entre `n` mosquitos. Cada candidata
+    es una pareja (puntos[i], filas[i]) a distancia al cuadrado d2[i].
+
+    Se hace por rondas. En cada ronda, cada mosquito sin objetivo propone
+    su candidata libre más cercana, y cada partícula propuesta se queda con
+    el mosquito más cercano. Ninguna partícula tiene dos perseguidores
+    mientras haya candidatas libres. Un mosquito que se queda sin ninguna
+    va a por la más cercana de las suyas, aunque ya la persiga otro.
+
+    Devuelve un array con la fila objetivo de cada mosquito (-1 si no tiene
+    ninguna candidata).
+    """
+    objetivos = np.full(n, -1, dtype=np.intp)
+    if puntos.size == 0:
+        return objetivos
+    # Caso habitual: las más cercanas de cada mosquito no coinciden y no hace falta repartir
+    orden = np.lexsort((filas, d2, puntos))
+    puntos, filas, d2 = puntos[orden], filas[orden], d2[orden]
+    primeras = np.flatnonzero(np.concatenate(([True], puntos[1:] != puntos[:-1])))
+    mejores = np.sort(filas[primeras])
+    if (mejores[1:] != mejores[:-1]).all():
+        objetivos[puntos[primeras]] = filas[primeras]
+        return objetivos
+    # Orden global por distancia (a igualdad, por fila): la primera pareja de cada mosquito es su más cercana
+    orden = np.lexsort((filas, d2))
+    puntos, filas = puntos[orden], filas[orden]
+    libres = np.ones(puntos.size, dtype=bool)
+    while libres.any():
+        indices = np.flatnonzero(libres)
+        _, primeras = np.unique(puntos[indices], return_index=True)
+        propuestas = np.sort(indices[primeras])
+        _, ganadoras = np.unique(filas[propuestas], return_index=True)
+        ganadoras = propuestas[ganadoras]
+        objetivos[puntos[ganadoras]] = filas[ganadoras]
+        libres &= ~np.isin(puntos, puntos[ganadoras]) & ~np.isin(filas, filas[ganadoras])
+    # Sin candidata libre: la más cercana, compartida
+    sin_objetivo = objetivos[puntos] < 0
+    if sin_objetivo.any():
+        _, primeras = np.unique(puntos[sin_objetivo], return_index=True)
+        objetivos[puntos[sin_objetivo][primeras]] = filas[sin_objetivo][primeras]
+    return objetivos
@@ -0,0 +1,104 @@
+import re
+import threading
+
+# ==============================================================
+# ENTRADAS DE LOS JUGADORES (COMANDOS -> BUZÓN -> TICK)
+# ==============================================================
+#
+# Comandos de texto: "MOVE LEFT|RIGHT|UP|DOWN", "SQUASH" y "SEQ <n>" (número
+# de la última entrada del cliente, para su reconciliación). Con el protocolo
+# v2/v3 llega uno por trama TIPO_COMANDO; los clientes antiguos los envían
+# sin separador, de modo que una lectura puede traer "MOVE LEFTMOVE LEFT".
+#
+# Lo recibido en cada lectura se reduce a un desplazamiento neto (en pasos),
+# una marca de SQUASH y el último SEQ, y se acumula en el buzón del mundo.
+# La simulación lo vacía una sola vez al principio de cada tick, así que un
+# jugador que mantiene pulsada una flecha cuesta O(1) por tick, no O(mensajes).
+
+DIRECCIONES = {
+    b"LEFT": (-1, 0),
+    b"RIGHT": (1, 0),
+    b"UP": (0, -1),
+    b"DOWN": (0, 1),
+}
+
+_COMANDO = re.compile(rb"MOVE\s*(LEFT|RIGHT|UP|DOWN)|SEQ\s*(\d+)|SQUASH")
+# Longitud del comando más largo: lo que puede quedar cortado entre dos lecturas
+_MAX_COMANDO = len(b"MOVE RIGHT")
+
+def parsear_comandos(datos):
+    """
+    Reduce los comandos contenidos en `datos` (bytes, pueden venir pegados)
+    a (dx, dy, squash, entrada): desplazamiento neto en pasos, si se pidió
+    SQUASH y el mayor SEQ recibido (o None). Devuelve además el offset donde
+    terminó el último comando reconocido.
+    """
+    dx = dy = 0
+    squash = False
+    entrada = None
+    fin = 0
+    for m in _COMANDO.finditer(datos):
+        if m.group(1) is not None:
+            ddx, ddy = DIRECCIONES[m.group(1)]
+            dx += ddx
+            dy += ddy
+        elif m.group(2) is not None:
+            entrada = max(int(m.group(2)), entrada or 0)
+        else:
+            squash = True
+        fin = m.end()
+    return dx, dy, squash, entrada, fin
+
+class LectorComandos:
+    """
+    Lector de comandos sin tramas (clientes antiguos): conserva el final de
+    cada lectura por si un comando quedó partido entre dos recv().
+    """
+
+    def __init__(self):
+        self._resto = b""
+
+    def alimentar(self, datos):
+        """Devuelve (dx, dy, squash, entrada) de los comandos completos recibidos."""
+        datos = self._resto + datos
+        dx, dy, squash, entrada, fin = parsear_comandos(datos)
+        self._resto = datos[max(fin, len(datos) - _MAX_COMANDO):]
+        return dx, dy, squash, entrada
+
+class BuzonEntradas:
+    """
+    Entradas pendientes de todos los jugadores de un mundo, ya combinadas:
+    jugador -> [dx, dy, squash, entrada]. Lo escribe la red (una vez por
+    lectura) y lo vacía la simulación (una vez por tick); su lock sólo
+    protege el intercambio de estos diccionarios, no el mundo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self._bajas = set()
+
+    def acumular(self, jugador, dx=0, dy=0, squash=False, entrada=None):
+        with self._lock:
+            pendiente = self._pendientes.get(jugador)
+            if pendiente is None:
+                self._pendientes[jugador] = [dx, dy, squash, entrada]
+            else:
+                pendiente[0] += dx
+                pendiente[1] += dy
+                pendiente[2] = pendiente[2] or squash
+                if entrada is not None:
+                    pendiente[3] = max(entrada, pendiente[3] or 0)
+
+    def baja(self, jugador):
+        """El jugador se ha desconectado: se retirará del mundo en el próximo tick."""
+        with self._lock:
+            self._pendientes.pop(jugador, None)
+            self._bajas.add(jugador)
+
+    def tomar(self):
+        """Devuelve y vacía ({jugador: [dx, dy, squash, entrada]}, {jugadores dados de baja})."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            bajas, self._bajas = self._bajas, set()
+        return pendientes, bajas
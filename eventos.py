@@ -0,0 +1,33 @@
+import collections
+
+# ==============================================================
+# EVENTOS DE LA SIMULACIÓN (PICADAS, APARICIONES, MODO SEEK...)
+# ==============================================================
+#
+# El mundo no reproduce sonidos ni llama a nadie con world.lock tomado:
+# anota sus eventos en un registro acotado (world.eventos), con el seq del
+# tick en que ocurrieron, igual que los cambios de partículas, y cada
+# Snapshot lo captura. Quien quiera enterarse pide los posteriores a lo
+# último que vio con snapshot.eventos_desde(seq): el renderizador local
+# para sus sonidos (sonidos.py) y el servidor para reenviarlos a los
+# clientes en tramas TIPO_EVENTOS (protocolo.py).
+
+PICADA = 1     # el mosquito picó a `n` personas de `zona` estando en (x, y)
+APARICION = 2  # aparecieron `n` personas en `zona`; (x, y) es la última
+SEEK = 3       # el mosquito entró en modo SEEK estando en (x, y)
+APLASTADO = 4  # un jugador aplastó al mosquito en (x, y); `n` es el nuevo nivel
+
+NOMBRES = {PICADA: "picada", APARICION: "aparicion", SEEK: "seek", APLASTADO: "aplastado"}
+
+# `zona` es None en los eventos que no son de una zona
+Evento = collections.namedtuple("Evento", "seq tipo zona x y n")
+
+def eventos_desde(registro, base):
+    """Eventos de `registro` (ordenado por seq) de los ticks posteriores a `base`."""
+    nuevos = []
+    for evento in reversed(registro):
+        if evento.seq <= base:
+            break
+        nuevos.append(evento)
+    nuevos.reverse()
+    return nuevos
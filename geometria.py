@@ -0,0 +1,111 @@
+import json
+import numpy as np
+
+# ==============================================================
+# GEOMETRÍA DE LA HABITACIÓN (ZONAS TRANSITABLES)
+# ==============================================================
+
+# Plano por defecto: habitación de 600 x 600 cm con cuatro zonas
+# (largo, alto) en centímetros y su posición (esquina superior izquierda)
+PLANO_POR_DEFECTO = {
+    "ancho_cm": 600,
+    "alto_cm": 600,
+    "zonas": {
+        "Zona 1": {"tamaño": [500, 150], "posicion": [50, 41]},
+        "Zona 2": {"tamaño": [101, 220], "posicion": [50, 190]},
+        "Zona 3": {"tamaño": [309, 220], "posicion": [241, 190]},
+        "Zona 4": {"tamaño": [500, 150], "posicion": [50, 408]},
+    },
+}
+
+def cargar_plano(ruta=None):
+    """
+    Lee un plano en JSON con la forma de PLANO_POR_DEFECTO (medidas en cm).
+    Devuelve (ancho_cm, alto_cm, zonas, posiciones) con zonas = {zona:
+    (largo, alto)} y posiciones = {zona: (x, y)}, en el orden del fichero.
+    Sin `ruta` devuelve el plano por defecto.
+    """
+    if ruta is None:
+        plano = PLANO_POR_DEFECTO
+    else:
+        with open(ruta, encoding="utf-8") as f:
+            plano = json.load(f)
+    zonas = {zona: tuple(datos["tamaño"]) for zona, datos in plano["zonas"].items()}
+    posiciones = {zona: tuple(datos["posicion"]) for zona, datos in plano["zonas"].items()}
+    return plano["ancho_cm"], plano["alto_cm"], zonas, posiciones
+
+class Plano:
+    """
+    Índice de las zonas transitables precalculado a partir de `zone_rects`
+    (rectángulos en píxeles, bordes incluidos): un mapa de bits con el
+    índice de la zona de cada píxel (-1 fuera de todas), de modo que
+    zone_at/is_walkable son O(1) sea cual sea el número de zonas. Si dos
+    zonas se solapan, cada píxel pertenece a la primera, como al recorrer
+    los rectángulos en orden. Las coordenadas se redondean hacia abajo al
+    píxel que las contiene.
+    """
+
+    def __init__(self, zone_rects):
+        self.zone_rects = dict(zone_rects)
+        self.zonas = list(self.zone_rects)
+        self.ancho = max((x + w + 1 for x, _, w, _ in self.zone_rects.values()), default=0)
+        self.alto = max((y + h + 1 for _, y, _, h in self.zone_rects.values()), default=0)
+        self._mapa = np.full((self.alto, self.ancho), -1, dtype=np.int16)
+        for i in reversed(range(len(self.zonas))):
+            x, y, w, h = self.zone_rects[self.zonas[i]]
+            self._mapa[max(0, y):y + h + 1, max(0, x):x + w + 1] = i
+        # Filas como listas de Python: indexarlas es más rápido que indexar el array
+        self._filas = self._mapa.tolist()
+        # Para las consultas por lotes: el mapa con una fila y una columna más
+        # de -1 al final, donde van a parar tanto las coordenadas >= ancho/alto
+        # como las negativas (recortadas a -1, que indexa la última)
+        self._mapa_borde = np.pad(self._mapa, ((0, 1), (0, 1)), constant_values=-1)
+        self._limites = np.array([[self.alto], [self.ancho]])
+
+    def _indice(self, x, y):
+        if x < 0 or y < 0 or x >= self.ancho or y >= self.alto:
+            return -1
+        return self._filas[int(y)][int(x)]
+
+    def is_walkable(self, x, y):
+        """True si (x, y) está dentro de alguna zona."""
+        return self._indice(x, y) >= 0
+
+    def zone_at(self, x, y):
+        """Nombre de la zona que contiene (x, y), o None."""
+        i = self._indice(x, y)
+        return self.zonas[i] if i >= 0 else None
+
+    def deslizar(self, x, y, dx, dy):
+        """
+        Mueve (x, y) en (dx, dy) deslizándose por las paredes: si el destino no
+        es transitable se prueba a mover sólo en x y, si tampoco, sólo en y.
+        Devuelve (x, y, choque_x, choque_y), donde choque_x/choque_y indican
+        el eje en el que no se ha podido avanzar.
+        """
+        if self.is_walkable(x + dx, y + dy):
+            return x + dx, y + dy, False, False
+        if self.is_walkable(x + dx, y):
+            return x + dx, y, False, True
+        if self.is_walkable(x, y + dy):
+            return x, y + dy, True, False
+        return x, y, True, True
+
+    def transitables(self, xs, ys):
+        """Versión por lotes de is_walkable: máscara de los puntos (xs[i], ys[i]) dentro de alguna zona."""
+        indices = np.minimum(np.maximum(np.floor((ys, xs)), -1), self._limites).astype(np.intp)
+        return self._mapa_borde[indices[0], indices[1]] >= 0
+
+    def deslizar_lote(self, xs, ys, dxs, dys):
+        """
+        Versión por lotes de deslizar (arrays de floats): devuelve (xs, ys,
+        choque_x, choque_y) con el mismo resultado que llamar a deslizar
+        punto a punto.
+        """
+        nxs, nys = xs + dxs, ys + dys
+        # Las tres pruebas (destino, sólo x, sólo y) en una sola consulta
+        libre, en_x, en_y = self.transitables(np.concatenate((nxs, nxs, xs)),
+                                              np.concatenate((nys, ys, nys))).reshape(3, -1)
+        avanza_x = libre | en_x
+        avanza_y = libre | (en_y & ~en_x)
+        return np.where(avanza_x, nxs, xs), np.where(avanza_y, nys, ys), ~avanza_x, ~avanza_y
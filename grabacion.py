@@ -0,0 +1,213 @@
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import numpy as np
+import protocolo
+
+# ==============================================================
+# GRABACIÓN DE LA SIMULACIÓN (REGISTRO BINARIO + ÍNDICE)
+# ==============================================================
+#
+# Una grabación son dos ficheros de sólo añadir:
+#
+#   <ruta>       línea CABECERA, una línea JSON con los metadatos del mundo
+#                (window_size, SCALE, dt, zone_rects) y, a continuación, una
+#                trama del protocolo v3 por tick: TIPO_CLAVE (estado completo)
+#                cada `cada_clave` ticks y TIPO_DELTA (pose del mosquito,
+#                gente añadida y eliminada, cola con el instante) en los
+#                demás. Los jugadores no se graban: van en las tramas
+#                TIPO_JUGADORES de cada conexión.
+#   <ruta>.idx   una entrada !QI por tick: offset de su trama en <ruta> y
+#                número del tick con el fotograma clave del que parte.
+#
+# Con el índice, encontrar cualquier tick es O(1) y reconstruirlo cuesta
+# como mucho `cada_clave` deltas. Las tramas son las mismas que se envían a
+# los clientes, así que grabar un tick casi siempre reutiliza la codificación
+# ya cacheada en el Snapshot. Codificar y escribir lo hace un hilo aparte,
+# nunca el hilo del tick.
+
+log = logging.getLogger("roomba.grabacion")
+
+# La versión cambia cuando lo hacen las tramas (2: índices de zona de 16 bits)
+CABECERA = b"ROOMBAREC 2\n"
+_ENTRADA = struct.Struct("!QI")
+_INDICE = np.dtype([("offset", ">u8"), ("clave", ">u4")])
+_TRAMA = struct.Struct("!IB")
+# Snapshots pendientes de grabar como mucho; si el disco no da abasto se descartan
+MAX_PENDIENTES = 256
+
+class Grabador:
+    """
+    Añade cada Snapshot publicado por un mundo a una grabación. registrar()
+    sólo lo deja en una cola acotada: la codificación y la escritura las
+    hace un hilo aparte, así que no ocurren con world.lock tomado. Si la
+    cola está llena el snapshot se descarta (se cuenta en `descartados`) y
+    el siguiente grabado es un delta con los cambios combinados desde el
+    último que se grabó, o un fotograma clave si ya no están en el registro.
+    Se vacía a disco en cada fotograma clave, de modo que un lector (o un
+    fallo) ve la grabación completa salvo, como mucho, los últimos
+    `cada_clave` ticks.
+    """
+
+    def __init__(self, ruta, world, cada_clave=100, max_pendientes=MAX_PENDIENTES):
+        self.ruta = ruta
+        self.cada_clave = cada_clave
+        self._datos = open(ruta, "wb")
+        self._indice = open(ruta + ".idx", "wb")
+        metadatos = {
+            "window_size": [world.window_width, world.window_height],
+            "SCALE": world.SCALE,
+            "dt": world.dt,
+            "zone_rects": world.zone_rects,
+        }
+        self._datos.write(CABECERA + json.dumps(metadatos).encode() + b"\n")
+        self._offset = self._datos.tell()
+        self.ticks = 0
+        self._ultimo = None  # seq del último snapshot grabado
+        self._clave = 0      # tick del último fotograma clave
+        self.descartados = 0
+        self.error = None    # OSError que detuvo la escritura, si lo hubo
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._hilo = threading.Thread(target=self._escribir, name="grabacion", daemon=True)
+        self._hilo.start()
+
+    def registrar(self, snapshot):
+        """Encola `snapshot` para grabarlo sin esperar (si la cola está llena se descarta)."""
+        try:
+            self._cola.put_nowait(snapshot)
+        except queue.Full:
+            self.descartados += 1
+
+    def _escribir(self):
+        while True:
+            snapshot = self._cola.get()
+            if snapshot is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._grabar(snapshot)
+            except OSError as e:
+                self.error = e
+                log.warning("No se pudo escribir la grabación %s: %s", self.ruta, e)
+
+    def _grabar(self, snapshot):
+        """Graba el tick de `snapshot` (un delta desde el anterior o un fotograma clave)."""
+        if snapshot.seq == self._ultimo:
+            return
+        trama = None
+        if self._ultimo is not None and self._ultimo < snapshot.seq \
+                and self.ticks - self._clave < self.cada_clave:
+            trama = snapshot.delta(self._ultimo)
+        if trama is None:
+            # Primer tick, clave periódica, mundo reiniciado o cambios ya fuera del registro
+            trama = snapshot.clave()
+            self._clave = self.ticks
+            self._datos.flush()
+            self._indice.flush()
+        self._datos.write(trama)
+        self._indice.write(_ENTRADA.pack(self._offset, self._clave))
+        self._offset += len(trama)
+        self._ultimo = snapshot.seq
+        self.ticks += 1
+
+    def cerrar(self):
+        """Graba lo que quede en la cola, para el hilo escritor y cierra los ficheros."""
+        self._cola.put(None)
+        self._hilo.join()
+        if self.descartados:
+            log.warning("Grabación %s: %d ticks descartados (el disco no daba abasto)",
+                        self.ruta, self.descartados)
+        self._datos.close()
+        self._indice.close()
+
+class LectorGrabacion:
+    """
+    Lee una grabación proyectada en memoria (mmap): trama(i) devuelve la del
+    tick i sin copiarla y sin leer las anteriores. Se puede abrir mientras se
+    sigue grabando; actualizar() incorpora los ticks escritos después.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._fichero = open(ruta, "rb")
+        self._mapa = mmap.mmap(self._fichero.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[:len(CABECERA)] != CABECERA:
+            if self._mapa[:10] == CABECERA[:10]:
+                raise ValueError(f"{ruta} es de otra versión de la grabación "
+                                 f"({bytes(self._mapa[:len(CABECERA)]).strip().decode(errors='replace')})")
+            raise ValueError(f"{ruta} no es una grabación de la simulación")
+        fin = self._mapa.find(b"\n", len(CABECERA))
+        self.metadatos = json.loads(self._mapa[len(CABECERA):fin])
+        self.zone_rects = {zona: tuple(rect) for zona, rect in self.metadatos["zone_rects"].items()}
+        self.zonas = list(self.zone_rects)
+        self._fichero_indice = open(ruta + ".idx", "rb")
+        self._mapa_indice = None
+        self.indice = np.empty(0, dtype=_INDICE)
+        self.actualizar()
+
+    def actualizar(self):
+        """Vuelve a proyectar los ficheros para ver los ticks grabados desde la apertura."""
+        # Las proyecciones anteriores no se cierran: las liberan las vistas que aún las usen
+        tamaño = os.fstat(self._fichero.fileno()).st_size
+        if tamaño > len(self._mapa):
+            self._mapa = mmap.mmap(self._fichero.fileno(), 0, access=mmap.ACCESS_READ)
+        tamaño_indice = os.fstat(self._fichero_indice.fileno()).st_size
+        if tamaño_indice >= _INDICE.itemsize:
+            self._mapa_indice = mmap.mmap(self._fichero_indice.fileno(), 0, access=mmap.ACCESS_READ)
+            indice = np.frombuffer(self._mapa_indice, dtype=_INDICE, count=tamaño_indice // _INDICE.itemsize)
+            # Descarta las entradas cuya trama no se llegó a escribir entera
+            n = len(indice)
+            while n and not self._completa(int(indice["offset"][n - 1])):
+                n -= 1
+            self.indice = indice[:n]
+        return len(self)
+
+    def _completa(self, offset):
+        if offset + _TRAMA.size > len(self._mapa):
+            return False
+        longitud, _ = _TRAMA.unpack_from(self._mapa, offset)
+        return offset + _TRAMA.size + longitud <= len(self._mapa)
+
+    def __len__(self):
+        return len(self.indice)
+
+    def trama(self, i):
+        """(tipo, cuerpo) de la trama del tick i; el cuerpo es una vista del fichero."""
+        offset = int(self.indice["offset"][i])
+        longitud, tipo = _TRAMA.unpack_from(self._mapa, offset)
+        inicio = offset + _TRAMA.size
+        return tipo, memoryview(self._mapa)[inicio:inicio + longitud]
+
+    def clave(self, i):
+        """Tick del fotograma clave desde el que se reconstruye el tick i."""
+        return int(self.indice["clave"][i])
+
+    def tramas(self, inicio=0, fin=None):
+        """Recorre las tramas de los ticks [inicio, fin)."""
+        fin = len(self) if fin is None else min(fin, len(self))
+        for i in range(inicio, fin):
+            yield self.trama(i)
+
+    def decodificar(self, i):
+        """
+        Decodifica el tick i. Devuelve (tipo, seq, cabecera, particulas o
+        añadidas, eliminadas), con particulas = {id: (x, y, zona)} en los
+        fotogramas clave y eliminadas None en ellos.
+        """
+        tipo, cuerpo = self.trama(i)
+        if tipo == protocolo.TIPO_CLAVE:
+            seq, cabecera, particulas = protocolo.decodificar_clave(cuerpo)
+            return tipo, seq, cabecera, particulas, None
+        seq, _, cabecera, añadidas, eliminadas = protocolo.decodificar_delta(cuerpo, self.zonas)
+        return tipo, seq, cabecera, añadidas, eliminadas
+
+    def cerrar(self):
+        self.indice = np.empty(0, dtype=_INDICE)
+        self._mapa_indice = self._mapa = None
+        self._fichero.close()
+        self._fichero_indice.close()
@@ -0,0 +1,183 @@
+import re
+import numpy as np
+import protocolo
+
+# ==============================================================
+# ÁREAS DE INTERÉS POR CLIENTE (VISTA O RADIO ALREDEDOR DEL JUGADOR)
+# ==============================================================
+#
+# Un cliente con tramas (protocolo v2/v3) puede pedir que sólo se le envíe
+# la gente que cae dentro de su área de interés, con comandos de texto en
+# tramas TIPO_COMANDO:
+#
+#   "VIEW x0 y0 x1 y1"   rectángulo fijo en píxeles del mundo (p. ej. su vista)
+#   "RADIUS r"           círculo de radio r alrededor de su chancla
+#   "VIEW ALL"           volver a recibir todo el mundo
+#
+# Del resto sólo recibe el agregado: la cola de todas las tramas lleva el
+# total de gente por zona. Las partículas del área se buscan en la rejilla
+# del Snapshot (particulas.RejillaFija), así que la red no toma world.lock.
+# Los clientes JSON (v1) siempre reciben el mundo completo.
+#
+# Los jugadores van aparte, en una trama TIPO_JUGADORES por conexión
+# (ReplicadorJugadores): el suyo y los que están dentro de su área, y sólo
+# cuando cambian su posición o su última entrada. Sin área (o con VIEW ALL)
+# no se le envían todos, sino los que están a menos de RADIO_JUGADORES de
+# su chancla (ninguno más hasta que entra en el mundo con su primera
+# entrada), y nunca más de MAX_JUGADORES: si hay más, los más cercanos al
+# suyo. Así el tamaño de lo que recibe cada cliente no crece con el número
+# de conexiones.
+
+# Jugadores que ve un cliente sin área: los de este radio (px) alrededor del suyo
+RADIO_JUGADORES = 150
+# Jugadores por cliente como mucho (el suyo incluido)
+MAX_JUGADORES = 32
+
+_AREA = re.compile(rb"VIEW\s+ALL|VIEW\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)|RADIUS\s+(\d+)")
+
+class AreaInteres:
+    """Área de interés de un cliente: un rectángulo (x0, y0, x1, y1), un radio o, sin ninguno, todo el mundo."""
+
+    def __init__(self, rect=None, radio=None):
+        self.rect = rect
+        self.radio = radio
+
+    @property
+    def completa(self):
+        return self.rect is None and self.radio is None
+
+    @property
+    def clave(self):
+        """Clave con la que se comparten las codificaciones (None si depende del jugador)."""
+        return ("rect",) + self.rect if self.rect is not None else None
+
+    def contiene(self, snapshot, jugador, xs, ys):
+        """Máscara de los puntos (xs[i], ys[i]) dentro del área (los mismos límites que filas())."""
+        if self.rect is not None:
+            x0, y0, x1, y1 = self.rect
+            return (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+        if self.radio is not None:
+            posicion = snapshot.jugadores.get(jugador)
+            if posicion is None:
+                return np.zeros(len(xs), dtype=bool)
+            dx, dy = xs - posicion[0], ys - posicion[1]
+            return dx * dx + dy * dy < self.radio * self.radio
+        return np.ones(len(xs), dtype=bool)
+
+    def filas(self, snapshot, jugador):
+        """Filas del snapshot dentro del área; con radio, vacía si el jugador aún no está en el mundo."""
+        rejilla = snapshot.rejilla()
+        if self.rect is not None:
+            return rejilla.en_rect(*self.rect)
+        posicion = snapshot.jugadores.get(jugador)
+        if posicion is None:
+            return np.empty(0, dtype=np.int64)
+        return rejilla.en_radio(posicion[0], posicion[1], self.radio)
+
+def parsear_area(cuerpo):
+    """AreaInteres pedida en el cuerpo de un comando, o None si no es un comando de área."""
+    m = _AREA.fullmatch(bytes(cuerpo).strip())
+    if m is None:
+        return None
+    if m.group(1) is not None:
+        x0, y0, x1, y1 = (int(v) for v in m.group(1, 2, 3, 4))
+        return AreaInteres(rect=(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    if m.group(5) is not None:
+        return AreaInteres(radio=int(m.group(5)))
+    return AreaInteres()
+
+class ReplicadorInteres:
+    """
+    Replicación (v3) para un cliente con área de interés. Cada cliente ve
+    un subconjunto distinto, así que sus deltas no se pueden compartir: se
+    calculan comparando los ids visibles en el snapshot con los que ya
+    tiene el cliente (arrays ordenados, np.isin), con la última trama
+    enviada como base (TCP las entrega en orden). Su tamaño depende de lo
+    que entra o sale del área, no del tamaño del mundo.
+    """
+
+    def __init__(self, intervalo_clave=100):
+        self.intervalo_clave = intervalo_clave
+        self.enviadas = None      # ids (ordenados) que tendrá el cliente tras la última trama
+        self.ultimo = None        # seq de la última trama enviada
+        self.ultima_clave = None  # seq del último fotograma clave enviado
+        self._indice_zona = None  # zonas del último fotograma clave
+
+    def confirmar(self, seq):
+        """Los ACK no hacen falta: la base de cada delta es la trama anterior."""
+
+    def siguiente_trama(self, snapshot, filas, clave=None):
+        """
+        Trama para el snapshot con las partículas de `filas`: un fotograma
+        clave (compartido entre áreas con la misma `clave`) si es el primero,
+        toca uno periódico, cambiaron las zonas o el mundo se reinició; si
+        no, un delta desde la trama anterior.
+        """
+        if self.enviadas is None or snapshot.seq <= self.ultimo \
+                or snapshot.seq - self.ultima_clave >= self.intervalo_clave \
+                or snapshot.indice_zona is not self._indice_zona:
+            trama = snapshot.clave_filas(filas, clave)
+            self.enviadas = np.sort(snapshot.columnas()[4][filas])
+            self.ultima_clave = snapshot.seq
+            self._indice_zona = snapshot.indice_zona
+        else:
+            _, xs, ys, zonas, ids = snapshot.subconjunto(filas)
+            nuevas = ~np.isin(ids, self.enviadas, assume_unique=True)
+            eliminadas = self.enviadas[~np.isin(self.enviadas, ids, assume_unique=True)]
+            trama = protocolo.codificar_delta_columnas(
+                snapshot.seq, self.ultimo, snapshot.mosquito_pos, snapshot.mosquito_vel, snapshot.level,
+                ids[nuevas], xs[nuevas], ys[nuevas], zonas[nuevas], eliminadas, snapshot.cola())
+            self.enviadas = np.sort(ids)
+        self.ultimo = snapshot.seq
+        return trama
+
+class ReplicadorJugadores:
+    """
+    Jugadores que se envían a un cliente con tramas (v2/v3): el suyo y los
+    de su área de interés, o sin área los que están a menos de `radio` del
+    suyo, y como mucho `maximo` (los más cercanos al suyo). Cada trama TIPO_JUGADORES lleva
+    sólo los que cambiaron (posición o última entrada) desde la anterior que
+    se le envió y los que dejó de ver, comparando columnas ordenadas por id
+    con lo enviado. Si ni los jugadores del snapshot ni el área han cambiado
+    desde la última comparación no hay nada que hacer.
+    """
+
+    def __init__(self, radio=RADIO_JUGADORES, maximo=MAX_JUGADORES):
+        self.radio = radio
+        self.maximo = maximo
+        self.ids = np.empty(0, dtype=np.int64)  # ids (ordenados) que tiene el cliente
+        self.valores = np.empty((0, 3))         # y sus (x, y, última entrada)
+        self._visto = None                      # (jugadores, área) de la última comparación
+
+    def siguiente_trama(self, snapshot, jugador, area=None):
+        """Trama TIPO_JUGADORES para el snapshot, o None si el cliente ya lo tiene todo."""
+        if self._visto is not None and self._visto[0] is snapshot.jugadores and self._visto[1] is area:
+            return None
+        self._visto = (snapshot.jugadores, area)
+        ids, valores = snapshot.columnas_jugadores()
+        if area is None or area.completa:
+            area = AreaInteres(radio=self.radio)
+        propio = ids == jugador
+        visibles = np.flatnonzero(area.contiene(snapshot, jugador, valores[:, 0], valores[:, 1]) | propio)
+        if len(visibles) > self.maximo:
+            # Los más cercanos al suyo (el suyo primero, a distancia 0); sin él, al centro del área
+            if propio.any():
+                cx, cy = valores[propio][0, :2]
+            else:
+                x0, y0, x1, y1 = area.rect
+                cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+            d2 = (valores[visibles, 0] - cx) ** 2 + (valores[visibles, 1] - cy) ** 2
+            d2[propio[visibles]] = -1
+            visibles = np.sort(visibles[np.argsort(d2, kind="stable")[:self.maximo]])
+        ids, valores = ids[visibles], valores[visibles]
+        # Posición de cada visible entre los enviados (si estaba)
+        indices = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        if len(self.ids):
+            cambiados = (self.ids[indices] != ids) | (self.valores[indices] != valores).any(axis=1)
+        else:
+            cambiados = np.ones(len(ids), dtype=bool)
+        eliminados = self.ids[~np.isin(self.ids, ids, assume_unique=True)]
+        self.ids, self.valores = ids, valores
+        if not cambiados.any() and not len(eliminados):
+            return None
+        return protocolo.codificar_jugadores(ids[cambiados], valores[cambiados], eliminados)
@@ -0,0 +1,97 @@
+import collections
+
+# ==============================================================
+# INTERPOLACIÓN DEL ESTADO Y PREDICCIÓN DEL JUGADOR (CLIENTE)
+# ==============================================================
+
+# Paso fijo de RoombaWorld: mosquito_vel está en píxeles por tick
+DT_SERVIDOR = 0.05
+
+class BufferInterpolacion:
+    """
+    Buffer de jitter de la posición del mosquito. Guarda las últimas
+    muestras (instante del tick en el servidor, posición, velocidad) y
+    estima el desfase entre el reloj local y el del servidor con el paquete
+    que menos ha tardado. Se dibuja con un retraso fijo respecto al
+    servidor, interpolando entre las dos muestras que rodean ese instante;
+    si todavía no hay una muestra posterior se extrapola con mosquito_vel
+    (como mucho `max_extrapolacion` segundos).
+    """
+
+    def __init__(self, retraso=0.1, max_extrapolacion=0.25, capacidad=32, dt=DT_SERVIDOR):
+        self.retraso = retraso
+        self.max_extrapolacion = max_extrapolacion
+        self.dt = dt
+        self._muestras = collections.deque(maxlen=capacidad)  # (tiempo, pos, vel)
+        self._desfase = None  # reloj local - reloj del servidor
+
+    def añadir(self, tiempo, pos, vel, llegada):
+        """Añade el estado del tick `tiempo` recibido en el instante local `llegada`."""
+        if self._muestras and tiempo <= self._muestras[-1][0]:
+            if tiempo > self._muestras[-1][0] - 1.0:
+                return  # repetido o desordenado
+            # El reloj del servidor ha vuelto atrás (reinicio): se empieza de cero
+            self._muestras.clear()
+            self._desfase = None
+        desfase = llegada - tiempo
+        if self._desfase is None or desfase < self._desfase:
+            self._desfase = desfase
+        else:
+            # Sube despacio para seguir la deriva entre relojes sin copiar el jitter
+            self._desfase += 0.01 * (desfase - self._desfase)
+        self._muestras.append((tiempo, tuple(pos), tuple(vel)))
+
+    def posicion(self, ahora):
+        """Posición del mosquito a dibujar en el instante local `ahora`, o None."""
+        if not self._muestras:
+            return None
+        t = ahora - self._desfase - self.retraso
+        tiempo, pos, vel = self._muestras[-1]
+        if t >= tiempo:
+            ticks = min(t - tiempo, self.max_extrapolacion) / self.dt
+            return (pos[0] + vel[0] * ticks, pos[1] + vel[1] * ticks)
+        siguiente = self._muestras[-1]
+        for muestra in reversed(self._muestras):
+            if muestra[0] <= t:
+                f = (t - muestra[0]) / (siguiente[0] - muestra[0])
+                return (muestra[1][0] + f * (siguiente[1][0] - muestra[1][0]),
+                        muestra[1][1] + f * (siguiente[1][1] - muestra[1][1]))
+            siguiente = muestra
+        return self._muestras[0][1]
+
+class PrediccionJugador:
+    """
+    Predicción local de la chancla cuando el servidor es quien la mueve.
+    Cada entrada (en pasos) se aplica en el acto y se guarda con su número
+    (SEQ). Al llegar el estado del servidor se parte de la posición que él
+    calculó y se vuelven a aplicar las entradas que aún no había procesado.
+    `plano` es el geometria.Plano de las zonas, el mismo con el que el
+    servidor desliza la chancla por los bordes.
+    """
+
+    def __init__(self, pos, velocidad, plano, max_pendientes=256):
+        self.pos = list(pos)
+        self.velocidad = velocidad
+        self.plano = plano
+        self.siguiente = 1
+        self._pendientes = collections.deque(maxlen=max_pendientes)  # (seq, dx, dy)
+
+    def _aplicar(self, dx, dy):
+        x, y, _, _ = self.plano.deslizar(self.pos[0], self.pos[1], dx * self.velocidad, dy * self.velocidad)
+        self.pos = [x, y]
+
+    def mover(self, dx, dy):
+        """Aplica una entrada localmente y devuelve su SEQ para enviarlo al servidor."""
+        seq = self.siguiente
+        self.siguiente += 1
+        self._pendientes.append((seq, dx, dy))
+        self._aplicar(dx, dy)
+        return seq
+
+    def reconciliar(self, x, y, ultima_entrada):
+        """Corrige con la posición del servidor tras aplicar hasta `ultima_entrada`."""
+        while self._pendientes and self._pendientes[0][0] <= ultima_entrada:
+            self._pendientes.popleft()
+        self.pos = [x, y]
+        for _, dx, dy in self._pendientes:
+            self._aplicar(dx, dy)
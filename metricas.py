@@ -0,0 +1,197 @@
+import bisect
+import collections
+import sys
+import threading
+import time
+
+# ==============================================================
+# MÉTRICAS DEL SERVIDOR Y PERFILADOR POR MUESTREO
+# ==============================================================
+#
+# Las métricas se recogen en los caminos calientes con el menor coste
+# posible (un bisect y tres sumas por observación, sin locks propios: cada
+# histograma tiene un único escritor o se observa con world.lock tomado) y
+# se exponen en texto plano con el formato de exposición de Prometheus
+# (servidor.py --puerto-stats). Los tiempos van en milisegundos.
+
+LIMITES_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{clave}="{valor}"' for clave, valor in etiquetas.items()) + "}"
+
+class Histograma:
+    """Histograma de cubetas fijas (límites superiores en ms) con suma y máximo."""
+
+    def __init__(self, limites=LIMITES_MS):
+        self.limites = tuple(limites)
+        self.cubetas = [0] * (len(self.limites) + 1)
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.cubetas[bisect.bisect_left(self.limites, valor)] += 1
+        self.n += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, p):
+        """Cota superior del percentil `p` (0-100): el límite de su cubeta."""
+        if not self.n:
+            return 0.0
+        objetivo = p / 100 * self.n
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def resumen(self):
+        return {
+            "n": self.n,
+            "media_ms": self.suma / self.n if self.n else 0.0,
+            "p50_ms": self.percentil(50),
+            "p99_ms": self.percentil(99),
+            "max_ms": self.maximo,
+        }
+
+    def exposicion(self, nombre, etiquetas=None):
+        """Líneas del histograma en formato Prometheus (cubetas acumuladas)."""
+        etiquetas = dict(etiquetas or {})
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + ("+Inf",), self.cubetas):
+            acumulado += cuenta
+            lineas.append(f"{nombre}_bucket{_etiquetas(dict(etiquetas, le=limite))} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {self.suma:.6g}")
+        lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {self.n}")
+        return lineas
+
+class PerfilMuestreo:
+    """
+    Perfilador por muestreo que se puede activar y desactivar en caliente:
+    un hilo toma cada `intervalo` segundos la pila de los demás hilos
+    (sys._current_frames) y cuenta la línea que se está ejecutando y las
+    funciones que aparecen en la pila. No instrumenta nada mientras está
+    parado.
+    """
+
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self._hilo = None
+        self._parar = threading.Event()
+        self.muestras = 0
+        self.lineas = collections.Counter()
+        self.funciones = collections.Counter()
+
+    @property
+    def activo(self):
+        return self._hilo is not None
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self.muestras = 0
+        self.lineas.clear()
+        self.funciones.clear()
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._muestrear, name="perfil", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Para el muestreo y devuelve el informe."""
+        if self._hilo is not None:
+            self._parar.set()
+            self._hilo.join()
+            self._hilo = None
+        return self.informe()
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            for hilo, frame in sys._current_frames().items():
+                if hilo == propio:
+                    continue
+                self.muestras += 1
+                codigo = frame.f_code
+                self.lineas[f"{codigo.co_filename}:{frame.f_lineno} ({codigo.co_name})"] += 1
+                vistas = set()
+                while frame is not None:
+                    codigo = frame.f_code
+                    vistas.add(f"{codigo.co_filename}:{codigo.co_firstlineno} ({codigo.co_name})")
+                    frame = frame.f_back
+                self.funciones.update(vistas)
+
+    def informe(self, n=20):
+        """Texto con las `n` líneas y funciones con más muestras."""
+        total = max(1, self.muestras)
+        lineas = [f"# muestras {self.muestras} (cada {self.intervalo * 1000:.0f} ms, todos los hilos)",
+                  "# propio (línea en ejecución)"]
+        lineas += [f"{cuenta / total:7.1%} {cuenta:8d} {donde}" for donde, cuenta in self.lineas.most_common(n)]
+        lineas.append("# acumulado (función en la pila)")
+        lineas += [f"{cuenta / total:7.1%} {cuenta:8d} {donde}" for donde, cuenta in self.funciones.most_common(n)]
+        return "\n".join(lineas) + "\n"
+
+class MetricasServidor:
+    """
+    Métricas del proceso servidor: tiempo de codificación de cada mensaje y
+    de cada ronda del difusor, bytes y fallos de envío totales, clientes
+    desconectados por lentos, más el perfilador. Lo que es de cada sala
+    (histogramas de tick y de espera del lock, gente por zona) o de cada
+    conexión (cola, snapshots descartados, frecuencia, bytes enviados) se
+    lee de ellas al generar el texto.
+    """
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.codificacion = Histograma()
+        self.difusion = Histograma()
+        self.bytes_enviados = 0
+        self.mensajes_enviados = 0
+        self.fallos_envio = 0
+        self.desconexiones_lentas = 0
+        self.conexiones_totales = 0
+        self.perfil = PerfilMuestreo()
+
+    def texto(self, salas, conexiones):
+        """Todas las métricas en el formato de exposición de Prometheus."""
+        lineas = [f"roomba_activo_segundos {time.monotonic() - self.inicio:.3f}",
+                  f"roomba_conexiones {len(conexiones)}",
+                  f"roomba_conexiones_total {self.conexiones_totales}",
+                  f"roomba_bytes_enviados_total {self.bytes_enviados}",
+                  f"roomba_mensajes_enviados_total {self.mensajes_enviados}",
+                  f"roomba_fallos_envio_total {self.fallos_envio}",
+                  f"roomba_desconexiones_lentas_total {self.desconexiones_lentas}",
+                  f"roomba_perfil_activo {int(self.perfil.activo)}"]
+        lineas += self.codificacion.exposicion("roomba_codificacion_ms")
+        lineas += self.difusion.exposicion("roomba_difusion_ms")
+
+        for id_sala, sala in salas.items():
+            snapshot = sala.snapshot
+            lineas.append(f'roomba_tick{{sala="{id_sala}"}} {snapshot.seq}')
+            lineas.append(f'roomba_nivel{{sala="{id_sala}"}} {snapshot.level}')
+            for zona, cuenta in zip(snapshot.indice_zona, snapshot.conteos):
+                lineas.append(f'roomba_particulas{{sala="{id_sala}",zona="{zona}"}} {cuenta}')
+            histograma = getattr(sala, "histograma_tick", None)
+            if histograma is not None:
+                lineas += histograma.exposicion("roomba_tick_ms", {"sala": id_sala})
+            lock = getattr(sala, "lock", None)
+            if lock is not None:
+                lineas += lock.histograma_espera.exposicion("roomba_espera_lock_ms", {"sala": id_sala})
+
+        for conexion in conexiones:
+            etiquetas = _etiquetas({"cliente": f"{conexion.addr[0]}:{conexion.addr[1]}", "jugador": conexion.jugador})
+            duracion = max(1e-9, time.monotonic() - conexion.inicio)
+            transporte = conexion.writer.transport
+            lineas.append(f"roomba_cliente_cola_mensajes{etiquetas} {conexion.salida.qsize()}")
+            lineas.append(f"roomba_cliente_cola_bytes{etiquetas} {transporte.get_write_buffer_size()}")
+            lineas.append(f"roomba_cliente_descartados_total{etiquetas} {conexion.salida.descartados}")
+            lineas.append(f"roomba_cliente_frecuencia_hz{etiquetas} {conexion.frecuencia}")
+            lineas.append(f"roomba_cliente_bytes_enviados_total{etiquetas} {conexion.bytes_enviados}")
+            lineas.append(f"roomba_cliente_mensajes_enviados_total{etiquetas} {conexion.mensajes_enviados}")
+            lineas.append(f"roomba_cliente_bytes_por_segundo{etiquetas} {conexion.bytes_enviados / duracion:.1f}")
+        return "\n".join(lineas) + "\n"
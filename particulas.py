@@ -0,0 +1,364 @@
+import itertools
+import numpy as np
+
+# ==============================================================
+# ALMACÉN DE "GENTE DURMIENDO" (STRUCT-OF-ARRAYS + REJILLA UNIFORME)
+# ==============================================================
+
+# Por debajo de este número de parejas punto-partícula, k_cercanas_lote
+# calcula todas las distancias en lugar de recorrer la rejilla
+_MAX_PARES_FUERZA_BRUTA = 4096
+# Copias parciales seguidas de copiar_cambios antes de volver a copiar todo
+_MAX_COPIAS_PARCIALES = 32
+
+class AlmacenParticulas:
+    """
+    Almacén compacto de partículas en columnas NumPy preasignadas
+    (x, y, zona, id) con borrado por intercambio con las últimas filas
+    (swap-remove por lotes). Un índice espacial por rejilla uniforme
+    (celda -> filas) permite que las consultas por lotes (pares_en_radio,
+    k_cercanas_lote) sólo recorran las celdas próximas; las distancias se
+    calculan vectorizadas. Para publicar, copiar_cambios sólo copia las filas
+    escritas desde la publicación anterior.
+    """
+
+    def __init__(self, zonas, tam_celda=32, capacidad=1024):
+        self.zonas = list(zonas)
+        self.indice_zona = {zona: i for i, zona in enumerate(self.zonas)}
+        self.tam_celda = tam_celda
+        self.n = 0
+        self.x = np.empty(capacidad, dtype=np.int32)
+        self.y = np.empty(capacidad, dtype=np.int32)
+        self.zona = np.empty(capacidad, dtype=np.uint16)
+        self.ids = np.empty(capacidad, dtype=np.int64)
+        self.conteos = np.zeros(len(self.zonas), dtype=np.int64)
+        self._celdas = {}  # (cx, cy) -> set(filas)
+        self._siguiente_id = 0
+        # Se incrementa con cada inserción o borrado (permite reutilizar copias)
+        self.version = 0
+        # Filas escritas desde la última copiar_cambios (arrays) y versión copiada entonces
+        # (None = la próxima copia será completa y no hace falta anotar nada)
+        self._filas_cambiadas = []
+        self._n_cambiadas = 0
+        self._version_copiada = None
+        self._copias_parciales = 0
+        # Límites (en celdas) de la región ocupada, para acotar las celdas que se recorren
+        self._min_celda = None
+        self._max_celda = None
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def siguiente_id(self):
+        """Identificador que recibirá la próxima partícula insertada sin `ids`."""
+        return self._siguiente_id
+
+    @siguiente_id.setter
+    def siguiente_id(self, valor):
+        # Nunca hacia atrás: los ids ya asignados no se reutilizan
+        self._siguiente_id = max(self._siguiente_id, int(valor))
+
+    def _crecer(self):
+        capacidad = 2 * len(self.x)
+        for nombre in ('x', 'y', 'zona', 'ids'):
+            viejo = getattr(self, nombre)
+            nuevo = np.empty(capacidad, dtype=viejo.dtype)
+            nuevo[:self.n] = viejo[:self.n]
+            setattr(self, nombre, nuevo)
+
+    def insertar(self, x, y, zona):
+        """Añade una partícula y devuelve su identificador."""
+        return self.insertar_lote([x], [y], [zona])[0]
+
+    def insertar_lote(self, xs, ys, zonas, ids=None):
+        """
+        Añade un lote de partículas (columnas asignadas de una vez) y devuelve
+        la lista de sus identificadores. Si se indican `ids` se usan esos en
+        lugar de asignar nuevos (réplicas de un almacén en otro proceso).
+        """
+        k = len(xs)
+        if k == 0:
+            return []
+        while self.n + k > len(self.x):
+            self._crecer()
+        inicio, fin = self.n, self.n + k
+        indices = np.fromiter((self.indice_zona[zona] for zona in zonas), dtype=np.uint16, count=k)
+        if ids is None:
+            ids = np.arange(self._siguiente_id, self._siguiente_id + k, dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+        self.x[inicio:fin] = xs
+        self.y[inicio:fin] = ys
+        self.zona[inicio:fin] = indices
+        self.ids[inicio:fin] = ids
+        np.add.at(self.conteos, indices, 1)
+        self._siguiente_id = max(self._siguiente_id, int(ids.max()) + 1)
+        self.n = fin
+        self.version += 1
+        self._anotar_cambios(np.arange(inicio, fin))
+        # Celdas calculadas en bloque y recorridas como listas (lotes grandes: réplicas, checkpoints)
+        cxs = np.floor_divide(self.x[inicio:fin], self.tam_celda)
+        cys = np.floor_divide(self.y[inicio:fin], self.tam_celda)
+        celdas = self._celdas
+        for fila, celda in zip(range(inicio, fin), zip(cxs.tolist(), cys.tolist())):
+            celdas.setdefault(celda, set()).add(fila)
+        minimo = [int(cxs.min()), int(cys.min())]
+        maximo = [int(cxs.max()), int(cys.max())]
+        if self._min_celda is None:
+            self._min_celda, self._max_celda = minimo, maximo
+        else:
+            self._min_celda = [min(a, b) for a, b in zip(self._min_celda, minimo)]
+            self._max_celda = [max(a, b) for a, b in zip(self._max_celda, maximo)]
+        return ids.tolist()
+
+    def eliminar_filas(self, filas):
+        """
+        Elimina las filas indicadas y devuelve una lista de tuplas (id, x, y,
+        zona) con las partículas eliminadas. Es un swap-remove por lotes: los
+        huecos que quedan por debajo del nuevo final se rellenan con las
+        filas supervivientes de más allá, con una asignación por columna, y
+        en la rejilla sólo se tocan las celdas de las filas afectadas.
+        """
+        filas = np.sort(np.asarray(filas, dtype=np.intp))
+        if filas.size == 0:
+            return []
+        filas = filas[np.concatenate(([True], filas[1:] != filas[:-1]))]
+        n = self.n - filas.size
+        xs, ys, zonas = self.x[filas], self.y[filas], self.zona[filas]
+        eliminadas = list(zip(self.ids[filas].tolist(), xs.tolist(), ys.tolist(),
+                              [self.zonas[z] for z in zonas.tolist()]))
+        self.conteos -= np.bincount(zonas, minlength=len(self.conteos))
+        # Huecos por debajo del nuevo final y supervivientes por encima (hay tantos como huecos)
+        huecos = filas[filas < n]
+        supervivientes = np.ones(self.n - n, dtype=bool)
+        supervivientes[filas[filas >= n] - n] = False
+        origenes = np.flatnonzero(supervivientes) + n
+        celdas = self._celdas
+        t = self.tam_celda
+        celdas_eliminadas = list(zip(np.floor_divide(xs, t).tolist(), np.floor_divide(ys, t).tolist()))
+        for fila, celda in zip(filas.tolist(), celdas_eliminadas):
+            celdas[celda].discard(fila)
+        if huecos.size:
+            # Cada superviviente movido sigue en su celda, con el número de fila del hueco
+            celdas_origen = zip(np.floor_divide(self.x[origenes], t).tolist(),
+                                np.floor_divide(self.y[origenes], t).tolist())
+            for origen, hueco, celda in zip(origenes.tolist(), huecos.tolist(), celdas_origen):
+                filas_celda = celdas[celda]
+                filas_celda.discard(origen)
+                filas_celda.add(hueco)
+            for columna in (self.x, self.y, self.zona, self.ids):
+                columna[huecos] = columna[origenes]
+        for celda in set(celdas_eliminadas):
+            if not celdas[celda]:
+                del celdas[celda]
+        self.n = n
+        self.version += 1
+        self._anotar_cambios(huecos)
+        return eliminadas
+
+    def _anotar_cambios(self, filas):
+        if self._version_copiada is None:
+            return
+        self._filas_cambiadas.append(filas)
+        self._n_cambiadas += len(filas)
+        if self._n_cambiadas > self.n // 4:
+            # Ha cambiado tanto que sale más a cuenta copiarlo todo
+            self._version_copiada = None
+            self._filas_cambiadas = []
+            self._n_cambiadas = 0
+
+    def eliminar_ids(self, ids):
+        """Elimina las partículas con los identificadores indicados (ver eliminar_filas)."""
+        if len(ids) == 0:
+            return []
+        filas = np.flatnonzero(np.isin(self.ids[:self.n], np.asarray(ids, dtype=np.int64)))
+        return self.eliminar_filas(filas)
+
+    def pares_en_radio(self, xs, ys, radio):
+        """
+        Búsqueda por radio para todos los puntos (xs[i], ys[i]) a la vez
+        (arrays de floats). Devuelve (puntos, filas, d2): una entrada por cada pareja
+        punto-partícula a distancia estrictamente menor que `radio`, con su
+        distancia al cuadrado. Las celdas de todos los puntos se recorren en
+        una sola pasada y las distancias se calculan de una vez.
+        """
+        vacio = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+        if self.n == 0 or len(xs) == 0:
+            return vacio
+        t = self.tam_celda
+        # Celdas de cada punto, recortadas a la región ocupada
+        xy = np.column_stack((xs, ys))
+        bajas = np.maximum(np.floor_divide(xy - radio, t), self._min_celda).astype(np.int64).tolist()
+        altas = np.minimum(np.floor_divide(xy + radio, t), self._max_celda).astype(np.int64).tolist()
+        celdas = self._celdas
+        conjuntos = []
+        puntos = []
+        for i, ((a, b), (c, d)) in enumerate(zip(bajas, altas)):
+            for cx in range(a, c + 1):
+                for cy in range(b, d + 1):
+                    filas = celdas.get((cx, cy))
+                    if filas:
+                        conjuntos.append(filas)
+                        puntos.append(i)
+        if not conjuntos:
+            return vacio
+        tamaños = np.fromiter(map(len, conjuntos), dtype=np.intp, count=len(conjuntos))
+        filas = np.fromiter(itertools.chain.from_iterable(conjuntos), dtype=np.intp, count=int(tamaños.sum()))
+        puntos = np.repeat(np.asarray(puntos, dtype=np.intp), tamaños)
+        dx = self.x[filas] - xs[puntos]
+        dy = self.y[filas] - ys[puntos]
+        d2 = dx * dx + dy * dy
+        dentro = d2 < radio * radio
+        return puntos[dentro], filas[dentro], d2[dentro]
+
+    def k_cercanas_lote(self, xs, ys, k):
+        """
+        Las (como mucho) `k` partículas más cercanas a cada punto (xs[i],
+        ys[i]), con la forma de pares_en_radio. Si hay pocas parejas posibles
+        se calculan todas las distancias; si no, se busca en la rejilla con
+        un radio que empieza en una celda y se dobla sólo para los puntos
+        que aún no tienen `k` partículas dentro (con `k` dentro del radio,
+        son exactamente las `k` más cercanas).
+        """
+        m, n = len(xs), self.n
+        k = min(k, n)
+        if m == 0 or k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        if m * n <= _MAX_PARES_FUERZA_BRUTA:
+            dx = self.x[:n] - xs[:, None]
+            dy = self.y[:n] - ys[:, None]
+            d2 = dx * dx + dy * dy
+            filas = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < n else np.broadcast_to(np.arange(n), (m, n))
+            puntos = np.repeat(np.arange(m), k)
+            filas = filas.ravel()
+            return puntos, filas, d2[puntos, filas]
+        partes = []
+        pendientes = np.arange(m)
+        radio = self.tam_celda
+        while pendientes.size:
+            puntos, filas, d2 = self.pares_en_radio(xs[pendientes], ys[pendientes], radio)
+            listos = np.bincount(puntos, minlength=pendientes.size) >= k
+            elegidos = listos[puntos]
+            puntos, filas, d2 = puntos[elegidos], filas[elegidos], d2[elegidos]
+            # Las k más cercanas de cada punto: orden por (punto, d2) y posición dentro del punto
+            orden = np.lexsort((d2, puntos))
+            puntos, filas, d2 = puntos[orden], filas[orden], d2[orden]
+            rango = np.arange(puntos.size) - np.searchsorted(puntos, puntos)
+            primeras = rango < k
+            partes.append((pendientes[puntos[primeras]], filas[primeras], d2[primeras]))
+            pendientes = pendientes[~listos]
+            radio *= 2
+        return tuple(np.concatenate(columna) for columna in zip(*partes))
+
+    def contar(self, zona):
+        """Número de partículas en la zona."""
+        return int(self.conteos[self.indice_zona[zona]])
+
+    def conteos_por_zona(self):
+        """Devuelve {zona: número de partículas}."""
+        return dict(zip(self.zonas, self.conteos.tolist()))
+
+    def copiar_cambios(self, version_base):
+        """
+        Copia para publicar sólo lo que cambió desde la copia anterior:
+        (conteos, n, filas, (x, y, zona, ids)), con los valores actuales de
+        las filas escritas desde entonces (ordenadas y por debajo de n). Si
+        la copia anterior no fue la de `version_base`, o si ha cambiado
+        demasiado o ya van muchas copias parciales seguidas, filas es None y
+        las columnas son las n filas completas. Los arrays son de sólo lectura.
+        """
+        n = self.n
+        parcial = self._version_copiada is not None and self._version_copiada == version_base \
+            and self._copias_parciales < _MAX_COPIAS_PARCIALES
+        if parcial:
+            filas = np.concatenate(self._filas_cambiadas) if self._filas_cambiadas else np.empty(0, dtype=np.intp)
+            filas = np.sort(filas[filas < n])
+            filas = filas[np.concatenate(([True], filas[1:] != filas[:-1]))] if filas.size else filas
+            columnas = tuple(columna[filas] for columna in (self.x, self.y, self.zona, self.ids))
+            self._copias_parciales += 1
+            filas.flags.writeable = False
+        else:
+            filas = None
+            columnas = tuple(columna[:n].copy() for columna in (self.x, self.y, self.zona, self.ids))
+            self._copias_parciales = 0
+        for columna in columnas:
+            columna.flags.writeable = False
+        self._filas_cambiadas = []
+        self._n_cambiadas = 0
+        self._version_copiada = self.version
+        return self.conteos.copy(), n, filas, columnas
+
+    def copiar_columnas(self):
+        """Copia de las columnas ocupadas: (conteos, x, y, zona, ids)."""
+        n = self.n
+        return (self.conteos.copy(), self.x[:n].copy(), self.y[:n].copy(),
+                self.zona[:n].copy(), self.ids[:n].copy())
+
+    def como_dict(self):
+        """Devuelve las partículas con la forma clásica {zona: [(x, y), ...]}."""
+        n = self.n
+        xs, ys, zs = self.x[:n], self.y[:n], self.zona[:n]
+        resultado = {}
+        for i, zona in enumerate(self.zonas):
+            mascara = zs == i
+            resultado[zona] = list(zip(xs[mascara].tolist(), ys[mascara].tolist()))
+        return resultado
+
+class RejillaFija:
+    """
+    Índice espacial de sólo lectura sobre unas columnas x/y que no cambian
+    (las de un Snapshot), con la misma rejilla uniforme que
+    AlmacenParticulas pero sin diccionario de celdas: las filas se ordenan
+    una vez por celda, así que cada fila de celdas de una consulta es un
+    rango contiguo que se localiza con searchsorted.
+    """
+
+    def __init__(self, xs, ys, tam_celda=32):
+        self.xs = xs
+        self.ys = ys
+        self.tam_celda = tam_celda
+        if len(xs) == 0:
+            self._orden = np.empty(0, dtype=np.int64)
+            return
+        cxs = np.floor_divide(xs, tam_celda).astype(np.int64)
+        cys = np.floor_divide(ys, tam_celda).astype(np.int64)
+        self._min_celda = (int(cxs.min()), int(cys.min()))
+        self._max_celda = (int(cxs.max()), int(cys.max()))
+        self._ancho = self._max_celda[0] - self._min_celda[0] + 1
+        claves = (cys - self._min_celda[1]) * self._ancho + (cxs - self._min_celda[0])
+        self._orden = np.argsort(claves, kind='stable')
+        self._claves = claves[self._orden]
+
+    def _filas_en_celdas(self, c0x, c0y, c1x, c1y):
+        """Filas de las celdas del rectángulo [c0x, c1x] x [c0y, c1y] (en celdas)."""
+        if self._orden.size == 0:
+            return self._orden
+        c0x, c0y = max(c0x, self._min_celda[0]), max(c0y, self._min_celda[1])
+        c1x, c1y = min(c1x, self._max_celda[0]), min(c1y, self._max_celda[1])
+        if c0x > c1x or c0y > c1y:
+            return self._orden[:0]
+        filas_celdas = (np.arange(c0y, c1y + 1) - self._min_celda[1]) * self._ancho
+        inicios = np.searchsorted(self._claves, filas_celdas + (c0x - self._min_celda[0]), side='left')
+        fines = np.searchsorted(self._claves, filas_celdas + (c1x - self._min_celda[0]), side='right')
+        return np.concatenate([self._orden[a:b] for a, b in zip(inicios.tolist(), fines.tolist())])
+
+    def en_rect(self, x0, y0, x1, y1):
+        """Filas con x0 <= x < x1 e y0 <= y < y1."""
+        t = self.tam_celda
+        filas = self._filas_en_celdas(int(x0 // t), int(y0 // t), int(x1 // t), int(y1 // t))
+        if filas.size == 0:
+            return filas
+        xs, ys = self.xs[filas], self.ys[filas]
+        return filas[(xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)]
+
+    def en_radio(self, cx, cy, radio):
+        """Filas cuya distancia a (cx, cy) es estrictamente menor que `radio`."""
+        t = self.tam_celda
+        filas = self._filas_en_celdas(int((cx - radio) // t), int((cy - radio) // t),
+                                      int((cx + radio) // t), int((cy + radio) // t))
+        if filas.size == 0:
+            return filas
+        dx = self.xs[filas] - cx
+        dy = self.ys[filas] - cy
+        return filas[dx * dx + dy * dy < radio * radio]
@@ -0,0 +1,96 @@
+import heapq
+
+# ==============================================================
+# PLANIFICADOR DE APARICIONES DE "GENTE DURMIENDO"
+# ==============================================================
+
+class PlanificadorSpawns:
+    """
+    Planificador de apariciones basado en un montículo (heap) con una
+    entrada por zona, avanzado desde el tick de la simulación.
+    Funciona con un reloj virtual que avanza dt * nivel en cada tick, de modo
+    que un cambio de nivel acelera o frena al instante todas las zonas sin
+    tener que reprogramarlas. Cada zona tiene además su propia tasa relativa.
+    El coste por tick es O(k log z) para k apariciones y z zonas.
+    """
+
+    def __init__(self, rng, retraso=(6.0, 8.0)):
+        self.rng = rng
+        self.retraso = retraso   # segundos entre apariciones a nivel 1 y tasa 1
+        self.reloj = 0.0
+        self._heap = []          # (instante virtual, versión, zona)
+        self._tasas = {}
+        self._proxima = {}       # zona -> instante virtual de su entrada vigente
+        self._versiones = {}     # invalida entradas antiguas del heap
+
+    def __len__(self):
+        return len(self._tasas)
+
+    def _programar(self, zona, instante):
+        version = self._versiones.get(zona, 0) + 1
+        self._versiones[zona] = version
+        self._proxima[zona] = instante
+        heapq.heappush(self._heap, (instante, version, zona))
+
+    def añadir_zona(self, zona, tasa=1.0):
+        """Empieza a programar apariciones en la zona con la tasa relativa indicada."""
+        self._tasas[zona] = tasa
+        if tasa > 0:
+            self._programar(zona, self.reloj + self.rng.uniform(*self.retraso) / tasa)
+
+    def quitar_zona(self, zona):
+        self._tasas.pop(zona, None)
+        self._proxima.pop(zona, None)
+        self._versiones[zona] = self._versiones.get(zona, 0) + 1
+
+    def cambiar_tasa(self, zona, tasa):
+        """
+        Cambia la tasa relativa de una zona conservando la fracción de espera
+        que ya lleva cumplida.
+        """
+        anterior = self._tasas.get(zona, 0)
+        restante = self._proxima.get(zona)
+        self._tasas[zona] = tasa
+        if tasa <= 0:
+            self._versiones[zona] = self._versiones.get(zona, 0) + 1
+            self._proxima.pop(zona, None)
+        elif restante is None or anterior <= 0:
+            self._programar(zona, self.reloj + self.rng.uniform(*self.retraso) / tasa)
+        else:
+            self._programar(zona, self.reloj + (restante - self.reloj) * anterior / tasa)
+
+    def estado(self):
+        """Estado serializable (JSON): reloj virtual, tasas y próxima aparición de cada zona."""
+        return {
+            "reloj": self.reloj,
+            "retraso": list(self.retraso),
+            "tasas": dict(self._tasas),
+            "proxima": dict(self._proxima),
+        }
+
+    def restaurar(self, estado):
+        """Sustituye el estado por uno devuelto por estado(); el heap se reconstruye sin entradas obsoletas."""
+        self.reloj = estado["reloj"]
+        self.retraso = tuple(estado["retraso"])
+        self._tasas = dict(estado["tasas"])
+        self._heap = []
+        self._proxima = {}
+        self._versiones = {}
+        for zona, instante in estado["proxima"].items():
+            self._programar(zona, instante)
+
+    def avanzar(self, incremento):
+        """
+        Avanza el reloj virtual y devuelve la lista de zonas con apariciones
+        vencidas (una zona puede aparecer varias veces si el avance es grande).
+        """
+        self.reloj += incremento
+        vencidas = []
+        heap = self._heap
+        while heap and heap[0][0] <= self.reloj:
+            instante, version, zona = heapq.heappop(heap)
+            if self._versiones.get(zona) != version:
+                continue
+            vencidas.append(zona)
+            self._programar(zona, instante + self.rng.uniform(*self.retraso) / self._tasas[zona])
+        return vencidas
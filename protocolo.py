@@ -0,0 +1,370 @@
+import struct
+import numpy as np
+
+# ==============================================================
+# PROTOCOLO BINARIO CON TRAMAS (servidor.py <-> cliente.py)
+# ==============================================================
+#
+# Negociación: nada más conectar, un cliente que entiende este protocolo
+# envía la línea SALUDO ("ROOMBA <versión>\n"), opcionalmente seguida del
+# identificador de la sala a la que quiere unirse ("ROOMBA <versión> <sala>\n").
+# Si el servidor no la recibe, sigue enviando el estado en JSON como antes
+# (clientes antiguos), de la sala por defecto.
+#
+# Trama: cabecera !IB (longitud del cuerpo en bytes, tipo) + cuerpo.
+#
+# Cuerpo de TIPO_ESTADO:
+#   !4fHH            mosquito_pos (x, y), mosquito_vel (x, y), level, nº de zonas
+#   por zona:        B longitud del nombre + nombre UTF-8, !4hI rect + nº de partículas
+#   !h[n] + !h[n]    x e y de todas las partículas, contiguas y ordenadas por zona
+#
+# Cuerpo de TIPO_COMANDO: texto UTF-8 ("MOVE LEFT", "SQUASH", "SEQ <n>").
+#   "SEQ <n>" numera las entradas de un frame del cliente; el servidor
+#   devuelve el último número aplicado de cada jugador para la reconciliación.
+#
+# Cola (al final de los cuerpos de TIPO_ESTADO, TIPO_CLAVE y TIPO_DELTA):
+#   !dH              instante del tick en el reloj simulado del servidor, nº de jugadores
+#   !I2fI por jugador  id, x, y, última entrada (SEQ) aplicada. El servidor ya no
+#                    los envía aquí (nº = 0), sino a cada cliente en TIPO_JUGADORES;
+#                    se siguen leyendo para las grabaciones antiguas
+#   !H + !I[n]       total de partículas por zona en todo el mundo (en el orden
+#                    de las zonas), aunque la trama sólo lleve las del área de
+#                    interés del cliente (interes.py)
+#   !d               instante (reloj de pared, time.time()) en que el servidor
+#                    publicó el snapshot, para medir la latencia de extremo a extremo
+#   !H + !h[2n]      posiciones (x, y) del resto de mosquitos del mundo, además
+#                    del de mosquito_pos (enjambre.py)
+#   Los decodificadores anteriores la ignoran, porque leen sólo lo que esperan.
+#
+# TIPO_JUGADOR  !I id del jugador de esta conexión (servidor -> cliente, al conectar)
+#
+# TIPO_EVENTOS  !H n + por evento !IBH2hH: seq del tick, tipo (eventos.py),
+#               índice de zona (0xFFFF = ninguna), x, y, n. Va justo después de
+#               la trama de estado del tick más reciente que incluye.
+#
+# TIPO_JUGADORES  !I n + por jugador !I2fI (id, x, y, última entrada aplicada)
+#                 + !I m + !I[m] ids: cambios de los jugadores que ve un
+#                 cliente (el suyo y los de su área de interés) desde la
+#                 trama anterior que se le envió, y los que dejó de ver. Va
+#                 tras la trama de estado, sólo si hay algún cambio.
+#
+# Replicación por deltas (versión 3):
+#   TIPO_CLAVE  (fotograma clave)  !I seq + cuerpo de TIPO_ESTADO + !I[n] ids de las partículas
+#   TIPO_DELTA  !II4fH seq, seq base, mosquito_pos, mosquito_vel, level
+#               !I n + !I[n] ids + !h[n] x + !h[n] y + !H[n] índice de zona (añadidas)
+#               !I m + !I[m] ids (eliminadas)
+#   TIPO_ACK    !I último seq aplicado por el cliente (cliente -> servidor)
+
+VERSION = 3
+SALUDO = b"ROOMBA %d\n" % VERSION
+
+TIPO_ESTADO = 1
+TIPO_COMANDO = 2
+TIPO_ACK = 3
+TIPO_CLAVE = 4
+TIPO_DELTA = 5
+TIPO_JUGADOR = 6
+TIPO_EVENTOS = 7
+TIPO_JUGADORES = 8
+
+MAX_TRAMA = 64 * 1024 * 1024
+
+_CABECERA = struct.Struct('!IB')
+_ESTADO = struct.Struct('!4fHH')
+_ZONA = struct.Struct('!4hI')
+_DELTA = struct.Struct('!II4fH')
+_SEQ = struct.Struct('!I')
+_COLA = struct.Struct('!dH')
+_JUGADOR = struct.Struct('!I2fI')
+_TOTALES = struct.Struct('!H')
+_PUBLICADO = struct.Struct('!d')
+_N_MOSQUITOS = struct.Struct('!H')
+_N_EVENTOS = struct.Struct('!H')
+_EVENTO = struct.Struct('!IBH2hH')
+SIN_ZONA = 0xFFFF
+_COORD = np.dtype('>i2')
+_INDICE_ZONA = np.dtype('>u2')
+_ID = np.dtype('>u4')
+_JUGADORES = np.dtype([('id', '>u4'), ('x', '>f4'), ('y', '>f4'), ('entrada', '>u4')])
+
+def saludo(sala=None):
+    """Línea de saludo con la versión actual y, si se indica, la sala."""
+    if sala is None:
+        return SALUDO
+    return b"ROOMBA %d %s\n" % (VERSION, str(sala).encode())
+
+def leer_saludo(linea):
+    """
+    Devuelve (versión, sala) de una línea de saludo, con sala None si no se
+    indica, o None si la línea no es un saludo.
+    """
+    partes = linea.strip().split()
+    if len(partes) in (2, 3) and partes[0] == b"ROOMBA" and partes[1].isdigit():
+        sala = partes[2].decode(errors='replace') if len(partes) == 3 else None
+        return int(partes[1]), sala
+    return None
+
+def enmarcar(tipo, cuerpo):
+    """Antepone la cabecera de trama (longitud + tipo) al cuerpo."""
+    return _CABECERA.pack(len(cuerpo), tipo) + cuerpo
+
+def codificar_comando(texto):
+    return enmarcar(TIPO_COMANDO, texto.encode())
+
+def codificar_ack(seq):
+    return enmarcar(TIPO_ACK, _SEQ.pack(seq))
+
+def leer_ack(cuerpo):
+    return _SEQ.unpack(cuerpo)[0]
+
+def codificar_jugador(jugador):
+    return enmarcar(TIPO_JUGADOR, _SEQ.pack(jugador))
+
+def leer_jugador(cuerpo):
+    return _SEQ.unpack(cuerpo)[0]
+
+def codificar_eventos(eventos, indice_zona):
+    """
+    Trama TIPO_EVENTOS con los eventos (seq, tipo, zona, x, y, n);
+    `indice_zona` traduce cada nombre de zona a su posición en el estado.
+    """
+    partes = [_N_EVENTOS.pack(len(eventos))]
+    for seq, tipo, zona, x, y, n in eventos:
+        partes.append(_EVENTO.pack(seq, tipo, SIN_ZONA if zona is None else indice_zona[zona],
+                                   int(x), int(y), min(int(n), 0xFFFF)))
+    return enmarcar(TIPO_EVENTOS, b"".join(partes))
+
+def decodificar_eventos(cuerpo, zonas):
+    """Lista de (seq, tipo, zona, x, y, n) de una trama TIPO_EVENTOS; `zonas` son los nombres del estado."""
+    n = _N_EVENTOS.unpack_from(cuerpo, 0)[0]
+    eventos = []
+    for seq, tipo, zona, x, y, cuenta in _EVENTO.iter_unpack(cuerpo[_N_EVENTOS.size:_N_EVENTOS.size + n * _EVENTO.size]):
+        eventos.append((seq, tipo, zonas[zona] if zona < len(zonas) else None, x, y, cuenta))
+    return eventos
+
+def codificar_jugadores(ids, valores, eliminados):
+    """
+    Trama TIPO_JUGADORES con los jugadores `ids` y sus (x, y, última
+    entrada) en las filas de `valores`, y los ids `eliminados`.
+    """
+    jugadores = np.empty(len(ids), dtype=_JUGADORES)
+    jugadores['id'] = ids
+    jugadores['x'] = valores[:, 0]
+    jugadores['y'] = valores[:, 1]
+    jugadores['entrada'] = valores[:, 2]
+    return enmarcar(TIPO_JUGADORES, b"".join((
+        _SEQ.pack(len(ids)), jugadores.tobytes(),
+        _SEQ.pack(len(eliminados)), np.asarray(eliminados, dtype=_ID).tobytes(),
+    )))
+
+def decodificar_jugadores(cuerpo):
+    """({jugador: (x, y, última entrada)}, [ids eliminados]) de una trama TIPO_JUGADORES."""
+    n = _SEQ.unpack_from(cuerpo, 0)[0]
+    jugadores = np.frombuffer(cuerpo, dtype=_JUGADORES, count=n, offset=_SEQ.size)
+    offset = _SEQ.size + n * _JUGADORES.itemsize
+    m = _SEQ.unpack_from(cuerpo, offset)[0]
+    eliminados = np.frombuffer(cuerpo, dtype=_ID, count=m, offset=offset + _SEQ.size).tolist()
+    cambiados = {jugador: (x, y, entrada) for jugador, x, y, entrada in jugadores.tolist()}
+    return cambiados, eliminados
+
+def codificar_cola(tiempo, totales=(), publicado=0.0, otros_mosquitos=()):
+    """
+    Cola con el instante del tick, el total de partículas por zona, el
+    instante de publicación (time.time()) y las posiciones [(x, y), ...] de
+    los mosquitos que no son el primero. La lista de jugadores va vacía: cada
+    cliente recibe los suyos en TIPO_JUGADORES.
+    """
+    partes = [_COLA.pack(tiempo, 0)]
+    partes.append(_TOTALES.pack(len(totales)))
+    partes.append(np.asarray(totales, dtype=_ID).tobytes())
+    partes.append(_PUBLICADO.pack(publicado))
+    partes.append(_N_MOSQUITOS.pack(len(otros_mosquitos)))
+    partes.append(np.asarray(otros_mosquitos, dtype=_COORD).tobytes())
+    return b"".join(partes)
+
+def _leer_cola(cuerpo, offset, cabecera):
+    """
+    Añade "tiempo", "jugadores" (vacío salvo en grabaciones antiguas) y, si
+    los trae, "totales", "publicado" y "mosquitos" (todas las posiciones,
+    empezando por mosquito_pos) a `cabecera` si el cuerpo trae cola.
+    """
+    if len(cuerpo) - offset < _COLA.size:
+        return
+    tiempo, n = _COLA.unpack_from(cuerpo, offset)
+    offset += _COLA.size
+    jugadores = {}
+    for _ in range(n):
+        jugador, x, y, entrada = _JUGADOR.unpack_from(cuerpo, offset)
+        offset += _JUGADOR.size
+        jugadores[jugador] = (x, y, entrada)
+    cabecera["tiempo"] = tiempo
+    cabecera["jugadores"] = jugadores
+    if len(cuerpo) - offset >= _TOTALES.size:
+        n = _TOTALES.unpack_from(cuerpo, offset)[0]
+        cabecera["totales"] = np.frombuffer(cuerpo, dtype=_ID, count=n, offset=offset + _TOTALES.size).tolist()
+        offset += _TOTALES.size + 4 * n
+        if len(cuerpo) - offset >= _PUBLICADO.size:
+            cabecera["publicado"] = _PUBLICADO.unpack_from(cuerpo, offset)[0]
+            offset += _PUBLICADO.size
+            if len(cuerpo) - offset >= _N_MOSQUITOS.size:
+                n = _N_MOSQUITOS.unpack_from(cuerpo, offset)[0]
+                otros = np.frombuffer(cuerpo, dtype=_COORD, count=2 * n, offset=offset + _N_MOSQUITOS.size)
+                cabecera["mosquitos"] = [cabecera["mosquito_pos"]] + otros.reshape(n, 2).tolist()
+
+def _cuerpo_estado(mosquito_pos, mosquito_vel, level, zone_rects, conteos, xs, ys):
+    partes = [_ESTADO.pack(mosquito_pos[0], mosquito_pos[1], mosquito_vel[0], mosquito_vel[1],
+                           level, len(zone_rects))]
+    for (zona, rect), n in zip(zone_rects.items(), conteos):
+        nombre = zona.encode()
+        partes.append(bytes((len(nombre),)) + nombre)
+        partes.append(_ZONA.pack(*rect, n))
+    partes.append(np.asarray(xs, dtype=_COORD).tobytes())
+    partes.append(np.asarray(ys, dtype=_COORD).tobytes())
+    return b"".join(partes)
+
+def codificar_estado(mosquito_pos, mosquito_vel, level, zone_rects, conteos, xs, ys, cola=b""):
+    """
+    Codifica el estado del mundo en una trama TIPO_ESTADO.
+    `conteos` sigue el orden de `zone_rects` y `xs`/`ys` contienen las
+    coordenadas de las partículas ordenadas por zona en ese mismo orden.
+    `cola` es la de codificar_cola (opcional).
+    """
+    return enmarcar(TIPO_ESTADO, _cuerpo_estado(mosquito_pos, mosquito_vel, level, zone_rects, conteos, xs, ys)
+                    + cola)
+
+def codificar_clave(seq, mosquito_pos, mosquito_vel, level, zone_rects, conteos, xs, ys, ids, cola=b""):
+    """Codifica un fotograma clave: estado completo con el seq y los ids de las partículas."""
+    cuerpo = _cuerpo_estado(mosquito_pos, mosquito_vel, level, zone_rects, conteos, xs, ys)
+    return enmarcar(TIPO_CLAVE, _SEQ.pack(seq) + cuerpo + np.asarray(ids, dtype=_ID).tobytes() + cola)
+
+def codificar_delta(seq, base, mosquito_pos, mosquito_vel, level, indice_zona, añadidas, eliminadas, cola=b""):
+    """
+    Codifica los cambios entre el tick `base` y `seq`. `añadidas` es un dict
+    {id: (x, y, zona)} y `eliminadas` una lista de ids; `indice_zona` traduce
+    cada nombre de zona a su posición en el fotograma clave.
+    """
+    n = len(añadidas)
+    ids = np.fromiter(añadidas.keys(), dtype=_ID, count=n)
+    xs = np.fromiter((p[0] for p in añadidas.values()), dtype=_COORD, count=n)
+    ys = np.fromiter((p[1] for p in añadidas.values()), dtype=_COORD, count=n)
+    zonas = np.fromiter((indice_zona[p[2]] for p in añadidas.values()), dtype=np.uint16, count=n)
+    return codificar_delta_columnas(seq, base, mosquito_pos, mosquito_vel, level, ids, xs, ys, zonas,
+                                    eliminadas, cola)
+
+def codificar_delta_columnas(seq, base, mosquito_pos, mosquito_vel, level, ids, xs, ys, zonas, eliminadas, cola=b""):
+    """Como codificar_delta, con las añadidas ya en columnas (`zonas` = índices de zona)."""
+    cuerpo = b"".join((
+        _DELTA.pack(seq, base, mosquito_pos[0], mosquito_pos[1], mosquito_vel[0], mosquito_vel[1], level),
+        _SEQ.pack(len(ids)), np.asarray(ids, dtype=_ID).tobytes(), np.asarray(xs, dtype=_COORD).tobytes(),
+        np.asarray(ys, dtype=_COORD).tobytes(), np.asarray(zonas, dtype=_INDICE_ZONA).tobytes(),
+        _SEQ.pack(len(eliminadas)), np.asarray(eliminadas, dtype=_ID).tobytes(), cola,
+    ))
+    return enmarcar(TIPO_DELTA, cuerpo)
+
+def _leer_estado(cuerpo, offset):
+    """
+    Lee un cuerpo de estado a partir de `offset`. Devuelve la cabecera como
+    diccionario, los conteos por zona, los arrays xs/ys y el offset final.
+    """
+    px, py, vx, vy, level, n_zonas = _ESTADO.unpack_from(cuerpo, offset)
+    offset += _ESTADO.size
+    zone_rects = {}
+    conteos = []
+    for _ in range(n_zonas):
+        largo = cuerpo[offset]
+        zona = bytes(cuerpo[offset + 1:offset + 1 + largo]).decode()
+        offset += 1 + largo
+        *rect, n = _ZONA.unpack_from(cuerpo, offset)
+        offset += _ZONA.size
+        zone_rects[zona] = rect
+        conteos.append(n)
+    total = sum(conteos)
+    xs = np.frombuffer(cuerpo, dtype=_COORD, count=total, offset=offset)
+    ys = np.frombuffer(cuerpo, dtype=_COORD, count=total, offset=offset + 2 * total)
+    cabecera = {
+        "mosquito_pos": [px, py],
+        "mosquito_vel": [vx, vy],
+        "level": level,
+        "zone_rects": zone_rects,
+    }
+    return cabecera, conteos, xs, ys, offset + 4 * total
+
+def decodificar_estado(cuerpo):
+    """
+    Decodifica el cuerpo de una trama TIPO_ESTADO en un diccionario con la
+    misma forma que el estado JSON ("mosquito_pos", "dust_particles", ...).
+    """
+    estado, conteos, xs, ys, offset = _leer_estado(cuerpo, 0)
+    _leer_cola(cuerpo, offset, estado)
+    xs, ys = xs.tolist(), ys.tolist()
+    dust_particles = {}
+    inicio = 0
+    for zona, n in zip(estado["zone_rects"], conteos):
+        dust_particles[zona] = list(zip(xs[inicio:inicio + n], ys[inicio:inicio + n]))
+        inicio += n
+    estado["dust_particles"] = dust_particles
+    return estado
+
+def decodificar_clave(cuerpo):
+    """
+    Decodifica un fotograma clave. Devuelve (seq, cabecera, particulas) con
+    particulas = {id: (x, y, zona)}.
+    """
+    seq = _SEQ.unpack_from(cuerpo, 0)[0]
+    estado, conteos, xs, ys, offset = _leer_estado(cuerpo, _SEQ.size)
+    ids = np.frombuffer(cuerpo, dtype=_ID, count=len(xs), offset=offset).tolist()
+    _leer_cola(cuerpo, offset + 4 * len(xs), estado)
+    zonas = [zona for zona, n in zip(estado["zone_rects"], conteos) for _ in range(n)]
+    particulas = dict(zip(ids, zip(xs.tolist(), ys.tolist(), zonas)))
+    return seq, estado, particulas
+
+def decodificar_delta(cuerpo, zonas):
+    """
+    Decodifica una trama TIPO_DELTA. `zonas` es la lista de nombres de zona del
+    fotograma clave. Devuelve (seq, base, cabecera, añadidas, eliminadas).
+    """
+    seq, base, px, py, vx, vy, level = _DELTA.unpack_from(cuerpo, 0)
+    offset = _DELTA.size
+    n = _SEQ.unpack_from(cuerpo, offset)[0]
+    offset += _SEQ.size
+    ids = np.frombuffer(cuerpo, dtype=_ID, count=n, offset=offset).tolist()
+    offset += 4 * n
+    xs = np.frombuffer(cuerpo, dtype=_COORD, count=n, offset=offset).tolist()
+    offset += 2 * n
+    ys = np.frombuffer(cuerpo, dtype=_COORD, count=n, offset=offset).tolist()
+    offset += 2 * n
+    indices = np.frombuffer(cuerpo, dtype=_INDICE_ZONA, count=n, offset=offset).tolist()
+    offset += 2 * n
+    m = _SEQ.unpack_from(cuerpo, offset)[0]
+    offset += _SEQ.size
+    eliminadas = np.frombuffer(cuerpo, dtype=_ID, count=m, offset=offset).tolist()
+    añadidas = {pid: (x, y, zonas[z]) for pid, x, y, z in zip(ids, xs, ys, indices)}
+    cabecera = {"mosquito_pos": [px, py], "mosquito_vel": [vx, vy], "level": level}
+    _leer_cola(cuerpo, offset + 4 * m, cabecera)
+    return seq, base, cabecera, añadidas, eliminadas
+
+class DecodificadorTramas:
+    """
+    Decodificador incremental: acepta lecturas parciales o con varias tramas
+    juntas y devuelve las tramas completas (tipo, cuerpo) en orden.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def alimentar(self, datos):
+        self._buffer += datos
+        tramas = []
+        offset = 0
+        while len(self._buffer) - offset >= _CABECERA.size:
+            longitud, tipo = _CABECERA.unpack_from(self._buffer, offset)
+            if longitud > MAX_TRAMA:
+                raise ValueError(f"Trama demasiado grande: {longitud} bytes")
+            fin = offset + _CABECERA.size + longitud
+            if fin > len(self._buffer):
+                break
+            tramas.append((tipo, bytes(self._buffer[offset + _CABECERA.size:fin])))
+            offset = fin
+        if offset:
+            del self._buffer[:offset]
+        return tramas
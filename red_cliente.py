@@ -0,0 +1,137 @@
+import socket
+import threading
+import time
+import protocolo
+from eventos import Evento
+from interpolacion import BufferInterpolacion
+from replicacion import EstadoReplicado
+
+# ==============================================================
+# CLIENTE DE RED SIN INTERFAZ GRÁFICA
+# ==============================================================
+#
+# ReceptorEstado no hace E/S: recibe los bytes leídos del socket y mantiene
+# la réplica del mundo, el id de nuestro jugador y la cabecera del último
+# estado. ClienteRed lo usa con un socket bloqueante y un hilo receptor (el
+# cliente con ventana, cliente.py); los bots de carga.py lo usan con
+# asyncio para abrir cientos de conexiones desde un solo proceso.
+
+class ReceptorEstado:
+    """
+    Estado de una conexión de cliente (protocolo v3) construido a partir de
+    las tramas recibidas: réplica de partículas, id del jugador asignado por
+    el servidor, última cabecera (con los conteos totales por zona),
+    jugadores que vemos ({jugador: (x, y, última entrada)}, actualizados con
+    las tramas TIPO_JUGADORES), último (x, y, última entrada) de nuestro
+    jugador según el servidor (sólo cuando cambia) y eventos (eventos.Evento)
+    aún no recogidos con tomar_eventos().
+    """
+
+    def __init__(self):
+        self.decodificador = protocolo.DecodificadorTramas()
+        self.replica = EstadoReplicado()
+        self.jugador = None
+        self.estado = None
+        self.jugadores = {}
+        self.estado_jugador = None
+        self.eventos = []
+        self.decodificacion = 0.0  # segundos que costó procesar la última lectura
+
+    def alimentar(self, datos):
+        """
+        Procesa los bytes de una lectura. Devuelve True si cambió el estado,
+        en cuyo caso hay que confirmarlo al servidor con ack().
+        """
+        inicio = time.perf_counter()
+        cambiado = False
+        for tipo, cuerpo in self.decodificador.alimentar(datos):
+            if tipo == protocolo.TIPO_JUGADOR:
+                self.jugador = protocolo.leer_jugador(cuerpo)
+            elif tipo == protocolo.TIPO_JUGADORES:
+                cambiados, eliminados = protocolo.decodificar_jugadores(cuerpo)
+                for jugador in eliminados:
+                    self.jugadores.pop(jugador, None)
+                self.jugadores.update(cambiados)
+                if self.jugador in cambiados:
+                    self.estado_jugador = cambiados[self.jugador]
+            elif tipo == protocolo.TIPO_EVENTOS:
+                self.eventos.extend(Evento(*e) for e in protocolo.decodificar_eventos(cuerpo, self.replica.zonas))
+            else:
+                cambiado = self.replica.aplicar(tipo, cuerpo) or cambiado
+        if cambiado:
+            self.estado = dict(self.replica.cabecera, conteos=self.replica.conteos_totales())
+        self.decodificacion = time.perf_counter() - inicio
+        return cambiado
+
+    def tomar_eventos(self):
+        """Devuelve y vacía los eventos recibidos desde la llamada anterior."""
+        eventos, self.eventos = self.eventos, []
+        return eventos
+
+    def ack(self):
+        """Trama ACK con el último tick aplicado."""
+        return protocolo.codificar_ack(self.replica.seq)
+
+class ClienteRed:
+    """
+    Conexión bloqueante con un hilo receptor que alimenta un ReceptorEstado,
+    añade cada estado (con su instante de llegada) al buffer de
+    interpolación del mosquito y confirma cada tick aplicado (ACK). `lock`
+    protege al receptor y al buffer; el envío tiene el suyo porque el hilo
+    receptor (ACK) y quien manda los comandos escriben en el mismo socket.
+    """
+
+    def __init__(self, host="127.0.0.1", puerto=8809, sala=None):
+        self.host = host
+        self.puerto = puerto
+        self.sala = sala
+        self.receptor = ReceptorEstado()
+        self.buffer_mosquito = BufferInterpolacion()
+        self.lock = threading.Lock()
+        self._envio_lock = threading.Lock()
+        self._parar = threading.Event()
+        self._socket = None
+        self._hilo = None
+
+    def conectar(self):
+        """Conecta, anuncia el protocolo con tramas y arranca el hilo receptor (OSError si falla)."""
+        self._socket = socket.create_connection((self.host, self.puerto))
+        # Anunciar el protocolo binario con tramas; si no, el servidor enviaría JSON
+        self._socket.sendall(protocolo.saludo(self.sala))
+        self._hilo = threading.Thread(target=self._recibir, daemon=True)
+        self._hilo.start()
+
+    def _recibir(self):
+        self._socket.settimeout(1.0)
+        while not self._parar.is_set():
+            try:
+                data = self._socket.recv(65536)
+                if not data:
+                    break
+                llegada = time.monotonic()
+                with self.lock:
+                    cambiado = self.receptor.alimentar(data)
+                    if cambiado:
+                        estado = self.receptor.estado
+                        if "tiempo" in estado:
+                            self.buffer_mosquito.añadir(estado["tiempo"], estado["mosquito_pos"],
+                                                        estado["mosquito_vel"], llegada)
+                        ack = self.receptor.ack()
+                if cambiado:
+                    with self._envio_lock:
+                        self._socket.sendall(ack)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                print("Error recibiendo datos:", e)
+                break
+
+    def enviar(self, comandos):
+        """Envía los comandos de texto ("MOVE LEFT", "SQUASH", "SEQ <n>"...), cada uno en su trama."""
+        with self._envio_lock:
+            self._socket.sendall(b"".join(protocolo.codificar_comando(c) for c in comandos))
+
+    def cerrar(self):
+        self._parar.set()
+        if self._socket is not None:
+            self._socket.close()
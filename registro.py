@@ -0,0 +1,192 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+# ==============================================================
+# REGISTRO (LOGGING) FUERA DEL CAMINO CRÍTICO
+# ==============================================================
+#
+# Todos los registros del juego cuelgan de "roomba" y se separan por
+# categoría (el nombre del logger):
+#
+#   roomba.mundo.gente      apariciones de gente (DEBUG, una por persona)
+#   roomba.mundo.seek       cambios de dirección del mosquito (DEBUG, cada tick)
+#   roomba.mundo.picadas    picaduras (INFO)
+#   roomba.mundo.modo       entrada y salida del modo SEEK (INFO)
+#   roomba.mundo.jugadores  SQUASH aceptados y rechazados (INFO)
+#   roomba.mundo.estado     resumen periódico del mundo (INFO)
+#   roomba.servidor         conexiones y errores de red (INFO/WARNING)
+#   roomba.salas            procesos de salas (INFO/WARNING)
+#
+# Quien registra sólo crea el LogRecord y lo deja en una cola: el mensaje se
+# formatea y se escribe en un hilo aparte (QueueListener), de modo que la
+# E/S nunca ocurre con world.lock tomado. Los niveles desactivados no
+# cuestan nada más que la comprobación de isEnabledFor, así que los
+# mensajes deben pasar sus valores como argumentos ("%s", valor) y no como
+# f-strings. Cada categoría tiene además un límite de mensajes por segundo;
+# lo que lo supera se descarta antes de encolarlo y se cuenta en el
+# campo "suprimidos" del siguiente mensaje de esa categoría. La cola también
+# está acotada (MAX_PENDIENTES): si el escritor no da abasto, los mensajes
+# que no caben se descartan sin esperar y se cuentan en el campo
+# "descartados" del siguiente que sí entra.
+
+# Mensajes pendientes de escribir como mucho
+MAX_PENDIENTES = 10000
+
+# Mensajes por segundo admitidos en cada categoría (None = sin límite)
+LIMITES_POR_DEFECTO = {
+    "roomba.mundo.gente": 20,
+    "roomba.mundo.seek": 2,
+    "roomba.mundo.picadas": 20,
+    "roomba.mundo.jugadores": 20,
+    "roomba.servidor": 100,
+}
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por mensaje: fecha, nivel, categoría, mensaje y sus argumentos."""
+
+    def format(self, record):
+        registro = {
+            "fecha": self.formatTime(record),
+            "nivel": record.levelname,
+            "categoria": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if isinstance(record.args, tuple) and record.args:
+            registro["args"] = [a if isinstance(a, (int, float, str, bool)) or a is None else str(a)
+                                for a in record.args]
+        suprimidos = getattr(record, "suprimidos", 0)
+        if suprimidos:
+            registro["suprimidos"] = suprimidos
+        descartados = getattr(record, "descartados", 0)
+        if descartados:
+            registro["descartados"] = descartados
+        if record.exc_info:
+            registro["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False)
+
+    def formatTime(self, record, datefmt=None):
+        fecha = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        return f"{fecha}.{int(record.msecs):03d}"
+
+class FiltroFrecuencia(logging.Filter):
+    """
+    Limita cada categoría (nombre del logger, o el de su antecesor más cercano
+    con límite) a `limites[categoria]` mensajes por ventana de un segundo.
+    """
+
+    def __init__(self, limites=None):
+        super().__init__()
+        self.limites = dict(LIMITES_POR_DEFECTO if limites is None else limites)
+        self._lock = threading.Lock()
+        self._ventanas = {}  # categoría -> [inicio de la ventana, enviados, suprimidos]
+        self._categorias = {}  # nombre del logger -> categoría con límite (o None)
+
+    def _categoria(self, nombre):
+        categoria = self._categorias.get(nombre, False)
+        if categoria is False:
+            categoria = nombre
+            while categoria and categoria not in self.limites:
+                categoria = categoria.rpartition(".")[0]
+            categoria = self._categorias[nombre] = categoria or None
+        return categoria
+
+    def filter(self, record):
+        categoria = self._categoria(record.name)
+        limite = self.limites.get(categoria) if categoria is not None else None
+        if limite is None:
+            return True
+        ahora = record.created
+        with self._lock:
+            ventana = self._ventanas.get(categoria)
+            if ventana is None or ahora - ventana[0] >= 1.0:
+                suprimidos = ventana[2] if ventana is not None else 0
+                ventana = self._ventanas[categoria] = [ahora, 0, 0]
+            else:
+                suprimidos = 0
+            if ventana[1] >= limite:
+                ventana[2] += 1
+                return False
+            ventana[1] += 1
+        if suprimidos:
+            record.suprimidos = suprimidos
+        return True
+
+class ColaRegistro(logging.handlers.QueueHandler):
+    """
+    QueueHandler que encola el LogRecord tal cual: el formateo (incluido el
+    del mensaje con sus argumentos) lo hace el hilo escritor. Nunca espera:
+    con la cola llena descarta el mensaje y lo cuenta.
+    """
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        # handle() ya lo serializa con el lock del handler
+        if self.descartados:
+            record.descartados = self.descartados
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+        else:
+            self.descartados = 0
+
+class EscritorRegistro(logging.handlers.QueueListener):
+    """QueueListener cuya marca de fin espera sitio en la cola (acotada) en lugar de fallar."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+_escritor = None
+
+def configurar_registro(nivel="INFO", fichero=None, consola=True, limites=None):
+    """
+    Configura el registro de "roomba": `nivel` mínimo (nombre o número),
+    `fichero` opcional en JSON lines, salida por consola legible y límites por
+    categoría (ver LIMITES_POR_DEFECTO). Arranca el hilo escritor y lo
+    devuelve; detener_registro() vacía la cola y lo para.
+    """
+    global _escritor
+    detener_registro()
+    destinos = []
+    if consola:
+        salida = logging.StreamHandler(sys.stdout)
+        salida.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        destinos.append(salida)
+    if fichero:
+        escritura = logging.FileHandler(fichero, encoding="utf-8")
+        escritura.setFormatter(FormatoJSON())
+        destinos.append(escritura)
+
+    cola = queue.Queue(maxsize=MAX_PENDIENTES)
+    encolador = ColaRegistro(cola)
+    encolador.addFilter(FiltroFrecuencia(limites))
+    raiz = logging.getLogger("roomba")
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(encolador)
+    raiz.setLevel(nivel.upper() if isinstance(nivel, str) else nivel)
+    raiz.propagate = False
+
+    _escritor = EscritorRegistro(cola, *destinos, respect_handler_level=True)
+    _escritor.start()
+    return _escritor
+
+def detener_registro():
+    """Escribe lo que quede en la cola y detiene el hilo escritor (si lo hay)."""
+    global _escritor
+    if _escritor is not None:
+        _escritor.stop()
+        for destino in _escritor.handlers:
+            destino.close()
+        _escritor = None
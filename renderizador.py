@@ -0,0 +1,147 @@
+import threading
+import pygame
+from dibujo import Escena, TextoCacheado
+from registro import configurar_registro, detener_registro
+from roomba import RoombaWorld
+from sonidos import SonidosEventos
+
+# ==============================================================
+# CLASE ROOMBARENDERER (PARTE VISUAL)
+# ==============================================================
+
+class RoombaRenderer:
+    def __init__(self, world: RoombaWorld, rectangulos_sucios=True, umbral_mapa_calor=5000):
+        self.world = world
+        self.window_width, self.window_height = world.window_width, world.window_height
+        self.SCALE = world.SCALE
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.window_width, self.window_height))
+        pygame.display.set_caption("Simulación Mosquito - Jugador vs Mosquito")
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont(None, 16)
+        
+        # Cargar sprites – asegúrate de que los archivos existan en el directorio actual
+        self.mosquito_sprite = pygame.image.load("mosquito.png").convert_alpha()
+        self.player_sprite = pygame.image.load("slipper.png").convert_alpha()
+        self.sleeping_sprite = pygame.image.load("sleeping.png").convert_alpha()
+        self.mosquito_size = (10, 10)
+        self.player_size = (20, 20)
+        self.sleeping_size = (30, 30)
+        self.mosquito_sprite = pygame.transform.scale(self.mosquito_sprite, self.mosquito_size)
+        self.player_sprite = pygame.transform.scale(self.player_sprite, self.player_size)
+        self.sleeping_sprite = pygame.transform.scale(self.sleeping_sprite, self.sleeping_size)
+        
+        pygame.mixer.init()
+        pygame.mixer.music.load("background_music.mp3")
+        pygame.mixer.music.set_volume(0.1)
+        pygame.mixer.music.play(-1)
+        # Sonidos de los eventos de la simulación (picadas, aplastamientos)
+        self.sonidos = SonidosEventos()
+        
+        # Fondo con las zonas pre-renderizado y textos que sólo se renderizan al cambiar
+        # (por encima de `umbral_mapa_calor` personas, la gente se dibuja como mapa de densidad)
+        self.escena = Escena(self.screen, self.font, self.sleeping_sprite, rectangulos_sucios,
+                             umbral_mapa_calor=umbral_mapa_calor)
+        self._texto_conteo = {zona: TextoCacheado(self.font) for zona in world.zone_rects}
+        self._texto_mosquito = TextoCacheado(self.font, (0, 255, 0))
+        self._texto_jugador = TextoCacheado(self.font, (255, 0, 0))
+        self._snapshot = None
+    
+    def dibujar(self, player_pos):
+        """
+        Dibuja un frame (zonas, gente, mosquito y jugador) redibujando sólo lo
+        que cambió. Devuelve los rectángulos a pasar a pygame.display.update().
+        """
+        # Último estado publicado por la simulación (sin tomar world.lock)
+        snapshot = self.world.snapshot
+        self.escena.fijar_zonas(self.world.zone_rects)
+        anterior = self._snapshot
+        if anterior is not None and snapshot.seq > anterior.seq:
+            self.sonidos.reproducir(snapshot.eventos_desde(anterior.seq))
+        if not snapshot.mismas_particulas(anterior):
+            # Sólo lo que cambió desde el snapshot dibujado; todo si no está en el registro
+            cambios = None
+            if anterior is not None and snapshot.seq > anterior.seq:
+                cambios = snapshot.cambios_desde(anterior.seq)
+            if cambios is None:
+                self.escena.fijar_particulas(snapshot.particulas())
+            else:
+                self.escena.cambiar_particulas(*cambios)
+        self._snapshot = snapshot
+        
+        elementos = []
+        for (zona, rect), count in zip(self.world.zone_rects.items(), snapshot.conteos):
+            elementos.append((self._texto_conteo[zona].render(f"Gente: {count}"), (rect[0] + 5, rect[1] + 30)))
+        
+        current_mosquito_pos = snapshot.mosquito_pos
+        for x, y in snapshot.mosquitos.astype(int).tolist():
+            elementos.append((self.mosquito_sprite, (x - self.mosquito_size[0]//2, y - self.mosquito_size[1]//2)))
+        elementos.append((self._texto_mosquito.render(
+            f"Mosquito: ({int(current_mosquito_pos[0])}, {int(current_mosquito_pos[1])})"
+        ), (self.window_width - 220, self.window_height - 30)))
+        
+        elementos.append((self.player_sprite, (
+            int(player_pos[0]) - self.player_size[0]//2,
+            int(player_pos[1]) - self.player_size[1]//2
+        )))
+        elementos.append((self._texto_jugador.render(
+            f"Jugador: ({int(player_pos[0])}, {int(player_pos[1])})"
+        ), (20, self.window_height - 30)))
+        return self.escena.dibujar(elementos)
+    
+    def render(self):
+        running = True
+        player_speed = 5
+        player_pos = [int(100 * self.SCALE), int(100 * self.SCALE)]
+        
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+            
+            keys = pygame.key.get_pressed()
+            dx, dy = 0, 0
+            if keys[pygame.K_LEFT]:
+                dx = -player_speed
+            if keys[pygame.K_RIGHT]:
+                dx = player_speed
+            if keys[pygame.K_UP]:
+                dy = -player_speed
+            if keys[pygame.K_DOWN]:
+                dy = player_speed
+            candidate_x = player_pos[0] + dx
+            candidate_y = player_pos[1] + dy
+            if self.world.geometria.is_walkable(candidate_x, candidate_y):
+                player_pos[0] = candidate_x
+                player_pos[1] = candidate_y
+            
+            pygame.display.update(self.dibujar(player_pos))
+            self.clock.tick(60)
+        pygame.quit()
+
+# ==============================================================
+# FUNCION MAIN (DEMOSTRACIÓN LOCAL)
+# ==============================================================
+
+def main():
+    # Registro por consola en un hilo aparte (DEBUG muestra también cada aparición y cambio de dirección)
+    configurar_registro("INFO")
+    
+    # Crear la instancia del mundo de simulación
+    world = RoombaWorld(window_size=(600,600), tasa_limpeza=1000, velocidad_base=10)
+    
+    # Iniciar el hilo de simulación (mosquito y aparición de gente); los sonidos los pone el renderizador
+    mosquito_thread = threading.Thread(target=world.mover_mosquito, daemon=True)
+    mosquito_thread.start()
+    
+    # Iniciar la parte visual (renderizado)
+    renderer = RoombaRenderer(world)
+    renderer.render()
+    
+    # Al salir, detener la simulación y los hilos
+    world.mosquito_stop_event.set()
+    mosquito_thread.join()
+    detener_registro()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import protocolo
+
+# ==============================================================
+# REPLICACIÓN DEL ESTADO POR DELTAS (PROTOCOLO v3)
+# ==============================================================
+
+class ReplicadorCliente:
+    """
+    Lado servidor: decide, para un cliente concreto, si enviar un fotograma
+    clave o un delta respecto al último estado que el cliente ha confirmado
+    (ACK). Los deltas sólo contienen la pose del mosquito y las partículas
+    añadidas/eliminadas, así que su tamaño depende de los cambios y no del
+    tamaño del mundo.
+    """
+
+    def __init__(self, intervalo_clave=100):
+        self.intervalo_clave = intervalo_clave
+        self.confirmado = None   # último seq aplicado por el cliente (ACK)
+        self.ultima_clave = None  # seq del último fotograma clave enviado
+
+    def confirmar(self, seq):
+        if self.confirmado is None or seq > self.confirmado:
+            self.confirmado = seq
+
+    def base(self):
+        """
+        Seq a partir del cual se calcula el delta. Como los mensajes llegan en
+        orden por TCP, el cliente tiene al menos el último fotograma clave.
+        """
+        if self.ultima_clave is None:
+            return None
+        if self.confirmado is None:
+            return self.ultima_clave
+        return max(self.confirmado, self.ultima_clave)
+
+    def siguiente_trama(self, snapshot):
+        """
+        Devuelve la trama a enviar para un snapshot del mundo: un delta desde
+        la base si sus cambios se capturaron en el snapshot, o un fotograma
+        clave si toca uno periódico o la base ya no está disponible. Si el
+        snapshot aún no tiene fotograma clave (salas remotas, ver
+        salas.SnapshotRemoto), sigue con el delta, o None si tampoco lo hay.
+        """
+        base = self.base()
+        trama = None
+        if base is not None and snapshot.seq - self.ultima_clave < self.intervalo_clave:
+            trama = snapshot.delta(base)
+        if trama is None:
+            trama = snapshot.clave()
+            if trama is not None:
+                self.ultima_clave = snapshot.seq
+            elif base is not None:
+                trama = snapshot.delta(base)
+        return trama
+
+class EstadoReplicado:
+    """
+    Lado cliente: copia local del mundo construida a partir de fotogramas
+    clave y deltas. Los deltas se pueden aplicar sobre cualquier estado
+    posterior a su base, ya que contienen los cambios combinados desde ella.
+    """
+
+    def __init__(self):
+        self.seq = None
+        self.cabecera = {}
+        self.zonas = []
+        self.particulas = {}  # id -> (x, y, zona)
+        self.conteos = {}     # zona -> número de partículas
+        # Cambios de partículas aún no recogidos con tomar_cambios()
+        self._completo = False
+        self._añadidas = {}
+        self._eliminadas = []
+
+    def aplicar(self, tipo, cuerpo):
+        """Aplica una trama TIPO_CLAVE o TIPO_DELTA. Devuelve True si cambió el estado."""
+        if tipo == protocolo.TIPO_CLAVE:
+            self.seq, self.cabecera, self.particulas = protocolo.decodificar_clave(cuerpo)
+            self.zonas = list(self.cabecera["zone_rects"])
+            self.conteos = dict.fromkeys(self.zonas, 0)
+            for _, _, zona in self.particulas.values():
+                self.conteos[zona] += 1
+            self._completo = True
+            self._añadidas = {}
+            self._eliminadas = []
+            return True
+        if tipo == protocolo.TIPO_DELTA and self.seq is not None:
+            seq, base, cabecera, añadidas, eliminadas = protocolo.decodificar_delta(cuerpo, self.zonas)
+            if seq <= self.seq or base > self.seq:
+                return False
+            for pid in eliminadas:
+                particula = self.particulas.pop(pid, None)
+                if particula is not None:
+                    self.conteos[particula[2]] -= 1
+                    if not self._completo:
+                        self._añadidas.pop(pid, None)
+                        self._eliminadas.append(pid)
+            for pid, particula in añadidas.items():
+                if pid not in self.particulas:
+                    self.conteos[particula[2]] += 1
+                    self.particulas[pid] = particula
+                    if not self._completo:
+                        self._añadidas[pid] = particula
+            self.cabecera.update(cabecera)
+            self.seq = seq
+            return True
+        return False
+
+    def conteos_totales(self):
+        """
+        Gente por zona en todo el mundo, según la cola del servidor; con un
+        área de interés la copia local sólo tiene la de dentro. Si el
+        servidor no envía totales, los de la copia local.
+        """
+        totales = self.cabecera.get("totales")
+        if totales is None or len(totales) != len(self.zonas):
+            return dict(self.conteos)
+        return dict(zip(self.zonas, totales))
+
+    def tomar_cambios(self):
+        """
+        Cambios de partículas desde la llamada anterior, para quien mantiene
+        su propia copia (p. ej. el dibujo): (completo, añadidas, eliminadas).
+        Si `completo` es True ha llegado un fotograma clave y hay que partir
+        de self.particulas; si no, basta con aplicar añadidas {id: (x, y,
+        zona)} y eliminadas [ids].
+        """
+        cambios = (self._completo, self._añadidas, self._eliminadas)
+        self._completo = False
+        self._añadidas = {}
+        self._eliminadas = []
+        return cambios
+
+    def estado(self):
+        """Estado con la misma forma que el JSON del servidor ("dust_particles", ...)."""
+        dust_particles = {zona: [] for zona in self.zonas}
+        for x, y, zona in self.particulas.values():
+            dust_particles[zona].append((x, y))
+        estado = dict(self.cabecera)
+        estado["dust_particles"] = dust_particles
+        return estado
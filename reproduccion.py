@@ -0,0 +1,203 @@
+import argparse
+import collections
+import threading
+import time
+import numpy as np
+import protocolo
+import servidor
+from entradas import BuzonEntradas
+from eventos import Evento
+from geometria import Plano
+from grabacion import LectorGrabacion
+from metricas import Histograma
+from particulas import AlmacenParticulas
+from snapshots import Snapshot
+
+# ==============================================================
+# REPRODUCCIÓN DE UNA GRABACIÓN (SIN VOLVER A SIMULAR)
+# ==============================================================
+
+def _mosquitos(cabecera):
+    """Posiciones de todos los mosquitos de una cabecera (las grabaciones antiguas sólo traen mosquito_pos)."""
+    return np.array(cabecera.get("mosquitos", [cabecera["mosquito_pos"]]), dtype=np.float64)
+
+class Reproduccion:
+    """
+    Sala que reproduce una grabación (grabacion.py) aplicando sus tramas en
+    lugar de simular, sobre su propio almacén de partículas: publica
+    Snapshots igual que RoombaWorld, así que se puede pasar tanto a
+    RoombaRenderer como a servidor.iniciar_servidor.
+    Su seq es propio y sólo crece (también al saltar con ir_a), para que los
+    clientes v3 reciban un fotograma clave tras cada salto. Las entradas de
+    los jugadores se aceptan y se ignoran, y no publica eventos ni (salvo
+    en grabaciones antiguas) jugadores, porque las grabaciones no los guardan.
+    """
+
+    def __init__(self, lector, historial_cambios=200):
+        if not len(lector):
+            raise ValueError(f"La grabación {lector.ruta} está vacía")
+        self.lector = lector
+        self.window_width, self.window_height = lector.metadatos["window_size"]
+        self.SCALE = lector.metadatos["SCALE"]
+        self.dt = lector.metadatos["dt"]
+        self.geometria = Plano(lector.zone_rects)
+        self.posicion = 0  # tick de la grabación publicado
+        self.detener = threading.Event()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.historial_cambios = historial_cambios
+        self.histograma_tick = Histograma()
+        self.entradas = BuzonEntradas()
+        self.snapshot = None
+        self.fijar_estado(self._estado(*self._reconstruir(0)))
+
+    def _siguiente_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def _reconstruir(self, i):
+        """(cabecera, {id: (x, y, zona)}) del tick i: su fotograma clave más los deltas hasta él."""
+        j = self.lector.clave(i)
+        _, _, cabecera, particulas, _ = self.lector.decodificar(j)
+        for k in range(j + 1, i + 1):
+            _, _, cabecera, añadidas, eliminadas = self.lector.decodificar(k)
+            for pid in eliminadas:
+                particulas.pop(pid, None)
+            particulas.update(añadidas)
+        return cabecera, particulas
+
+    def _estado(self, cabecera, particulas):
+        """Estado completo del tick con la forma que espera fijar_estado."""
+        n = len(particulas)
+        indice_zona = {zona: i for i, zona in enumerate(self.lector.zonas)}
+        ids = np.fromiter(particulas.keys(), dtype=np.int64, count=n)
+        xs = np.fromiter((p[0] for p in particulas.values()), dtype=np.int32, count=n)
+        ys = np.fromiter((p[1] for p in particulas.values()), dtype=np.int32, count=n)
+        zona = np.fromiter((indice_zona[p[2]] for p in particulas.values()), dtype=np.uint16, count=n)
+        return (self._siguiente_seq(), cabecera.get("tiempo", 0.0), tuple(cabecera["mosquito_pos"]),
+                tuple(cabecera["mosquito_vel"]), _mosquitos(cabecera), cabecera["level"],
+                cabecera.get("jugadores", {}), self.lector.zone_rects, self.lector.zonas, (xs, ys, zona, ids))
+
+    def fijar_estado(self, estado):
+        """
+        Sustituye todo el estado por `estado`, (seq, tiempo, pos, vel,
+        mosquitos, level, jugadores, zone_rects, zonas, (x, y, zona, ids)),
+        y lo publica.
+        """
+        seq, tiempo, pos, vel, mosquitos, level, jugadores, zone_rects, zonas, (x, y, zona, ids) = estado
+        self._fijar_jugadores(jugadores)
+        self.zone_rects = zone_rects
+        self.particulas = AlmacenParticulas(zonas, tam_celda=32)
+        self.particulas.insertar_lote(x, y, [zonas[z] for z in zona.tolist()], ids=ids)
+        self.cambios = collections.deque(maxlen=self.historial_cambios)
+        self.eventos = collections.deque(maxlen=self.historial_cambios)
+        self.seq, self.tiempo, self.level = seq, tiempo, level
+        self.mosquito_pos, self.mosquito_vel, self.mosquitos = pos, vel, mosquitos
+        self.publicar()
+
+    def aplicar_tick(self, cambios):
+        """
+        Aplica los cambios de un tick, (seq, tiempo, pos, vel, mosquitos,
+        level, jugadores, añadidas, eliminadas, eventos, ms), sobre el
+        almacén de partículas y los registros, y lo publica.
+        """
+        (seq, self.tiempo, self.mosquito_pos, self.mosquito_vel, self.mosquitos, self.level, jugadores,
+         añadidas, eliminadas, eventos, duracion) = cambios
+        self._fijar_jugadores(jugadores)
+        self.histograma_tick.observar(duracion)
+        self.particulas.eliminar_ids(eliminadas)
+        if añadidas:
+            ids, xs, ys, zonas = zip(*añadidas)
+            self.particulas.insertar_lote(xs, ys, zonas, ids=ids)
+        self.seq = seq
+        self.cambios.append((seq, añadidas, eliminadas))
+        self.eventos.extend(Evento(*evento) for evento in eventos)
+        self.publicar()
+
+    def _fijar_jugadores(self, jugadores):
+        # Como en RoombaWorld: posiciones por un lado y última entrada aplicada por otro
+        self.jugadores = {jugador: (x, y) for jugador, (x, y, _) in jugadores.items()}
+        self.ultima_entrada = {jugador: entrada for jugador, (_, _, entrada) in jugadores.items()}
+
+    def publicar(self):
+        self.snapshot = Snapshot(self, self.snapshot)
+
+    def ir_a(self, i):
+        """Salta al tick i de la grabación (O(1) con el índice + como mucho un intervalo de deltas)."""
+        with self._lock:
+            self.fijar_estado(self._estado(*self._reconstruir(i)))
+            self.posicion = i
+
+    def avanzar(self):
+        """Publica el siguiente tick de la grabación. Devuelve False si no hay más."""
+        with self._lock:
+            i = self.posicion + 1
+            if i >= len(self.lector) and i >= self.lector.actualizar():
+                return False
+            inicio = time.perf_counter()
+            tipo, _, cabecera, particulas, eliminadas = self.lector.decodificar(i)
+            if tipo == protocolo.TIPO_CLAVE:
+                # Fotograma clave periódico: se aplica como la diferencia con lo publicado
+                actuales = set(self.particulas.ids[:len(self.particulas)].tolist())
+                eliminadas = list(actuales - particulas.keys())
+                particulas = {pid: p for pid, p in particulas.items() if pid not in actuales}
+            añadidas = [(pid, x, y, zona) for pid, (x, y, zona) in particulas.items()]
+            self.aplicar_tick((self._siguiente_seq(), cabecera.get("tiempo", self.tiempo),
+                               tuple(cabecera["mosquito_pos"]), tuple(cabecera["mosquito_vel"]),
+                               _mosquitos(cabecera), cabecera["level"], cabecera.get("jugadores", {}), añadidas, eliminadas, (),
+                               (time.perf_counter() - inicio) * 1000))
+            self.posicion = i
+            return True
+
+    def reproducir(self, velocidad=1.0, bucle=False):
+        """
+        Publica los ticks al ritmo del reloj simulado de la grabación
+        multiplicado por `velocidad` (0 = tan rápido como se pueda) hasta el
+        final, o hasta que se active self.detener. Con `bucle` vuelve a
+        empezar al terminar.
+        """
+        referencia = None  # (instante real, instante simulado) desde el que se mide el ritmo
+        while not self.detener.is_set():
+            if not self.avanzar():
+                if not bucle:
+                    return
+                self.ir_a(0)
+                referencia = None
+                continue
+            if not velocidad:
+                continue
+            if referencia is None or self.tiempo < referencia[1]:
+                referencia = (time.monotonic(), self.tiempo)
+            espera = referencia[0] + (self.tiempo - referencia[1]) / velocidad - time.monotonic()
+            if espera > 0:
+                self.detener.wait(espera)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una grabación de la simulación.")
+    parser.add_argument("ruta", help="grabación creada con servidor.py --grabar")
+    parser.add_argument("--velocidad", type=float, default=1.0,
+                        help="multiplicador del tiempo simulado (0 = tan rápido como se pueda)")
+    parser.add_argument("--desde", type=int, default=0, help="tick de la grabación por el que empezar")
+    parser.add_argument("--bucle", action="store_true", help="volver a empezar al terminar")
+    parser.add_argument("--servir", action="store_true",
+                        help="enviarla a los clientes como un servidor en lugar de dibujarla")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8809)
+    args = parser.parse_args()
+
+    reproduccion = Reproduccion(LectorGrabacion(args.ruta))
+    if args.desde:
+        reproduccion.ir_a(args.desde)
+    hilo = threading.Thread(target=reproduccion.reproducir, args=(args.velocidad, args.bucle), daemon=True)
+    hilo.start()
+    if args.servir:
+        servidor.iniciar_servidor(reproduccion, host=args.host, puerto=args.puerto)
+    else:
+        # pygame sólo hace falta para dibujarla: con --servir no se importa
+        from renderizador import RoombaRenderer
+        RoombaRenderer(reproduccion).render()
+    reproduccion.detener.set()
+    hilo.join()
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,26 @@
-import concurrent.futures
+import collections
+import logging
 import threading
 import time
 import random
-import math
-import pygame
+import numpy as np
+from enjambre import CANDIDATOS, Enjambre, asignar_objetivos
+from entradas import BuzonEntradas
+from eventos import APARICION, APLASTADO, PICADA, SEEK, Evento, eventos_desde
+from geometria import Plano, cargar_plano
+from grabacion import Grabador
+from metricas import Histograma
+from particulas import AlmacenParticulas
+from planificador import PlanificadorSpawns
+from snapshots import Snapshot, combinar_cambios
+
+# Categorías de registro del mundo (ver registro.py)
+log_gente = logging.getLogger("roomba.mundo.gente")
+log_seek = logging.getLogger("roomba.mundo.seek")
+log_picadas = logging.getLogger("roomba.mundo.picadas")
+log_modo = logging.getLogger("roomba.mundo.modo")
+log_jugadores = logging.getLogger("roomba.mundo.jugadores")
+log_estado = logging.getLogger("roomba.mundo.estado")
 
 # ---------------------------
 # Función auxiliar
@@ -13,33 +30,79 @@ def calcular_area(largo, ancho):
     """Calcula el área de una zona (cm²)."""
     return largo * ancho
 
+class LockInstrumentado:
+    """
+    threading.Lock que acumula cuántas veces se ha tomado y el tiempo de
+    espera y de retención (total y máximo), para medir la contención, y un
+    histograma de las esperas (en ms).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._adquirido_en = 0.0
+        self.adquisiciones = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.retencion_total = 0.0
+        self.retencion_max = 0.0
+        self.histograma_espera = Histograma()
+
+    def acquire(self, blocking=True, timeout=-1):
+        t0 = time.perf_counter()
+        adquirido = self._lock.acquire(blocking, timeout)
+        if adquirido:
+            self._adquirido_en = time.perf_counter()
+            espera = self._adquirido_en - t0
+            self.adquisiciones += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self.histograma_espera.observar(espera * 1000)
+        return adquirido
+
+    def release(self):
+        retencion = time.perf_counter() - self._adquirido_en
+        self.retencion_total += retencion
+        self.retencion_max = max(self.retencion_max, retencion)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def estadisticas(self):
+        """Resumen de contención (tiempos en ms)."""
+        n = max(1, self.adquisiciones)
+        return {
+            "adquisiciones": self.adquisiciones,
+            "espera_media_ms": self.espera_total / n * 1000,
+            "espera_max_ms": self.espera_max * 1000,
+            "retencion_media_ms": self.retencion_total / n * 1000,
+            "retencion_max_ms": self.retencion_max * 1000,
+        }
+
 # ==============================================================
 # CLASE ROOMBAWORLD (LÓGICA DEL MUNDO)
 # ==============================================================
 
 class RoombaWorld:
-    def __init__(self, window_size=(600, 600), tasa_limpeza=1000, velocidad_base=10):
+    def __init__(self, window_size=(600, 600), tasa_limpeza=1000, velocidad_base=10, seed=None, verbose=True,
+                 historial_cambios=200, plano=None, grabacion=None, n_mosquitos=1):
+        if n_mosquitos < 1:
+            raise ValueError(f"Hace falta al menos un mosquito (n_mosquitos={n_mosquitos})")
         self.window_width, self.window_height = window_size
+        self.n_mosquitos = n_mosquitos
         self.tasa_limpeza = tasa_limpeza
         self.velocidad_base = velocidad_base
 
-        # Definición de zonas: (largo, alto) en centímetros
-        self.zonas = {
-            'Zona 1': (500, 150),
-            'Zona 2': (101, 220),
-            'Zona 3': (309, 220),
-            'Zona 4': (500, 150)
-        }
-        # Posiciones en la "habitación" (para conversión a píxeles)
-        self.zone_positions = {
-            'Zona 1': (50, 41),
-            'Zona 2': (50, 190),
-            'Zona 3': (241, 190),
-            'Zona 4': (50, 408)
-        }
-        # Suponemos que la habitación es de 600 x 600 cm
-        ROOM_WIDTH_CM = 600
-        ROOM_HEIGHT_CM = 600
+        # Plano de la habitación: zonas (largo, alto) en centímetros, su
+        # posición (para conversión a píxeles) y tamaño de la habitación.
+        # `plano` es la ruta de un JSON (ver geometria.cargar_plano); si no se
+        # indica, habitación de 600 x 600 cm con las cuatro zonas de siempre.
+        ROOM_WIDTH_CM, ROOM_HEIGHT_CM, self.zonas, self.zone_positions = cargar_plano(plano)
         self.SCALE = min(self.window_width / ROOM_WIDTH_CM, self.window_height / ROOM_HEIGHT_CM)
         
         # Calcular rectángulos (en píxeles) para cada zona:
@@ -52,305 +115,482 @@ class RoombaWorld:
                 int(largo * self.SCALE),
                 int(alto * self.SCALE)
             )
+        # Índice precalculado de las zonas para las pruebas de posición (O(1))
+        self.geometria = Plano(self.zone_rects)
+        
+        # Sólo lo toman quienes modifican el mundo; los lectores usan self.snapshot
+        self.lock = LockInstrumentado()
+        # Duración de cada tick en tiempo real (ms), para las métricas del servidor
+        self.histograma_tick = Histograma()
+        
+        self.dt = 0.05
+        # Pasos fijos como mucho por vuelta de mover_mosquito (el retraso que no quepa se descarta)
+        self.max_pasos_por_vuelta = 5
+        self.verbose = verbose
+        self.historial_cambios = historial_cambios
+        self.cleaning_radius = 10
+        self.near_threshold = 30
         
-        # Estado de "gente durmiendo" (partículas) por zona
-        self.dust_particles = {zona: [] for zona in self.zonas}
-        self.lock = threading.Lock()
+        # Jugadores (chanclas): pasos de 5 px, como en cliente.py, y como mucho
+        # 4 pasos por eje y tick (el cliente envía uno por frame a 60 FPS).
+        # SQUASH sólo cuenta si la chancla está a menos de radio_aplastar del mosquito.
+        self.velocidad_jugador = 5
+        self.max_pasos_jugador = 4
+        self.radio_aplastar = 20
+        self.posicion_inicial_jugador = (100, 100)
         
-        # Estado del "mosquito" (simula el Roomba)
-        self.mosquito_pos = [self.window_width // 2, self.window_height // 2]
-        self.mosquito_vel = [
-            random.choice([-1, 1]) * self.velocidad_base * (self.tasa_limpeza / 1000),
-            random.choice([-1, 1]) * self.velocidad_base * (self.tasa_limpeza / 1000)
-        ]
+        # Comandos pendientes de los jugadores, aplicados al principio de cada tick
+        self.entradas = BuzonEntradas()
+        
+        # Grabación opcional de cada tick publicado (ver grabacion.py)
+        self.grabador = Grabador(grabacion, self) if grabacion else None
         
         # Nivel inicial y cálculo de la superficie total
         self.level = 1
         self.superficie_total = sum(calcular_area(largo, alto) for largo, alto in self.zonas.values())
         
+        # Estado dinámico de la simulación (partículas, mosquito, reloj simulado)
+        self.reiniciar(seed)
+        
         # Evento para detener la simulación
         self.mosquito_stop_event = threading.Event()
 
-    def generar_dust(self, zona, stop_event, nivel):
+    def reiniciar(self, seed=None):
         """
-        Genera "gente durmiendo" en la zona usando el sprite "sleeping.png".
-        Se utiliza un retraso proporcional al nivel para controlar la aparición.
-        Este método se ejecuta en un hilo.
+        Devuelve la simulación a su estado inicial: sin gente, el primer
+        mosquito en el centro y reloj simulado a cero. Con la misma `seed`, la secuencia de
+        pasos posterior es idéntica.
         """
-        x0, y0, width, height = self.zone_rects[zona]
-        while not stop_event.is_set():
-            delay = random.uniform(6.0, 8.0) / nivel
-            time.sleep(delay)
-            x = random.randint(x0, x0 + width)
-            y = random.randint(y0, y0 + height)
-            with self.lock:
-                self.dust_particles[zona].append((x, y))
-            print(f"{zona}: Gente durmiendo generada en ({x}, {y}). Total: {len(self.dust_particles[zona])}")
+        # Generador aleatorio propio (con semilla opcional) y reloj simulado
+        self.rng = random.Random(seed)
+        self.tiempo = 0.0
+        
+        # Número de tick y registro de cambios de los últimos ticks:
+        # (seq, [(id, x, y, zona) añadidas], [ids eliminadas])
+        self.seq = 0
+        self.cambios = collections.deque(maxlen=self.historial_cambios)
+        self._añadidas = []
+        # Registro de eventos de los últimos ticks (ver eventos.py)
+        self.eventos = collections.deque(maxlen=self.historial_cambios)
+        
+        # Estado de "gente durmiendo" (partículas): columnas NumPy indexadas por una rejilla uniforme
+        self.particulas = AlmacenParticulas(self.zonas, tam_celda=32)
+        
+        # Estado de los mosquitos (simulan el Roomba): el primero en el centro
+        # y los demás en puntos al azar de las zonas (ver enjambre.py)
+        self.enjambre = Enjambre(self._posiciones_iniciales(self.n_mosquitos),
+                                 self._velocidades_aleatorias(self.n_mosquitos))
+        self.aplastamientos = 0
+        
+        # Posición de cada jugador conectado (jugador -> [x, y]) y última
+        # entrada (SEQ) suya aplicada, que el cliente usa para reconciliar
+        self.jugadores = {}
+        self.ultima_entrada = {}
+        
+        # El modo SEEK de cada mosquito va en self.enjambre (reloj simulado)
+        self._last_print = 0.0
+        
+        # Planificador de apariciones de gente (una entrada por zona en un heap)
+        self.planificador = PlanificadorSpawns(self.rng)
+        for zona in self.zonas:
+            self.planificador.añadir_zona(zona)
+        
+        # Último estado publicado para los lectores (renderizador, red)
+        self.snapshot = None
+        self.publicar()
 
-    def mover_mosquito(self, bite_sound):
+    def estado_checkpoint(self):
         """
-        Actualiza el movimiento del mosquito y elimina las partículas (simula "picaduras")
-        utilizando modos (modo SEEK y movimiento aleatorio).
-        Este método se ejecuta en un hilo.
+        Estado completo de la simulación para un checkpoint (checkpoints.py):
+        escalares serializables en JSON (incluidos el generador aleatorio, el
+        planificador de apariciones y los mosquitos) y las columnas de
+        partículas del último Snapshot, que son inmutables y no se copian.
+        Si esas columnas ya están montadas (GuardadoPeriodico las monta antes
+        de tomar el lock) cuesta O(zonas): se puede llamar con self.lock
+        tomado sin alargar el tick.
         """
-        cleaning_radius = 10
-        dt = 0.05
-        last_print = time.time()
-        last_collection_time = time.time()
-        in_seek_mode = False
-        seek_start_time = None
-
-        def allowed_position(x, y):
-            for rect in self.zone_rects.values():
-                rx, ry, rw, rh = rect
-                if rx <= x <= rx + rw and ry <= y <= ry + rh:
-                    return True
-            return False
+        _, x, y, zona, ids = self.snapshot.columnas()
+        version, interno, gauss = self.rng.getstate()
+        escalares = {
+            "seq": self.seq,
+            "tiempo": self.tiempo,
+            "level": self.level,
+            "mosquitos": self.enjambre.estado(),
+            "aplastamientos": self.aplastamientos,
+            "last_print": self._last_print,
+            "rng": [version, list(interno), gauss],
+            "planificador": self.planificador.estado(),
+            "zonas": self.particulas.zonas,
+            "siguiente_id": self.particulas.siguiente_id,
+        }
+        return {"escalares": escalares, "x": x, "y": y, "zona": zona, "ids": ids}
 
-        while not self.mosquito_stop_event.is_set():
-            time.sleep(dt)
-            with self.lock:
-                current_time = time.time()
-                if not in_seek_mode and (current_time - last_collection_time > 5):
-                    in_seek_mode = True
-                    seek_start_time = current_time
-                    print("Modo SEEK activado: 5 s sin picar gente.")
-                if in_seek_mode and (current_time - seek_start_time > 5):
-                    in_seek_mode = False
-                    self.mosquito_vel[0] = random.choice([-1, 1]) * self.velocidad_base * (self.tasa_limpeza / 1000)
-                    self.mosquito_vel[1] = random.choice([-1, 1]) * self.velocidad_base * (self.tasa_limpeza / 1000)
-                    last_collection_time = current_time
-                    print("Modo SEEK cancelado: 5 s sin picar, volviendo a aleatorio.")
-                
-                if in_seek_mode:
-                    candidate = None
-                    best_dist = float('inf')
-                    for zona in self.dust_particles:
-                        for (x, y) in self.dust_particles[zona]:
-                            dist = (x - self.mosquito_pos[0])**2 + (y - self.mosquito_pos[1])**2
-                            if dist < best_dist:
-                                best_dist = dist
-                                candidate = (x, y)
-                    if candidate is not None:
-                        dx = candidate[0] - self.mosquito_pos[0]
-                        dy = candidate[1] - self.mosquito_pos[1]
-                        norm = math.sqrt(dx * dx + dy * dy)
-                        if norm > 0:
-                            speed = math.sqrt(self.mosquito_vel[0]**2 + self.mosquito_vel[1]**2)
-                            self.mosquito_vel[0] = speed * dx / norm
-                            self.mosquito_vel[1] = speed * dy / norm
-                        print("Modo SEEK: ajustando dirección hacia la gente durmiendo.")
-                
-                if not in_seek_mode:
-                    near_threshold = 30
-                    candidate_near = None
-                    best_dist_near = float('inf')
-                    for zona in self.dust_particles:
-                        for (x, y) in self.dust_particles[zona]:
-                            dx = x - self.mosquito_pos[0]
-                            dy = y - self.mosquito_pos[1]
-                            dist = math.sqrt(dx * dx + dy * dy)
-                            if dist < near_threshold and dist < best_dist_near:
-                                best_dist_near = dist
-                                candidate_near = (x, y)
-                    if candidate_near is not None:
-                        dx = candidate_near[0] - self.mosquito_pos[0]
-                        dy = candidate_near[1] - self.mosquito_pos[1]
-                        norm = math.sqrt(dx * dx + dy * dy)
-                        if norm > 0:
-                            speed = math.sqrt(self.mosquito_vel[0]**2 + self.mosquito_vel[1]**2)
-                            self.mosquito_vel[0] = speed * dx / norm
-                            self.mosquito_vel[1] = speed * dy / norm
-                        print("Modo aleatorio: acercándose a gente durmiendo.")
-                
-                new_x = self.mosquito_pos[0] + self.mosquito_vel[0]
-                new_y = self.mosquito_pos[1] + self.mosquito_vel[1]
-                if allowed_position(new_x, new_y):
-                    self.mosquito_pos[0] = new_x
-                    self.mosquito_pos[1] = new_y
+    def restaurar(self, estado):
+        """
+        Continúa la simulación desde un estado de estado_checkpoint(): con el
+        mismo estado, los pasos siguientes son idénticos a los del mundo
+        original. Los jugadores no se restauran (vuelven a entrar al conectarse)
+        y el número de mosquitos es el del checkpoint.
+        """
+        e = estado["escalares"]
+        if list(e["zonas"]) != self.particulas.zonas:
+            raise ValueError(f"El checkpoint tiene otras zonas: {e['zonas']}")
+        self.rng = random.Random()
+        version, interno, gauss = e["rng"]
+        self.rng.setstate((version, tuple(interno), gauss))
+        self.seq = e["seq"]
+        self.tiempo = e["tiempo"]
+        self.level = e["level"]
+        self.cambios = collections.deque(maxlen=self.historial_cambios)
+        self._añadidas = []
+        self.eventos = collections.deque(maxlen=self.historial_cambios)
+        
+        self.particulas = AlmacenParticulas(self.zonas, tam_celda=32)
+        zonas = self.particulas.zonas
+        self.particulas.insertar_lote(estado["x"], estado["y"], [zonas[z] for z in estado["zona"].tolist()],
+                                      ids=estado["ids"])
+        self.particulas.siguiente_id = e["siguiente_id"]
+        
+        self.enjambre = Enjambre.desde_estado(e["mosquitos"])
+        self.n_mosquitos = len(self.enjambre)
+        self.aplastamientos = e["aplastamientos"]
+        self.jugadores = {}
+        self.ultima_entrada = {}
+        self._last_print = e["last_print"]
+        self.planificador = PlanificadorSpawns(self.rng)
+        self.planificador.restaurar(e["planificador"])
+        self.publicar()
+
+    def _velocidades_aleatorias(self, n):
+        """`n` velocidades en diagonal al azar, de módulo fijo por eje (una fila por mosquito)."""
+        modulo = self.velocidad_base * (self.tasa_limpeza / 1000)
+        return [[self.rng.choice([-1, 1]) * modulo, self.rng.choice([-1, 1]) * modulo] for _ in range(n)]
+
+    def _posiciones_iniciales(self, n):
+        """El centro de la ventana para el primer mosquito y un punto al azar de una zona para los demás."""
+        posiciones = [[self.window_width // 2, self.window_height // 2]]
+        rects = list(self.zone_rects.values())
+        for _ in range(n - 1):
+            x0, y0, width, height = self.rng.choice(rects)
+            posiciones.append([self.rng.randint(x0, x0 + width), self.rng.randint(y0, y0 + height)])
+        return posiciones
+
+    @property
+    def mosquito_pos(self):
+        """Posición [x, y] del primer mosquito (copia)."""
+        return self.enjambre.pos[0].tolist()
+
+    @property
+    def mosquito_vel(self):
+        """Velocidad [vx, vy] del primer mosquito (copia)."""
+        return self.enjambre.vel[0].tolist()
+
+    @property
+    def mosquitos(self):
+        """Posiciones de todos los mosquitos, array (n, 2) (vivo: lo modifica cada tick)."""
+        return self.enjambre.pos
+
+    def _log(self, registro, nivel, mensaje, *args):
+        """
+        Registra `mensaje % args` en la categoría `registro` si el mundo es
+        verbose y el nivel está activo; si no, no se formatea nada.
+        """
+        if self.verbose and registro.isEnabledFor(nivel):
+            registro.log(nivel, mensaje, *args)
+
+    def _emitir(self, tipo, zona, x, y, n=0):
+        """Anota un evento del tick actual en self.eventos (no llama a nadie: ver eventos.py)."""
+        self.eventos.append(Evento(self.seq, tipo, zona, int(x), int(y), n))
+
+    def eventos_desde(self, base):
+        """Eventos de los ticks posteriores a `base` que siguen en el registro."""
+        return eventos_desde(self.eventos, base)
+
+    @property
+    def dust_particles(self):
+        """Partículas por zona con la forma {zona: [(x, y), ...]} (copia)."""
+        return self.particulas.como_dict()
+
+    # ----------------------------------------------------------
+    # Motor de simulación (paso fijo, sin reloj real ni pygame)
+    # ----------------------------------------------------------
+
+    def generar_dust(self, dt):
+        """
+        Genera "gente durmiendo" en las zonas cuya aparición ha vencido en el
+        planificador. Su reloj avanza dt * nivel, así que la frecuencia de
+        aparición sigue en todo momento a self.level. Todas las apariciones
+        del tick se insertan juntas en un lote.
+        """
+        zonas = self.planificador.avanzar(dt * self.level)
+        if not zonas:
+            return
+        xs, ys = [], []
+        for zona in zonas:
+            x0, y0, width, height = self.zone_rects[zona]
+            xs.append(self.rng.randint(x0, x0 + width))
+            ys.append(self.rng.randint(y0, y0 + height))
+        ids = self.particulas.insertar_lote(xs, ys, zonas)
+        self._añadidas.extend(zip(ids, xs, ys, zonas))
+        # Un evento por zona: cuántas personas aparecieron y dónde la última
+        ultimas = {zona: (x, y) for zona, x, y in zip(zonas, xs, ys)}
+        for zona, n in collections.Counter(zonas).items():
+            self._emitir(APARICION, zona, *ultimas[zona], n)
+        if self.verbose and log_gente.isEnabledFor(logging.DEBUG):
+            for zona, x, y in zip(zonas, xs, ys):
+                log_gente.debug("%s: Gente durmiendo generada en (%d, %d). Total: %d",
+                                zona, x, y, self.particulas.contar(zona))
+
+    def aplicar_entradas(self, factor=1.0):
+        """
+        Aplica de una vez las entradas acumuladas desde el tick anterior:
+        bajas de jugadores, el desplazamiento neto de cada uno (limitado a
+        max_pasos_jugador por eje y deslizando por los bordes de las zonas) y
+        los SQUASH, que se validan contra la posición en el servidor del
+        mosquito más cercano a la chancla.
+        """
+        pendientes, bajas = self.entradas.tomar()
+        for jugador in bajas:
+            self.jugadores.pop(jugador, None)
+            self.ultima_entrada.pop(jugador, None)
+        limite = max(1, round(self.max_pasos_jugador * factor))
+        for jugador, (dx, dy, squash, entrada) in pendientes.items():
+            pos = self.jugadores.get(jugador)
+            if pos is None:
+                pos = self.jugadores[jugador] = list(self.posicion_inicial_jugador)
+            if entrada is not None:
+                self.ultima_entrada[jugador] = entrada
+            dx = max(-limite, min(limite, dx)) * self.velocidad_jugador
+            dy = max(-limite, min(limite, dy)) * self.velocidad_jugador
+            if dx or dy:
+                pos[0], pos[1], _, _ = self.geometria.deslizar(pos[0], pos[1], dx, dy)
+            if squash:
+                distancias = np.hypot(self.enjambre.pos[:, 0] - pos[0], self.enjambre.pos[:, 1] - pos[1])
+                mosquito = int(np.argmin(distancias))
+                distancia = float(distancias[mosquito])
+                if distancia < self.radio_aplastar:
+                    self.aplastar(jugador, mosquito)
                 else:
-                    if allowed_position(self.mosquito_pos[0] + self.mosquito_vel[0], self.mosquito_pos[1]):
-                        self.mosquito_pos[0] += self.mosquito_vel[0]
-                        self.mosquito_vel[1] = -self.mosquito_vel[1]
-                    elif allowed_position(self.mosquito_pos[0], self.mosquito_pos[1] + self.mosquito_vel[1]):
-                        self.mosquito_pos[1] += self.mosquito_vel[1]
-                        self.mosquito_vel[0] = -self.mosquito_vel[0]
-                    else:
-                        self.mosquito_vel[0] = -self.mosquito_vel[0]
-                        self.mosquito_vel[1] = -self.mosquito_vel[1]
-                
-                cleaned = False
-                for zona in self.dust_particles:
-                    new_list = []
-                    for (x, y) in self.dust_particles[zona]:
-                        if (x - self.mosquito_pos[0])**2 + (y - self.mosquito_pos[1])**2 >= cleaning_radius**2:
-                            new_list.append((x, y))
-                        else:
-                            cleaned = True
-                            print(f"Mosquito picó gente en {zona} en ({x}, {y})")
-                            bite_sound.play()
-                    self.dust_particles[zona] = new_list
-                if cleaned:
-                    last_collection_time = current_time
-                    if in_seek_mode:
-                        in_seek_mode = False
-                        print("Gente picada en modo SEEK; volviendo a aleatorio.")
-                if time.time() - last_print >= 1:
-                    total = sum(len(lst) for lst in self.dust_particles.values())
-                    print(f"Mosquito en {self.mosquito_pos}; Gente durmiendo restante: {total}")
-                    last_print = time.time()
-
-    @staticmethod
-    def allowed_position_general(x, y, zone_rects):
-        """Método estático para verificar si (x, y) está dentro de alguna zona."""
-        for rect in zone_rects.values():
-            rx, ry, rw, rh = rect
-            if rx <= x <= rx + rw and ry <= y <= ry + rh:
-                return True
-        return False
+                    self._log(log_jugadores, logging.INFO,
+                              "SQUASH rechazado del jugador %s: mosquito a %.0f px.", jugador, distancia)
 
-# ==============================================================
-# CLASE ROOMBARENDERER (PARTE VISUAL)
-# ==============================================================
+    def aplastar(self, jugador, mosquito=0):
+        """El jugador ha aplastado al mosquito `mosquito` (fila del enjambre): vuelve al centro y sube el nivel."""
+        e = self.enjambre
+        self.aplastamientos += 1
+        self.level += 1
+        self._emitir(APLASTADO, None, e.pos[mosquito, 0], e.pos[mosquito, 1], self.level)
+        e.pos[mosquito] = (self.window_width // 2, self.window_height // 2)
+        e.vel[mosquito] = self._velocidades_aleatorias(1)[0]
+        e.en_seek[mosquito] = False
+        e.ultima_picada[mosquito] = self.tiempo
+        self._log(log_jugadores, logging.INFO, "¡Mosquito aplastado por el jugador %s! Nivel %d.", jugador, self.level)
 
-class RoombaRenderer:
-    def __init__(self, world: RoombaWorld):
-        self.world = world
-        self.window_width, self.window_height = world.window_width, world.window_height
-        self.SCALE = world.SCALE
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.window_width, self.window_height))
-        pygame.display.set_caption("Simulación Mosquito - Jugador vs Mosquito")
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont(None, 16)
-        
-        # Cargar sprites – asegúrate de que los archivos existan en el directorio actual
-        self.mosquito_sprite = pygame.image.load("mosquito.png").convert_alpha()
-        self.player_sprite = pygame.image.load("slipper.png").convert_alpha()
-        self.sleeping_sprite = pygame.image.load("sleeping.png").convert_alpha()
-        self.mosquito_size = (10, 10)
-        self.player_size = (20, 20)
-        self.sleeping_size = (30, 30)
-        self.mosquito_sprite = pygame.transform.scale(self.mosquito_sprite, self.mosquito_size)
-        self.player_sprite = pygame.transform.scale(self.player_sprite, self.player_size)
-        self.sleeping_sprite = pygame.transform.scale(self.sleeping_sprite, self.sleeping_size)
-        
-        pygame.mixer.init()
-        pygame.mixer.music.load("background_music.mp3")
-        pygame.mixer.music.set_volume(0.1)
-        pygame.mixer.music.play(-1)
-        self.squash_sound = pygame.mixer.Sound("squash.mp3")
-        self.squash_sound.set_volume(1.0)
-    
-    def render(self):
-        running = True
-        player_speed = 5
-        player_pos = [int(100 * self.SCALE), int(100 * self.SCALE)]
-        
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-            
-            keys = pygame.key.get_pressed()
-            dx, dy = 0, 0
-            if keys[pygame.K_LEFT]:
-                dx = -player_speed
-            if keys[pygame.K_RIGHT]:
-                dx = player_speed
-            if keys[pygame.K_UP]:
-                dy = -player_speed
-            if keys[pygame.K_DOWN]:
-                dy = player_speed
-            candidate_x = player_pos[0] + dx
-            candidate_y = player_pos[1] + dy
-            if RoombaWorld.allowed_position_general(candidate_x, candidate_y, self.world.zone_rects):
-                player_pos[0] = candidate_x
-                player_pos[1] = candidate_y
-            
-            self.screen.fill((30, 30, 30))
-            # Dibujar zonas y mostrar cuenta de "gente"
-            for zona, rect in self.world.zone_rects.items():
-                pygame.draw.rect(self.screen, (70, 70, 200), rect, 2)
-                text_zone = self.font.render(zona, True, (200, 200, 200))
-                self.screen.blit(text_zone, (rect[0] + 5, rect[1] + 5))
-                with self.world.lock:
-                    count = len(self.world.dust_particles[zona])
-                count_text = self.font.render(f"Gente: {count}", True, (200, 200, 200))
-                self.screen.blit(count_text, (rect[0] + 5, rect[1] + 30))
-                with self.world.lock:
-                    dust_list = list(self.world.dust_particles[zona])
-                for (x, y) in dust_list:
-                    self.screen.blit(self.sleeping_sprite, 
-                                     (x - self.sleeping_size[0]//2, y - self.sleeping_size[1]//2))
-            
-            with self.world.lock:
-                current_mosquito_pos = self.world.mosquito_pos[:]
-            self.screen.blit(self.mosquito_sprite, (
-                int(current_mosquito_pos[0]) - self.mosquito_size[0]//2,
-                int(current_mosquito_pos[1]) - self.mosquito_size[1]//2
-            ))
-            mosquito_text = self.font.render(
-                f"Mosquito: ({int(current_mosquito_pos[0])}, {int(current_mosquito_pos[1])})",
-                True, (0, 255, 0)
-            )
-            self.screen.blit(mosquito_text, (self.window_width - 220, self.window_height - 30))
-            
-            self.screen.blit(self.player_sprite, (
-                int(player_pos[0]) - self.player_size[0]//2,
-                int(player_pos[1]) - self.player_size[1]//2
-            ))
-            player_text = self.font.render(
-                f"Jugador: ({int(player_pos[0])}, {int(player_pos[1])})",
-                True, (255, 0, 0)
-            )
-            self.screen.blit(player_text, (20, self.window_height - 30))
-            
-            pygame.display.flip()
-            self.clock.tick(60)
-        pygame.quit()
+    def _actualizar_modos(self):
+        """
+        Temporizadores del modo SEEK de todos los mosquitos a la vez: entra
+        el que lleva 5 s sin picar y vuelve al modo aleatorio, con una
+        velocidad nueva, el que lleva 5 s buscando sin éxito.
+        """
+        e = self.enjambre
+        ahora = self.tiempo
+        activados = np.flatnonzero(~e.en_seek & (ahora - e.ultima_picada > 5))
+        if activados.size:
+            e.en_seek[activados] = True
+            e.inicio_seek[activados] = ahora
+            primero = activados[0]
+            self._emitir(SEEK, None, e.pos[primero, 0], e.pos[primero, 1], int(activados.size))
+            self._log(log_modo, logging.INFO, "Modo SEEK activado en %d mosquito(s): 5 s sin picar gente.",
+                      activados.size)
+        cancelados = np.flatnonzero(e.en_seek & (ahora - e.inicio_seek > 5))
+        if cancelados.size:
+            e.en_seek[cancelados] = False
+            e.vel[cancelados] = self._velocidades_aleatorias(cancelados.size)
+            e.ultima_picada[cancelados] = ahora
+            self._log(log_modo, logging.INFO,
+                      "Modo SEEK cancelado en %d mosquito(s): 5 s sin picar, volviendo a aleatorio.",
+                      cancelados.size)
+
+    def _dirigir(self):
+        """
+        Elige un objetivo para cada mosquito y lo orienta hacia él: en modo
+        SEEK, entre la gente más cercana; si no, sólo si hay alguien a menos
+        de near_threshold. Los objetivos se reparten para que no persigan
+        todos a la misma persona (enjambre.asignar_objetivos).
+        """
+        e = self.enjambre
+        xs, ys = e.pos[:, 0], e.pos[:, 1]
+        buscando = np.flatnonzero(e.en_seek)
+        paseando = np.flatnonzero(~e.en_seek)
+        pares = []
+        if buscando.size:
+            puntos, filas, d2 = self.particulas.k_cercanas_lote(xs[buscando], ys[buscando],
+                                                                 min(CANDIDATOS, len(e)))
+            pares.append((buscando[puntos], filas, d2))
+        if paseando.size:
+            puntos, filas, d2 = self.particulas.pares_en_radio(xs[paseando], ys[paseando], self.near_threshold)
+            pares.append((paseando[puntos], filas, d2))
+        puntos, filas, d2 = pares[0] if len(pares) == 1 else (np.concatenate(c) for c in zip(*pares))
+        objetivos = asignar_objetivos(puntos, filas, d2, len(e))
+        con_objetivo = np.flatnonzero(objetivos >= 0)
+        if con_objetivo.size:
+            filas = objetivos[con_objetivo]
+            e.orientar(con_objetivo, self.particulas.x[filas], self.particulas.y[filas])
+            self._log(log_seek, logging.DEBUG, "%d mosquito(s) acercándose a gente durmiendo (%d en modo SEEK).",
+                      con_objetivo.size, np.count_nonzero(e.en_seek[con_objetivo]))
+
+    def _mover(self, factor):
+        """Desliza a todos los mosquitos por los bordes de las zonas y los rebota en el eje bloqueado."""
+        e = self.enjambre
+        xs, ys, choque_x, choque_y = self.geometria.deslizar_lote(
+            e.pos[:, 0], e.pos[:, 1], e.vel[:, 0] * factor, e.vel[:, 1] * factor)
+        e.pos[:, 0] = xs
+        e.pos[:, 1] = ys
+        if choque_x.any():
+            e.vel[choque_x, 0] *= -1
+        if choque_y.any():
+            e.vel[choque_y, 1] *= -1
+
+    def _picar(self):
+        """
+        Elimina a la gente a menos de cleaning_radius de algún mosquito (cada
+        persona la pica el más cercano) y devuelve las eliminadas como
+        (id, x, y, zona). Los mosquitos que han picado salen del modo SEEK.
+        """
+        e = self.enjambre
+        puntos, filas, d2 = self.particulas.pares_en_radio(e.pos[:, 0], e.pos[:, 1], self.cleaning_radius)
+        if filas.size == 0:
+            return []
+        # Por fila y, dentro de cada una, por distancia: la primera pareja de cada fila es la de su autor
+        orden = np.lexsort((puntos, d2, filas))
+        filas, puntos = filas[orden], puntos[orden]
+        primeras = np.concatenate(([True], filas[1:] != filas[:-1]))
+        filas, autores = filas[primeras], puntos[primeras]
+        zonas = self.particulas.zona[filas].tolist()
+        picadas = self.particulas.eliminar_filas(filas)
+        for _, x, y, zona in picadas:
+            self._log(log_picadas, logging.INFO, "Mosquito picó gente en %s en (%d, %d)", zona, x, y)
+        # Un evento por zona: cuántas personas se picaron y dónde estaba un mosquito que picó allí
+        por_zona = {}
+        for z, autor in zip(zonas, autores.tolist()):
+            por_zona.setdefault(z, [autor, 0])[1] += 1
+        for z, (autor, n) in por_zona.items():
+            self._emitir(PICADA, self.particulas.zonas[z], e.pos[autor, 0], e.pos[autor, 1], n)
+        e.ultima_picada[autores] = self.tiempo
+        if e.en_seek[autores].any():
+            e.en_seek[autores] = False
+            self._log(log_modo, logging.INFO, "Gente picada en modo SEEK; volviendo a aleatorio.")
+        return picadas
+
+    def step(self, dt=None):
+        """
+        Avanza la simulación un paso de `dt` segundos simulados (por defecto
+        self.dt): entradas de los jugadores, aparición de gente, modos
+        SEEK/aleatorio, movimiento con rebote en los bordes de las zonas y
+        "picaduras", estas tres para todos los mosquitos a la vez.
+        No toma self.lock: el llamante debe tenerlo si hay otros hilos que
+        modifiquen el mundo. Al terminar publica un Snapshot nuevo en self.snapshot.
+        Devuelve el número de personas picadas en este paso.
+        """
+        if dt is None:
+            dt = self.dt
+        factor = dt / self.dt
+        self.tiempo += dt
+        self.seq += 1
+        current_time = self.tiempo
+        self.aplicar_entradas(factor)
+        self.generar_dust(dt)
+        self._actualizar_modos()
+        self._dirigir()
+        self._mover(factor)
+        picadas = self._picar()
+        if current_time - self._last_print >= 1:
+            x, y = self.enjambre.pos[0].tolist()
+            self._log(log_estado, logging.INFO,
+                      "Mosquito en (%.1f, %.1f) (%d en total); Gente durmiendo restante: %d",
+                      x, y, len(self.enjambre), len(self.particulas))
+            self._last_print = current_time
+        self.cambios.append((self.seq, self._añadidas, [pid for pid, _, _, _ in picadas]))
+        self._añadidas = []
+        self.publicar()
+        return len(picadas)
+
+    def publicar(self):
+        """
+        Publica el estado actual para los lectores: construye un Snapshot
+        inmutable y lo instala con un simple cambio de referencia.
+        """
+        self.snapshot = Snapshot(self, self.snapshot)
+        if self.grabador is not None:
+            self.grabador.registrar(self.snapshot)
+
+    def detener_grabacion(self):
+        """Cierra la grabación (si la hay), escribiendo a disco lo pendiente."""
+        if self.grabador is not None:
+            self.grabador.cerrar()
+            self.grabador = None
+
+    def cambios_desde(self, base):
+        """
+        Cambios combinados desde el tick `base` hasta el actual
+        (ver snapshots.combinar_cambios), o None si `base` ya no está en el registro.
+        """
+        return combinar_cambios(self.cambios, base, self.seq)
+
+    def run_ticks(self, n, seed=None, dt=None):
+        """
+        Ejecuta `n` pasos seguidos sin esperar al reloj real. Si se indica
+        `seed`, la simulación se reinicia antes con esa semilla para obtener
+        una ejecución reproducible. Devuelve el total de personas picadas.
+        """
+        if seed is not None:
+            self.reiniciar(seed)
+        picadas = 0
+        for _ in range(n):
+            picadas += self.step(dt)
+        return picadas
+
+    # ----------------------------------------------------------
+    # Modo en tiempo real (hilo)
+    # ----------------------------------------------------------
+
+    def mover_mosquito(self):
+        """
+        Driver en tiempo real del motor: ejecuta tantos pasos fijos como
+        correspondan al tiempo real transcurrido, bajo self.lock, pero como
+        mucho max_pasos_por_vuelta cada vez; si el retraso es mayor (ticks
+        más lentos que dt, proceso detenido un rato) el resto se descarta en
+        lugar de intentar recuperarlo, como en salas.ejecutar_salas. No
+        reproduce nada: las picaduras quedan en self.eventos para quien
+        dibuje o suene (ver eventos.py).
+        Este método se ejecuta en un hilo.
+        """
+        acumulado = 0.0
+        anterior = time.monotonic()
+        while not self.mosquito_stop_event.is_set():
+            time.sleep(self.dt)
+            ahora = time.monotonic()
+            acumulado += ahora - anterior
+            anterior = ahora
+            with self.lock:
+                pasos = 0
+                while acumulado >= self.dt and pasos < self.max_pasos_por_vuelta:
+                    inicio = time.perf_counter()
+                    self.step()
+                    self.histograma_tick.observar((time.perf_counter() - inicio) * 1000)
+                    acumulado -= self.dt
+                    pasos += 1
+            if acumulado >= self.dt:
+                acumulado = 0.0
 
 # ==============================================================
 # FUNCION MAIN (DEMOSTRACIÓN LOCAL)
 # ==============================================================
 
 def main():
-    # Inicializar pygame y el mixer desde aquí
-    pygame.init()
-    pygame.mixer.init()
-    
-    # Crear la instancia del mundo de simulación
-    world = RoombaWorld(window_size=(600,600), tasa_limpeza=1000, velocidad_base=10)
-    
-    # Cargar el sonido para "mosquito_bite" (ahora el mixer ya está inicializado)
-    bite_sound = pygame.mixer.Sound("mosquito_bite.mp3")
-    bite_sound.set_volume(1.0)
-    
-    # Iniciar el hilo para mover el mosquito
-    mosquito_thread = threading.Thread(target=world.mover_mosquito, args=(bite_sound,), daemon=True)
-    mosquito_thread.start()
-    
-    # Iniciar hilos para generar partículas ("dust") en cada zona
-    dust_stop_events = {}
-    dust_threads = []
-    for zona in world.zonas:
-        stop_event = threading.Event()
-        dust_stop_events[zona] = stop_event
-        t = threading.Thread(target=world.generar_dust, args=(zona, stop_event, world.level), daemon=True)
-        t.start()
-        dust_threads.append(t)
-    
-    # Iniciar la parte visual (renderizado)
-    renderer = RoombaRenderer(world)
-    renderer.render()
-    
-    # Al salir, detener la simulación y los hilos
-    world.mosquito_stop_event.set()
-    for e in dust_stop_events.values():
-        e.set()
-    mosquito_thread.join()
-    for t in dust_threads:
-        t.join()
+    # La demostración con ventana vive en renderizador.py: este módulo no carga pygame
+    from renderizador import main as demostracion
+    demostracion()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,355 @@
+import collections
+import logging
+import multiprocessing
+import time
+import numpy as np
+from eventos import Evento
+from metricas import Histograma
+from roomba import RoombaWorld
+from snapshots import ColumnasPublicadas, Snapshot
+
+log = logging.getLogger("roomba.salas")
+
+# ==============================================================
+# SALAS REPARTIDAS ENTRE PROCESOS
+# ==============================================================
+#
+# Cada proceso trabajador aloja varias salas (un RoombaWorld por sala) y las
+# avanza con su propio bucle de ticks, fuera del GIL del servidor. Las tramas
+# de cada sala se codifican en el trabajador, con los Snapshots de su propio
+# mundo, y tras cada tick envía al proceso principal, por una tubería, un
+# único mensaje con las de todas sus salas:
+#
+#   ("ticks", [(sala, (seq, tiempo, publicado, pos, vel, mosquitos, level, jugadores, conteos,
+#                      eventos, ms, tramas)), ...])
+#
+# donde pos y vel son los del primer mosquito, mosquitos las posiciones de
+# todos (array (n, 2)), conteos la gente por zona, eventos los del tick
+# (eventos.Evento), ms la duración del tick de esa sala en el trabajador
+# (métricas) y tramas un dict con el delta desde el tick anterior ("delta")
+# y lo que el servidor haya pedido: el fotograma clave ("clave"), el estado
+# v2 ("binario") o v1 ("json") y las columnas (x, y, zona, ids) de las
+# partículas ("particulas", para las áreas de interés). Al arrancar envía
+# antes lo que no cambia de cada sala y su primer tick:
+#
+#   ("inicio", [(sala, (zone_rects, zonas, tam_celda, tick)), ...])
+#
+# En sentido contrario, el servidor envía como mucho un mensaje por tick a
+# cada trabajador, justo después de recibir el suyo, con las entradas de los
+# jugadores (ya combinadas por lectura) para el buzón del mundo de cada
+# sala, las bajas y los pedidos de tramas:
+#
+#   ("lote", [(sala, jugador, dx, dy, squash, entrada), ...], [(sala, jugador), ...],
+#            [(sala, formato), ...])
+#
+# El fotograma clave se pide para un solo tick; el resto se siguen enviando
+# durante VIGENCIA_PEDIDOS ticks desde el último pedido, para que los clientes
+# que no reciben todos los ticks los encuentren en el que les toca. El
+# proceso principal no vuelve a montar las partículas: cada SalaRemota
+# publica un SnapshotRemoto que reenvía esas tramas, de modo que el servidor
+# las trata igual que a un mundo local.
+
+# Ticks durante los que se siguen enviando las tramas pedidas (1 s a 20 Hz)
+VIGENCIA_PEDIDOS = 20
+# Deltas como mucho detrás del último fotograma clave antes de pedir otro
+MAX_DELTAS_CLAVE = 20
+
+def _tick(world, pedidos, duracion):
+    """Tick ya publicado de `world` con las tramas de `pedidos` (formato -> último seq en que se envía)."""
+    snapshot = world.snapshot
+    tramas = {"delta": bytes(snapshot.delta(snapshot.seq - 1))} if world.cambios else {}
+    for formato, hasta in list(pedidos.items()):
+        if hasta < snapshot.seq:
+            del pedidos[formato]
+        elif formato == "particulas":
+            tramas[formato] = snapshot.columnas()[1:]
+        else:
+            tramas[formato] = bytes(getattr(snapshot, formato)())
+    return (snapshot.seq, snapshot.tiempo, snapshot.publicado, snapshot.mosquito_pos, snapshot.mosquito_vel,
+            snapshot.mosquitos, snapshot.level, snapshot.jugadores, snapshot.conteos,
+            [tuple(e) for e in snapshot.eventos_desde(snapshot.seq - 1)], duracion, tramas)
+
+def ejecutar_salas(conexion, ids_salas, opciones_mundo, dt):
+    """
+    Bucle de un proceso trabajador: avanza un paso fijo de `dt` segundos en
+    cada una de sus salas al ritmo del reloj real y envía sus tramas por
+    `conexion`. Termina al recibir None o al cerrarse la tubería. Si las
+    opciones incluyen `grabacion`, cada sala se graba en "<grabacion>.<sala>".
+    """
+    opciones_mundo = dict(opciones_mundo)
+    grabacion = opciones_mundo.pop("grabacion", None)
+    mundos = {sala: RoombaWorld(verbose=False, grabacion=f"{grabacion}.{sala}" if grabacion else None,
+                                **opciones_mundo)
+              for sala in ids_salas}
+    pedidos = {sala: {} for sala in ids_salas}
+    conexion.send(("inicio", [(sala, (world.zone_rects, world.particulas.zonas, world.particulas.tam_celda,
+                                      _tick(world, pedidos[sala], 0.0)))
+                              for sala, world in mundos.items()]))
+    siguiente = time.monotonic()
+    try:
+        while True:
+            while conexion.poll():
+                mensaje = conexion.recv()
+                if mensaje is None:
+                    return
+                _, entradas, bajas, formatos = mensaje
+                for sala, jugador, dx, dy, squash, entrada in entradas:
+                    mundos[sala].entradas.acumular(jugador, dx, dy, squash, entrada)
+                for sala, jugador in bajas:
+                    mundos[sala].entradas.baja(jugador)
+                for sala, formato in formatos:
+                    vigencia = 1 if formato == "clave" else VIGENCIA_PEDIDOS
+                    pedidos[sala][formato] = mundos[sala].seq + vigencia
+            ticks = []
+            for sala, world in mundos.items():
+                inicio = time.perf_counter()
+                world.step(dt)
+                duracion = (time.perf_counter() - inicio) * 1000
+                ticks.append((sala, _tick(world, pedidos[sala], duracion)))
+            conexion.send(("ticks", ticks))
+            siguiente += dt
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                # Si vamos con retraso no se acumulan ticks: se sigue desde ahora
+                siguiente = time.monotonic()
+    except (EOFError, BrokenPipeError):
+        return
+    finally:
+        for world in mundos.values():
+            world.detener_grabacion()
+
+class LoteTrabajador:
+    """
+    Lo pendiente de enviar a un proceso trabajador (entradas, bajas y
+    pedidos de tramas de todas sus salas), que sale en un único mensaje
+    "lote" por tick con enviar().
+    """
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.entradas = []
+        self.bajas = []
+        self.pedidos = set()
+        self.cerrado = False  # el trabajador terminó: lo que llegue se descarta
+
+    def enviar(self):
+        if self.cerrado or not (self.entradas or self.bajas or self.pedidos):
+            return
+        self.conexion.send(("lote", self.entradas, self.bajas, list(self.pedidos)))
+        self.entradas, self.bajas, self.pedidos = [], [], set()
+
+    def cerrar(self):
+        self.cerrado = True
+        self.entradas, self.bajas, self.pedidos = [], [], set()
+
+class EntradasRemotas:
+    """Buzón de entradas de una SalaRemota: las deja en el lote de su trabajador."""
+
+    def __init__(self, lote, sala):
+        self._lote = lote
+        self._sala = sala
+
+    def acumular(self, jugador, dx=0, dy=0, squash=False, entrada=None):
+        if not self._lote.cerrado:
+            self._lote.entradas.append((self._sala, jugador, dx, dy, squash, entrada))
+
+    def baja(self, jugador):
+        if not self._lote.cerrado:
+            self._lote.bajas.append((self._sala, jugador))
+
+class SnapshotRemoto(Snapshot):
+    """
+    Snapshot de una SalaRemota: cabecera, jugadores y eventos del tick y las
+    tramas que llegaron ya codificadas del trabajador. Lo que no vino con el
+    tick (estado v1/v2, columnas de partículas) se pide al trabajador para
+    los siguientes y mientras tanto se devuelve None. Un delta desde una
+    base anterior es la concatenación de los deltas de cada tick, que el
+    cliente aplica en orden, y un fotograma clave que no vino con el tick es
+    el último recibido seguido de los deltas desde él.
+    """
+
+    def __init__(self, sala, tick, anterior=None):
+        (self.seq, self.tiempo, self.publicado, self.mosquito_pos, self.mosquito_vel, mosquitos, self.level,
+         self.jugadores, conteos, _, _, self._tramas) = tick
+        self._sala = sala
+        self.mosquitos = mosquitos
+        self.mosquitos.flags.writeable = False
+        self._columnas_jugadores = None
+        if anterior is not None and anterior.jugadores == self.jugadores:
+            self.jugadores = anterior.jugadores
+            self._columnas_jugadores = anterior._columnas_jugadores
+        self.zone_rects = sala.zone_rects
+        self.indice_zona = sala.indice_zona
+        self.tam_celda = sala.tam_celda
+        self._conteos = conteos
+        self._particulas = None
+        if "particulas" in self._tramas:
+            self._particulas = ColumnasPublicadas(np.array(conteos, dtype=np.int64), sum(conteos), None,
+                                                  self._tramas["particulas"], None, self.tam_celda)
+        self._registro = tuple(sala.deltas)
+        self._clave = sala.ultima_clave
+        self._eventos = tuple(sala.eventos)
+        self._codificados = {}
+
+    @property
+    def conteos(self):
+        return self._conteos
+
+    def __len__(self):
+        return sum(self._conteos)
+
+    def columnas(self):
+        """Columnas de partículas, o None si el trabajador aún no las envía (ver Snapshot.columnas)."""
+        self._sala.pedir("particulas")
+        return None if self._particulas is None else self._particulas.columnas()
+
+    def rejilla(self):
+        self._sala.pedir("particulas")
+        return None if self._particulas is None else self._particulas.rejilla()
+
+    def _trama(self, formato):
+        self._sala.pedir(formato)
+        trama = self._tramas.get(formato)
+        return None if trama is None else self._codificado(formato, lambda: trama)
+
+    def json(self):
+        return self._trama("json")
+
+    def binario(self):
+        return self._trama("binario")
+
+    def clave(self):
+        if "clave" in self._tramas:
+            return self._codificado("clave", lambda: self._tramas["clave"])
+        if self._clave is None or self.seq - self._clave[0] > MAX_DELTAS_CLAVE:
+            self._sala.pedir("clave")
+        if self._clave is None:
+            return None
+        seq, trama = self._clave
+        delta = self.delta(seq)
+        if delta is None:
+            return None
+        return self._codificado("clave", lambda: trama + delta)
+
+    def delta(self, base):
+        """Deltas de los ticks posteriores a `base`, seguidos, o None si ya no están en el registro."""
+        clave = ("delta", base)
+        if clave not in self._codificados:
+            if not self._registro or self._registro[0][0] > base + 1:
+                return None
+            inicio = base + 1 - self._registro[0][0]
+            self._codificados[clave] = memoryview(b"".join(trama for _, trama in self._registro[inicio:]))
+        return self._codificados[clave]
+
+class SalaRemota:
+    """
+    Sala simulada en un proceso trabajador vista desde el del servidor: con
+    cada tick publica en self.snapshot un SnapshotRemoto con sus tramas, sin
+    réplica de las partículas. Guarda los deltas y eventos de los últimos
+    ticks y el último fotograma clave recibido; las entradas que se dejan
+    en self.entradas y los pedidos de tramas van al lote de su trabajador,
+    y la duración de cada tick allí se acumula en self.histograma_tick.
+    """
+
+    def __init__(self, sala, inicio, lote, historial_cambios=200):
+        self.sala = sala
+        self.entradas = EntradasRemotas(lote, sala)
+        self._lote = lote
+        self.histograma_tick = Histograma()
+        self.zone_rects, zonas, self.tam_celda, tick = inicio
+        self.indice_zona = {zona: i for i, zona in enumerate(zonas)}
+        self.deltas = collections.deque(maxlen=historial_cambios)
+        self.eventos = collections.deque(maxlen=historial_cambios)
+        self.ultima_clave = None  # (seq, trama)
+        self.snapshot = None
+        self.aplicar_tick(tick)
+
+    def aplicar_tick(self, tick):
+        seq, *_, eventos, duracion, tramas = tick
+        self.seq = seq
+        self.histograma_tick.observar(duracion)
+        if "delta" in tramas:
+            self.deltas.append((seq, tramas["delta"]))
+        if "clave" in tramas:
+            self.ultima_clave = (seq, tramas["clave"])
+        self.eventos.extend(Evento(*evento) for evento in eventos)
+        self.snapshot = SnapshotRemoto(self, tick, self.snapshot)
+
+    def pedir(self, formato):
+        """Pide al trabajador que incluya `formato` en las tramas de los siguientes ticks."""
+        if not self._lote.cerrado:
+            self._lote.pedidos.add((self.sala, formato))
+
+class GestorSalas:
+    """
+    Reparte `n_salas` salas (con ids "0", "1", ...) entre `n_procesos`
+    procesos trabajadores y mantiene en self.salas una SalaRemota por sala.
+    """
+
+    def __init__(self, n_salas, n_procesos=None, dt=0.05, **opciones_mundo):
+        self.n_procesos = min(n_salas, n_procesos or multiprocessing.cpu_count())
+        self.dt = dt
+        self.opciones_mundo = opciones_mundo
+        self.reparto = [[str(s) for s in range(p, n_salas, self.n_procesos)] for p in range(self.n_procesos)]
+        self.salas = {}
+        self._lotes = []
+        self._procesos = []
+
+    def iniciar(self):
+        """Arranca los procesos y espera el estado inicial de todas las salas."""
+        for ids_salas in self.reparto:
+            propia, remota = multiprocessing.Pipe()
+            proceso = multiprocessing.Process(
+                target=ejecutar_salas, args=(remota, ids_salas, self.opciones_mundo, self.dt), daemon=True
+            )
+            proceso.start()
+            remota.close()
+            self._lotes.append(LoteTrabajador(propia))
+            self._procesos.append(proceso)
+        for lote in self._lotes:
+            self._recibir(lote)
+
+    def _recibir(self, lote):
+        tipo, salas = lote.conexion.recv()
+        if tipo == "inicio":
+            for sala, inicio in salas:
+                self.salas[sala] = SalaRemota(sala, inicio, lote)
+        else:
+            for sala, tick in salas:
+                self.salas[sala].aplicar_tick(tick)
+
+    def atender(self, loop, lote, fd):
+        """
+        Aplica todos los mensajes ya disponibles en la tubería de un
+        trabajador y le envía el lote acumulado desde el tick anterior.
+        """
+        try:
+            while lote.conexion.poll():
+                self._recibir(lote)
+            lote.enviar()
+        except (EOFError, OSError):
+            # El trabajador terminó: sus salas se quedan con el último estado recibido
+            loop.remove_reader(fd)
+            lote.cerrar()
+            log.warning("Un proceso de salas ha terminado; sus salas quedan detenidas.")
+
+    def conectar(self, loop):
+        """Atiende las tuberías de los trabajadores desde el bucle asyncio `loop`."""
+        for lote in self._lotes:
+            fd = lote.conexion.fileno()
+            loop.add_reader(fd, self.atender, loop, lote, fd)
+
+    def detener(self):
+        for lote in self._lotes:
+            try:
+                lote.conexion.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proceso in self._procesos:
+            proceso.join(timeout=2)
+            if proceso.is_alive():
+                proceso.terminate()
+        for lote in self._lotes:
+            lote.conexion.close()
@@ -1,108 +1,485 @@
-import socket
+import argparse
+import asyncio
+import collections
+import itertools
+import logging
+import re
 import threading
 import time
-import json
-import pygame
+import checkpoints
+import protocolo
+from entradas import LectorComandos, parsear_comandos
+from interes import ReplicadorInteres, ReplicadorJugadores, parsear_area
+from metricas import MetricasServidor
+from replicacion import ReplicadorCliente
 from roomba import RoombaWorld  # Se importa la clase que gestiona la lógica del mundo
+from registro import configurar_registro, detener_registro
+from salas import GestorSalas
 
-def manejar_cliente(conn, addr, world):
+SALA_POR_DEFECTO = "0"
+# Frecuencias de envío (Hz) que puede tener una conexión; la mayor es la del difusor
+FRECUENCIAS = (20, 10, 5)
+_FRECUENCIA = re.compile(rb"RATE\s+(\d+)")
+_ids_jugador = itertools.count(1)
+log = logging.getLogger("roomba.servidor")
+
+def frecuencia_permitida(hz):
+    """La mayor de FRECUENCIAS que no supera `hz` (o la menor de todas)."""
+    return next((f for f in FRECUENCIAS if f <= hz), FRECUENCIAS[-1])
+
+async def negociar_version(reader, espera=0.3):
     """
-    Hilo por cliente: Envía periódicamente el estado del mundo (JSON).
-    En esta versión se ignoran los comandos entrantes para que la simulación (mosquito)
-    no se vea afectada por el input del cliente.
+    Espera durante `espera` segundos la primera línea del cliente, aunque
+    llegue en varios trozos. Devuelve la versión de protocolo acordada
+    (1 = JSON sin tramas), la sala pedida (None si no indica ninguna) y los
+    bytes ya leídos que no son el saludo. Sólo se pasa a la versión 1 si esa
+    línea no es un saludo, si no se completa a tiempo o si se cierra la
+    conexión antes; si no se completa, lo recibido se queda en `reader`
+    para quien lea después.
     """
-    print(f"Conexión establecida con {addr}")
-    conn.settimeout(1.0)
     try:
-        while True:
-            with world.lock:
-                state_to_send = {
-                    "mosquito_pos": world.mosquito_pos,
-                    "mosquito_vel": world.mosquito_vel,
-                    "dust_particles": world.dust_particles,
-                    "level": world.level,
-                    "zone_rects": world.zone_rects
-                }
-            mensaje = json.dumps(state_to_send)
-            try:
-                conn.sendall(mensaje.encode())
-            except Exception as e:
-                print(f"Error enviando datos a {addr}: {e}")
-                break
-
-            # Se reciben y se ignoran comandos, para que la simulación siga inalterada.
-            try:
-                data = conn.recv(1024)
-                if data:
-                    print(f"Comando recibido (ignorando) de {addr}: {data.decode().strip()}")
-                else:
-                    break
-            except socket.timeout:
-                pass
-            except Exception as e:
-                print(f"Error recibiendo datos de {addr}: {e}")
-                break
-
-            time.sleep(0.05)
+        linea = await asyncio.wait_for(reader.readuntil(b"\n"), espera)
+    except (asyncio.TimeoutError, asyncio.LimitOverrunError):
+        # Sin línea completa a tiempo (o demasiado larga para ser un saludo)
+        return 1, None, b""
+    except asyncio.IncompleteReadError as e:
+        return 1, None, e.partial
+    saludo = protocolo.leer_saludo(linea)
+    if saludo is None:
+        return 1, None, linea
+    version, sala = saludo
+    return min(version, protocolo.VERSION), sala, b""
+
+class SalidaCliente:
+    """
+    Cola de salida acotada de una conexión: unos pocos mensajes de control,
+    que se envían en orden, y un único hueco para el snapshot pendiente. Si
+    llega uno nuevo antes de que se envíe el anterior, lo sustituye (gana el
+    más reciente) y el viejo se cuenta como descartado, así que lo que
+    retiene el servidor por conexión no crece aunque el cliente se atrase.
+    El snapshot se codifica al sacarlo, de modo que el replicador sólo ve
+    los que de verdad se envían.
+    """
+
+    def __init__(self):
+        self._control = collections.deque()
+        self._snapshot = None
+        self._hay = asyncio.Event()
+        self.descartados = 0
+
+    def control(self, mensaje):
+        self._control.append(mensaje)
+        self._hay.set()
+
+    def snapshot(self, snapshot):
+        if self._snapshot is not None:
+            self.descartados += 1
+        self._snapshot = snapshot
+        self._hay.set()
+
+    def qsize(self):
+        return len(self._control) + (self._snapshot is not None)
+
+    async def siguiente(self):
+        """Espera y devuelve (True, mensaje de control) o (False, snapshot)."""
+        while not self._control and self._snapshot is None:
+            self._hay.clear()
+            await self._hay.wait()
+        if self._control:
+            return True, self._control.popleft()
+        snapshot, self._snapshot = self._snapshot, None
+        return False, snapshot
+
+class Conexion:
+    """
+    Estado de una conexión de cliente: sala a la que está unida, jugador que
+    controla (que no entra en el mundo hasta su primera entrada), versión
+    negociada, decodificador de tramas (o lector de comandos sin tramas)
+    entrante, área de interés, replicadores de partículas (v3) y de
+    jugadores (v2/v3), cola de salida acotada con su frecuencia de envío y
+    contadores de lo enviado (para las métricas).
+    """
+
+    def __init__(self, reader, writer, version, sala, frecuencia=FRECUENCIAS[0]):
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info("peername")
+        self.version = version
+        self.sala = sala
+        self.jugador = next(_ids_jugador)
+        self.lector = LectorComandos() if version < 2 else None
+        self.decodificador = protocolo.DecodificadorTramas() if version >= 2 else None
+        self.replicador = ReplicadorCliente() if version >= 3 else None
+        self.replicador_jugadores = ReplicadorJugadores() if version >= 2 else None
+        self.area = None  # AreaInteres pedida por el cliente (None = todo el mundo)
+        self.salida = SalidaCliente()
+        self.ultimo_seq = None
+        self.ultimo_evento = None  # seq hasta el que se le han enviado los eventos
+        # La de partida es también el máximo: con RATE el cliente sólo puede bajarla
+        self.frecuencia_inicial = self.frecuencia = frecuencia_permitida(frecuencia)
+        self.proxima_ronda = 0  # ronda del difusor a partir de la cual toca el siguiente envío
+        self.inicio = time.monotonic()
+        self.bytes_enviados = 0
+        self.mensajes_enviados = 0
+
+    def mensaje(self, snapshot):
+        """
+        Bytes a enviar según la versión negociada: la trama del estado
+        (compartida con otras conexiones) seguida, con tramas, de la de los
+        jugadores que cambiaron y de la de los eventos ocurridos desde el
+        último envío, si los hay. None si no hay nada que enviar (en una
+        sala remota, la trama puede no haber llegado aún del trabajador).
+        """
+        trama = self._trama_estado(snapshot)
+        if self.decodificador is None:
+            return trama
+        # Al conectar sólo interesan los eventos a partir de ahora
+        base = snapshot.seq if self.ultimo_evento is None else self.ultimo_evento
+        self.ultimo_evento = snapshot.seq
+        tramas = [trama, self.replicador_jugadores.siguiente_trama(snapshot, self.jugador, self.area),
+                  snapshot.eventos_codificados(base)]
+        return b"".join(t for t in tramas if t is not None) or None
+
+    def _trama_estado(self, snapshot):
+        if self.area is not None:
+            if snapshot.columnas() is None:
+                return None
+            filas = self.area.filas(snapshot, self.jugador)
+            if self.replicador is not None:
+                return self.replicador.siguiente_trama(snapshot, filas, self.area.clave)
+            return snapshot.binario_filas(filas, self.area.clave)
+        if self.replicador is not None:
+            return self.replicador.siguiente_trama(snapshot)
+        if self.decodificador is not None:
+            return snapshot.binario()
+        return snapshot.json()
+
+    def fijar_area(self, area):
+        """
+        Cambia el área de interés. Al pasar de todo el mundo a un área o al
+        revés, la copia del cliente deja de ser la que supone el replicador
+        y se empieza con uno nuevo (que envía un fotograma clave); entre dos
+        áreas basta con los deltas de lo que entra y sale.
+        """
+        self.area = None if area.completa else area
+        if self.replicador is None:
+            return
+        if self.area is None:
+            if isinstance(self.replicador, ReplicadorInteres):
+                self.replicador = ReplicadorCliente()
+        elif not isinstance(self.replicador, ReplicadorInteres):
+            self.replicador = ReplicadorInteres()
+
+    def procesar_entrada(self, data):
+        """
+        Procesa los bytes recibidos del cliente: confirma los ACK y combina
+        todos los comandos de la lectura en una sola entrada para el buzón de
+        la sala, que la simulación aplica al principio del siguiente tick.
+        """
+        if self.lector is not None:
+            dx, dy, squash, entrada = self.lector.alimentar(data)
+        else:
+            dx = dy = 0
+            squash = False
+            entrada = None
+            for tipo, cuerpo in self.decodificador.alimentar(data):
+                if tipo == protocolo.TIPO_ACK and self.replicador is not None:
+                    self.replicador.confirmar(protocolo.leer_ack(cuerpo))
+                elif tipo == protocolo.TIPO_COMANDO:
+                    area = parsear_area(cuerpo)
+                    if area is not None:
+                        self.fijar_area(area)
+                        continue
+                    m = _FRECUENCIA.fullmatch(cuerpo.strip())
+                    if m is not None:
+                        self.frecuencia = min(self.frecuencia_inicial, frecuencia_permitida(int(m.group(1))))
+                        continue
+                    ddx, ddy, aplastar, numero, _ = parsear_comandos(cuerpo)
+                    dx += ddx
+                    dy += ddy
+                    squash = squash or aplastar
+                    if numero is not None:
+                        entrada = max(numero, entrada or 0)
+        if dx or dy or squash or entrada is not None:
+            self.sala.entradas.acumular(self.jugador, dx, dy, squash, entrada)
+
+async def leer_cliente(conexion, pendiente):
+    """Tarea lectora: procesa lo que envía el cliente hasta que cierra la conexión."""
+    if pendiente:
+        conexion.procesar_entrada(pendiente)
+    while True:
+        data = await conexion.reader.read(65536)
+        if not data:
+            return
+        conexion.procesar_entrada(data)
+
+async def escribir_cliente(conexion, metricas, espera_lenta=5.0):
+    """
+    Tarea escritora: codifica y envía lo que deja el difusor en la cola de
+    salida. Si el cliente no lee y el buffer del socket no baja en
+    `espera_lenta` segundos, la tarea termina y se cierra la conexión.
+    """
+    while True:
+        es_control, contenido = await conexion.salida.siguiente()
+        if es_control:
+            mensaje = contenido
+        else:
+            t0 = time.perf_counter()
+            mensaje = conexion.mensaje(contenido)
+            metricas.codificacion.observar((time.perf_counter() - t0) * 1000)
+            if mensaje is None:
+                continue
+        try:
+            conexion.writer.write(mensaje)
+            await asyncio.wait_for(conexion.writer.drain(), espera_lenta)
+        except asyncio.TimeoutError:
+            metricas.desconexiones_lentas += 1
+            log.warning("Cliente lento %s: sin leer durante %.1f s; se desconecta.", conexion.addr, espera_lenta)
+            # Sin esperar a vaciar lo que ya no va a leer: se libera el buffer en el acto
+            conexion.writer.transport.abort()
+            return
+        except Exception:
+            metricas.fallos_envio += 1
+            raise
+        conexion.bytes_enviados += len(mensaje)
+        conexion.mensajes_enviados += 1
+        metricas.bytes_enviados += len(mensaje)
+        metricas.mensajes_enviados += 1
+
+async def difundir(conexiones, metricas, periodo=1 / FRECUENCIAS[0]):
+    """
+    Único temporizador del servidor: cada `periodo` segundos toma el último
+    Snapshot publicado por la sala de cada conexión a la que le toca según
+    su frecuencia (sin tomar world.lock) y lo deja en su cola de salida, que
+    lo codifica al enviarlo. Cada codificación se hace una vez por snapshot,
+    no una vez por cliente. No se reenvía un snapshot que la conexión ya
+    recibió, y nunca se espera a ninguna conexión: a una que se atrasa se le
+    sustituye el snapshot pendiente por el nuevo.
+    """
+    loop = asyncio.get_running_loop()
+    for ronda in itertools.count():
+        inicio = loop.time()
+        for conexion in conexiones:
+            snapshot = conexion.sala.snapshot
+            if ronda >= conexion.proxima_ronda and conexion.ultimo_seq != snapshot.seq:
+                conexion.ultimo_seq = snapshot.seq
+                # Las frecuencias dividen a la del difusor: una ronda de cada FRECUENCIAS[0] // frecuencia
+                conexion.proxima_ronda = ronda + FRECUENCIAS[0] // conexion.frecuencia
+                conexion.salida.snapshot(snapshot)
+        metricas.difusion.observar((loop.time() - inicio) * 1000)
+        await asyncio.sleep(max(0.0, periodo - (loop.time() - inicio)))
+
+async def atender_cliente(reader, writer, salas, conexiones, metricas, frecuencia=FRECUENCIAS[0], espera_lenta=5.0):
+    """
+    Negocia la versión, une la conexión a la sala pedida (o a la sala por
+    defecto) con la `frecuencia` de envío inicial (el cliente puede bajarla
+    con "RATE <hz>") y ejecuta sus tareas lectora y escritora.
+    """
+    version, id_sala, pendiente = await negociar_version(reader)
+    if id_sala is None:
+        id_sala = SALA_POR_DEFECTO
+    sala = salas.get(id_sala)
+    if sala is None:
+        log.warning("Sala desconocida '%s' pedida por %s; cerrando conexión.", id_sala, writer.get_extra_info("peername"))
+        writer.close()
+        return
+    conexion = Conexion(reader, writer, version, sala, frecuencia)
+    log.info("Conexión establecida con %s (protocolo v%d, sala %s)", conexion.addr, version, id_sala)
+    conexiones.add(conexion)
+    metricas.conexiones_totales += 1
+    if version >= 2:
+        # Id del jugador, para que el cliente reconozca su chancla en el estado
+        conexion.salida.control(protocolo.codificar_jugador(conexion.jugador))
+    tareas = [asyncio.create_task(leer_cliente(conexion, pendiente)),
+              asyncio.create_task(escribir_cliente(conexion, metricas, espera_lenta))]
+    try:
+        hechas, _ = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        for tarea in hechas:
+            if not tarea.cancelled() and tarea.exception() is not None:
+                log.warning("Error con %s: %s", conexion.addr, tarea.exception())
     finally:
-        conn.close()
-        print(f"Conexión cerrada con {addr}")
+        conexiones.discard(conexion)
+        conexion.sala.entradas.baja(conexion.jugador)
+        for tarea in tareas:
+            tarea.cancel()
+        writer.close()
+        log.info("Conexión cerrada con %s", conexion.addr)
 
-def iniciar_servidor(world, host="127.0.0.1", puerto=8809):
+async def atender_estadisticas(reader, writer, metricas, salas, conexiones):
     """
-    Configura el socket TCP y lanza un hilo para cada cliente conectado.
+    Puerto de estadísticas (sólo para uso local). Lee una orden y responde en
+    texto plano antes de cerrar:
+      STATS (o nada)   métricas en formato Prometheus
+      PERFIL INICIAR   arranca el perfilador por muestreo
+      PERFIL DETENER   lo para y devuelve su informe
+    También acepta peticiones HTTP GET a /metrics, /perfil/iniciar y
+    /perfil/detener, para poder usar curl o un scraper. A un GET sin ruta
+    se le responde con una línea de error (400 Bad Request).
     """
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind((host, puerto))
-    server_socket.listen(5)
-    print(f"Servidor escuchando en {host}:{puerto}...")
-    
     try:
-        while True:
-            conn, addr = server_socket.accept()
-            threading.Thread(target=manejar_cliente, args=(conn, addr, world), daemon=True).start()
-    except KeyboardInterrupt:
-        print("Servidor detenido por el usuario.")
+        linea = await asyncio.wait_for(reader.readline(), 0.5)
+    except asyncio.TimeoutError:
+        linea = b""
+    palabras = linea.split()
+    http = palabras[:1] == [b"GET"]
+    estado = b"200 OK"
+    if http:
+        orden = palabras[1].strip(b"/").replace(b"/", b" ").upper() if len(palabras) >= 2 else None
+    else:
+        orden = linea.strip().upper()
+    if orden is None:
+        estado = b"400 Bad Request"
+        respuesta = "error: petición GET sin ruta\n"
+    elif orden == b"PERFIL INICIAR":
+        metricas.perfil.iniciar()
+        respuesta = "perfil iniciado\n"
+    elif orden == b"PERFIL DETENER":
+        respuesta = metricas.perfil.detener()
+    else:
+        respuesta = metricas.texto(salas, conexiones)
+    cuerpo = respuesta.encode()
+    if http:
+        writer.write(b"HTTP/1.0 %s\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                     b"Content-Length: %d\r\n\r\n" % (estado, len(cuerpo)))
+    writer.write(cuerpo)
+    try:
+        await writer.drain()
     finally:
-        server_socket.close()
+        writer.close()
+
+async def servidor_async(salas, host, puerto, backlog, gestor=None, puerto_stats=None,
+                         frecuencia=FRECUENCIAS[0], espera_lenta=5.0):
+    conexiones = set()
+    metricas = MetricasServidor()
+    if gestor is not None:
+        gestor.conectar(asyncio.get_running_loop())
+    servidor = await asyncio.start_server(
+        lambda r, w: atender_cliente(r, w, salas, conexiones, metricas, frecuencia, espera_lenta),
+        host, puerto, backlog=backlog, reuse_address=True
+    )
+    log.info("Servidor escuchando en %s:%d (%d sala(s))...", host, puerto, len(salas))
+    tareas = [servidor.serve_forever(), difundir(conexiones, metricas)]
+    if puerto_stats is not None:
+        estadisticas = await asyncio.start_server(
+            lambda r, w: atender_estadisticas(r, w, metricas, salas, conexiones),
+            "127.0.0.1", puerto_stats, reuse_address=True
+        )
+        log.info("Estadísticas en 127.0.0.1:%d", puerto_stats)
+        tareas.append(estadisticas.serve_forever())
+    async with servidor:
+        await asyncio.gather(*tareas)
+
+def iniciar_servidor(world, host="127.0.0.1", puerto=8809, backlog=1024, puerto_stats=None,
+                     frecuencia=FRECUENCIAS[0], espera_lenta=5.0):
+    """
+    Ejecuta el servidor TCP sobre asyncio: una tarea lectora y otra escritora
+    por conexión y un único difusor que envía el estado a todas. `world` es
+    un único mundo (sala por defecto) o un GestorSalas ya iniciado. Con
+    `puerto_stats` expone además las métricas en 127.0.0.1:puerto_stats.
+    `frecuencia` es la de envío inicial de cada conexión (una de FRECUENCIAS)
+    y `espera_lenta` los segundos sin leer tras los que se desconecta un
+    cliente.
+    """
+    if isinstance(world, GestorSalas):
+        salas, gestor = world.salas, world
+    else:
+        salas, gestor = {SALA_POR_DEFECTO: world}, None
+    try:
+        asyncio.run(servidor_async(salas, host, puerto, backlog, gestor, puerto_stats, frecuencia, espera_lenta))
+    except KeyboardInterrupt:
+        log.info("Servidor detenido por el usuario.")
 
 def main():
-    # Inicializar pygame y el mixer necesarios para la simulación
-    pygame.init()
-    pygame.mixer.init()
+    parser = argparse.ArgumentParser(description="Servidor de la simulación del mosquito.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8809)
+    parser.add_argument("--backlog", type=int, default=1024,
+                        help="conexiones pendientes de aceptar que admite el socket")
+    parser.add_argument("--salas", type=int, default=1,
+                        help="número de salas; con más de una se simulan en procesos aparte")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="procesos trabajadores para las salas (por defecto, uno por núcleo)")
+    parser.add_argument("--puerto-stats", type=int, default=None,
+                        help="puerto local de métricas y perfilador (p. ej. 8810); desactivado por defecto")
+    parser.add_argument("--mosquitos", type=int, default=1,
+                        help="mosquitos por mundo (se simulan juntos, por lotes)")
+    parser.add_argument("--frecuencia", type=int, default=FRECUENCIAS[0], choices=FRECUENCIAS,
+                        help="envíos por segundo a cada cliente (cada uno puede bajarla con RATE <hz>)")
+    parser.add_argument("--espera-lenta", type=float, default=5.0,
+                        help="segundos sin leer tras los que se desconecta a un cliente")
+    parser.add_argument("--grabar", default=None,
+                        help="grabar cada tick en este fichero (con salas, uno por sala: <fichero>.<sala>)")
+    parser.add_argument("--checkpoints", default=None, metavar="DIRECTORIO",
+                        help="guardar checkpoints periódicos del mundo en este directorio")
+    parser.add_argument("--intervalo-checkpoint", type=float, default=30.0,
+                        help="segundos entre checkpoints")
+    parser.add_argument("--restore", action="store_true",
+                        help="continuar desde el checkpoint más reciente de --checkpoints")
+    parser.add_argument("--log-nivel", default="INFO",
+                        help="nivel mínimo de registro (DEBUG, INFO, WARNING...); DEBUG incluye cada aparición")
+    parser.add_argument("--log", default=None,
+                        help="fichero en el que escribir también el registro en JSON lines (por defecto, sólo consola)")
+    args = parser.parse_args()
+    if args.mosquitos < 1:
+        parser.error("--mosquitos debe ser al menos 1")
+    if args.restore and not args.checkpoints:
+        parser.error("--restore necesita --checkpoints")
+    if args.checkpoints and args.salas > 1:
+        parser.error("los checkpoints sólo están disponibles con una sala")
+    # Registro escrito desde un hilo aparte, nunca con world.lock tomado
+    configurar_registro(args.log_nivel, fichero=args.log or None)
+    try:
+        ejecutar(args)
+    finally:
+        detener_registro()
+
+def ejecutar(args):
+    """Arranca las salas (o el mundo local) y el servidor según los argumentos de main()."""
+    if args.salas > 1:
+        # Salas "0" .. "N-1" repartidas entre procesos; cada uno con su bucle de ticks
+        gestor = GestorSalas(args.salas, args.procesos, window_size=(600,600), tasa_limpeza=1000,
+                             velocidad_base=10, grabacion=args.grabar, n_mosquitos=args.mosquitos)
+        gestor.iniciar()
+        try:
+            iniciar_servidor(gestor, host=args.host, puerto=args.puerto, backlog=args.backlog,
+                             puerto_stats=args.puerto_stats, frecuencia=args.frecuencia,
+                             espera_lenta=args.espera_lenta)
+        finally:
+            gestor.detener()
+        return
 
-    # Cargar el sonido para "mosquito_bite"
-    bite_sound = pygame.mixer.Sound("mosquito_bite.mp3")
-    bite_sound.set_volume(1.0)
-    
     # Instanciar el mundo de simulación
-    world = RoombaWorld(window_size=(600,600), tasa_limpeza=1000, velocidad_base=10)
+    world = RoombaWorld(window_size=(600,600), tasa_limpeza=1000, velocidad_base=10, grabacion=args.grabar,
+                        n_mosquitos=args.mosquitos)
+    guardado = None
+    if args.checkpoints:
+        if args.restore:
+            ruta = checkpoints.ultimo(args.checkpoints)
+            if ruta is None:
+                log.warning("No hay checkpoints en %s; se empieza de cero.", args.checkpoints)
+            else:
+                inicio = time.perf_counter()
+                world.restaurar(checkpoints.cargar(ruta))
+                log.info("Restaurado %s (tick %d, %d personas) en %.1f ms", ruta, world.seq,
+                         len(world.particulas), (time.perf_counter() - inicio) * 1000)
+        guardado = checkpoints.GuardadoPeriodico(world, args.checkpoints, args.intervalo_checkpoint)
+        guardado.iniciar()
     
-    # Iniciar el hilo de movimiento del mosquito
-    mosquito_thread = threading.Thread(target=world.mover_mosquito, args=(bite_sound,), daemon=True)
+    # Iniciar el hilo de simulación (mosquito y aparición de gente); sus eventos se reenvían a los clientes
+    mosquito_thread = threading.Thread(target=world.mover_mosquito, daemon=True)
     mosquito_thread.start()
     
-    # Iniciar hilos para generar partículas ("dust") en cada zona
-    dust_stop_events = {}
-    dust_threads = []
-    for zona in world.zonas:
-        stop_event = threading.Event()
-        dust_stop_events[zona] = stop_event
-        t = threading.Thread(target=world.generar_dust, args=(zona, stop_event, world.level), daemon=True)
-        t.start()
-        dust_threads.append(t)
-    
     # Iniciar el servidor TCP que envía el estado del mundo
-    iniciar_servidor(world, host="127.0.0.1", puerto=8809)
+    iniciar_servidor(world, host=args.host, puerto=args.puerto, backlog=args.backlog,
+                     puerto_stats=args.puerto_stats, frecuencia=args.frecuencia,
+                     espera_lenta=args.espera_lenta)
     
     # Si se interrumpe, detener hilos
     world.mosquito_stop_event.set()
-    for e in dust_stop_events.values():
-        e.set()
     mosquito_thread.join()
-    for t in dust_threads:
-        t.join()
+    if guardado is not None:
+        guardado.detener()
+    world.detener_grabacion()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,303 @@
+import itertools
+import json
+import time
+import numpy as np
+import protocolo
+from eventos import eventos_desde
+from particulas import RejillaFija
+
+# ==============================================================
+# SNAPSHOTS INMUTABLES DEL MUNDO (CODIFICADOS UNA SOLA VEZ)
+# ==============================================================
+
+def combinar_cambios(registro, base, seq):
+    """
+    Combina los cambios de un registro [(seq, añadidas, eliminadas), ...] de
+    los ticks posteriores a `base` hasta `seq`. Devuelve (añadidas,
+    eliminadas): las partículas añadidas que siguen vivas como
+    {id: (x, y, zona)} y todos los ids eliminados en ese intervalo, de modo
+    que aplicarlo sobre cualquier estado intermedio da el estado en `seq`.
+    Devuelve None si `base` ya no está en el registro.
+    """
+    if base >= seq:
+        return {}, []
+    if not registro or registro[0][0] > base + 1:
+        return None
+    añadidas = {}
+    eliminadas = []
+    inicio = base + 1 - registro[0][0]
+    for _, nuevas, quitadas in itertools.islice(registro, inicio, None):
+        for pid, x, y, zona in nuevas:
+            añadidas[pid] = (x, y, zona)
+        for pid in quitadas:
+            añadidas.pop(pid, None)
+            eliminadas.append(pid)
+    return añadidas, eliminadas
+
+class ColumnasPublicadas:
+    """
+    Columnas de partículas publicadas en uno o varios snapshots seguidos.
+    Bajo world.lock sólo se copian las filas que cambiaron desde la
+    publicación anterior (AlmacenParticulas.copiar_cambios); las columnas
+    completas se montan la primera vez que alguien las pide, ya fuera del
+    lock (hilo de red o del renderizador), aplicando esos cambios sobre las
+    de la publicación anterior ya montada más cercana.
+    """
+
+    def __init__(self, conteos, n, filas, columnas, base, tam_celda):
+        conteos.flags.writeable = False
+        self.conteos = conteos
+        self.n = n
+        self.tam_celda = tam_celda
+        self._rejilla = None
+        if filas is None:
+            self._base = None
+            self._cambios = None
+            self._columnas = (conteos, *columnas)
+        else:
+            self._base = base
+            self._cambios = (filas, columnas)
+            self._columnas = None
+
+    def columnas(self):
+        """(conteos, x, y, zona, ids), de sólo lectura."""
+        if self._columnas is None:
+            # Cadena de publicaciones sin montar hasta la última montada (se lee
+            # _base antes que _columnas porque otro hilo puede estar montándolas)
+            cadena = []
+            publicadas = self
+            while True:
+                base = publicadas._base
+                if publicadas._columnas is not None:
+                    break
+                cadena.append(publicadas)
+                publicadas = base
+            columnas = []
+            for i, anterior in enumerate(publicadas._columnas[1:]):
+                columna = np.empty(self.n, dtype=anterior.dtype)
+                m = min(self.n, len(anterior))
+                columna[:m] = anterior[:m]
+                for cambios in reversed(cadena):
+                    filas, valores = cambios._cambios
+                    dentro = filas < self.n
+                    columna[filas[dentro]] = valores[i][dentro]
+                columna.flags.writeable = False
+                columnas.append(columna)
+            self._columnas = (self.conteos, *columnas)
+            # Ya no hace falta la publicación anterior (y así no se acumulan en memoria)
+            self._base = None
+        return self._columnas
+
+    def rejilla(self):
+        """Índice espacial (RejillaFija), construido la primera vez que se pide."""
+        if self._rejilla is None:
+            _, xs, ys, _, _ = self.columnas()
+            self._rejilla = RejillaFija(xs, ys, self.tam_celda)
+        return self._rejilla
+
+class Snapshot:
+    """
+    Captura inmutable y versionada (por seq) del mundo al final de un tick.
+    La publica la propia simulación con un simple cambio de referencia
+    (world.snapshot), así que el renderizador y la red la leen sin tomar
+    world.lock. Las columnas de partículas se copian sólo si cambiaron desde
+    el snapshot anterior, y sólo las filas que cambiaron (copy-on-write,
+    ver ColumnasPublicadas); si no, se comparten con él.
+    Cada codificación (JSON, binaria, fotograma clave o delta desde una base)
+    se calcula una sola vez y todas las conexiones envían los mismos bytes.
+    """
+
+    def __init__(self, world, anterior=None):
+        particulas = world.particulas
+        self.seq = world.seq
+        self.tiempo = world.tiempo
+        # Instante de publicación en el reloj de pared, para medir la latencia en los clientes
+        self.publicado = time.time()
+        self.mosquito_pos = tuple(world.mosquito_pos)
+        self.mosquito_vel = tuple(world.mosquito_vel)
+        # Posiciones de todos los mosquitos (la primera es mosquito_pos), array (n, 2) de sólo lectura
+        self.mosquitos = np.array(world.mosquitos, dtype=np.float64)
+        self.mosquitos.flags.writeable = False
+        self.level = world.level
+        # jugador -> (x, y, última entrada aplicada); el mismo objeto que en el
+        # snapshot anterior si ningún jugador ha cambiado
+        self.jugadores = {jugador: (x, y, world.ultima_entrada.get(jugador, 0))
+                          for jugador, (x, y) in world.jugadores.items()}
+        self._columnas_jugadores = None
+        if anterior is not None and anterior.jugadores == self.jugadores:
+            self.jugadores = anterior.jugadores
+            self._columnas_jugadores = anterior._columnas_jugadores
+        self.zone_rects = world.zone_rects
+        self.indice_zona = particulas.indice_zona
+        self.tam_celda = particulas.tam_celda
+        self.version_particulas = particulas.version
+        if anterior is not None and anterior.version_particulas == particulas.version \
+                and anterior.indice_zona is particulas.indice_zona:
+            self._particulas = anterior._particulas
+        else:
+            mismo_almacen = anterior is not None and anterior.indice_zona is particulas.indice_zona
+            base = anterior._particulas if mismo_almacen else None
+            self._particulas = ColumnasPublicadas(
+                *particulas.copiar_cambios(anterior.version_particulas if mismo_almacen else None),
+                base, self.tam_celda)
+        self._registro = tuple(world.cambios)
+        self._eventos = tuple(world.eventos)
+        self._por_zona = None
+        self._codificados = {}
+
+    @property
+    def conteos(self):
+        return self._particulas.conteos.tolist()
+
+    def __len__(self):
+        return self._particulas.n
+
+    def columnas(self):
+        """Columnas de partículas (conteos, x, y, zona, ids), de sólo lectura."""
+        return self._particulas.columnas()
+
+    def mismas_particulas(self, otro):
+        """True si `otro` comparte las columnas de partículas de este snapshot."""
+        return otro is not None and otro._particulas is self._particulas
+
+    def particulas(self):
+        """Partículas como {id: (x, y, zona)}."""
+        _, xs, ys, zonas, ids = self.columnas()
+        nombres = list(self.indice_zona)
+        return dict(zip(ids.tolist(), zip(xs.tolist(), ys.tolist(), (nombres[z] for z in zonas.tolist()))))
+
+    def columnas_jugadores(self):
+        """(ids ordenados, valores (n, 3) con x, y y última entrada) de los jugadores, de sólo lectura."""
+        if self._columnas_jugadores is None:
+            ids = np.array(sorted(self.jugadores), dtype=np.int64)
+            valores = np.array([self.jugadores[jugador] for jugador in ids.tolist()],
+                               dtype=np.float64).reshape(-1, 3)
+            ids.flags.writeable = valores.flags.writeable = False
+            self._columnas_jugadores = (ids, valores)
+        return self._columnas_jugadores
+
+    def rejilla(self):
+        """Índice espacial (RejillaFija) de las partículas, construido la primera vez que se pide."""
+        return self._particulas.rejilla()
+
+    def subconjunto(self, filas):
+        """(conteos, xs, ys, zonas, ids) de las filas indicadas, ordenadas por zona."""
+        _, xs, ys, zonas, ids = self.columnas()
+        filas = filas[np.argsort(zonas[filas], kind='stable')]
+        conteos = np.bincount(zonas[filas], minlength=len(self.indice_zona)).tolist()
+        return conteos, xs[filas], ys[filas], zonas[filas], ids[filas]
+
+    def cambios_desde(self, base):
+        """Cambios de partículas (añadidas, eliminadas) desde el tick `base`, o None (ver combinar_cambios)."""
+        return combinar_cambios(self._registro, base, self.seq)
+
+    def eventos_desde(self, base):
+        """Eventos (eventos.Evento) de los ticks posteriores a `base` que siguen en el registro."""
+        return eventos_desde(self._eventos, base)
+
+    def eventos_codificados(self, base):
+        """Trama TIPO_EVENTOS con los eventos posteriores a `base`, o None si no hay ninguno."""
+        clave = ("eventos", base)
+        if clave not in self._codificados:
+            eventos = self.eventos_desde(base)
+            self._codificados[clave] = memoryview(protocolo.codificar_eventos(eventos, self.indice_zona)) \
+                if eventos else None
+        return self._codificados[clave]
+
+    def columnas_por_zona(self):
+        """(xs, ys, ids) ordenados por zona, calculados una vez por snapshot."""
+        if self._por_zona is None:
+            _, xs, ys, zonas, ids = self.columnas()
+            orden = np.argsort(zonas, kind='stable')
+            self._por_zona = (xs[orden], ys[orden], ids[orden])
+        return self._por_zona
+
+    def _codificado(self, clave, construir):
+        mensaje = self._codificados.get(clave)
+        if mensaje is None:
+            mensaje = self._codificados[clave] = memoryview(construir())
+        return mensaje
+
+    def cola(self):
+        """
+        Cola común a todas las tramas: instante del tick, totales, instante
+        de publicación y el resto de mosquitos. Los jugadores no van en ella,
+        sino en la trama TIPO_JUGADORES de cada conexión (interes.py).
+        """
+        return self._codificado("cola", lambda: protocolo.codificar_cola(
+            self.tiempo, self.conteos, self.publicado, self.mosquitos[1:]))
+
+    def dust_particles(self):
+        """Partículas con la forma {zona: [(x, y), ...]}."""
+        xs, ys, _ = self.columnas_por_zona()
+        xs, ys = xs.tolist(), ys.tolist()
+        resultado = {}
+        inicio = 0
+        for zona, n in zip(self.zone_rects, self.conteos):
+            resultado[zona] = list(zip(xs[inicio:inicio + n], ys[inicio:inicio + n]))
+            inicio += n
+        return resultado
+
+    def estado(self):
+        """Estado con la forma del JSON clásico enviado a los clientes."""
+        return {
+            "mosquito_pos": list(self.mosquito_pos),
+            "mosquito_vel": list(self.mosquito_vel),
+            "mosquitos": self.mosquitos.tolist(),
+            "dust_particles": self.dust_particles(),
+            "level": self.level,
+            "zone_rects": self.zone_rects,
+            "tiempo": self.tiempo,
+            "publicado": self.publicado,
+        }
+
+    def json(self):
+        """Estado en JSON sin tramas (clientes antiguos)."""
+        return self._codificado("json", lambda: json.dumps(self.estado()).encode())
+
+    def binario(self):
+        """Trama TIPO_ESTADO (protocolo v2)."""
+        xs, ys, _ = self.columnas_por_zona()
+        return self._codificado("binario", lambda: protocolo.codificar_estado(
+            self.mosquito_pos, self.mosquito_vel, self.level, self.zone_rects,
+            self.conteos, xs, ys, self.cola()))
+
+    def clave(self):
+        """Fotograma clave (protocolo v3)."""
+        xs, ys, ids = self.columnas_por_zona()
+        return self._codificado("clave", lambda: protocolo.codificar_clave(
+            self.seq, self.mosquito_pos, self.mosquito_vel, self.level, self.zone_rects,
+            self.conteos, xs, ys, ids, self.cola()))
+
+    def binario_filas(self, filas, clave=None):
+        """
+        Trama TIPO_ESTADO (v2) sólo con las partículas de `filas`; la cola
+        lleva igualmente los totales por zona. Con `clave` (hashable) se
+        codifica una sola vez para todas las conexiones que la pidan.
+        """
+        def construir():
+            conteos, xs, ys, _, _ = self.subconjunto(filas)
+            return protocolo.codificar_estado(self.mosquito_pos, self.mosquito_vel, self.level,
+                                              self.zone_rects, conteos, xs, ys, self.cola())
+        return memoryview(construir()) if clave is None else self._codificado(("binario", clave), construir)
+
+    def clave_filas(self, filas, clave=None):
+        """Fotograma clave (v3) sólo con las partículas de `filas` (ver binario_filas)."""
+        def construir():
+            conteos, xs, ys, _, ids = self.subconjunto(filas)
+            return protocolo.codificar_clave(self.seq, self.mosquito_pos, self.mosquito_vel, self.level,
+                                             self.zone_rects, conteos, xs, ys, ids, self.cola())
+        return memoryview(construir()) if clave is None else self._codificado(("clave", clave), construir)
+
+    def delta(self, base):
+        """Delta desde `base` (protocolo v3), o None si `base` ya no está en el registro."""
+        clave = ("delta", base)
+        if clave not in self._codificados:
+            cambios = self.cambios_desde(base)
+            if cambios is None:
+                return None
+            añadidas, eliminadas = cambios
+            self._codificado(clave, lambda: protocolo.codificar_delta(
+                self.seq, base, self.mosquito_pos, self.mosquito_vel, self.level,
+                self.indice_zona, añadidas, eliminadas, self.cola()))
+        return self._codificados[clave]
@@ -0,0 +1,41 @@
+import logging
+import pygame
+from eventos import APLASTADO, PICADA
+
+# ==============================================================
+# SONIDOS DE LOS EVENTOS (SÓLO EN LOS RENDERIZADORES)
+# ==============================================================
+
+log = logging.getLogger("roomba.sonidos")
+
+# Sonido de cada tipo de evento; los demás no suenan
+FICHEROS = {
+    PICADA: "mosquito_bite.mp3",
+    APLASTADO: "squash.mp3",
+}
+
+class SonidosEventos:
+    """
+    Reproduce el sonido de cada tipo de evento recibido (eventos.py), una
+    vez por tipo y llamada aunque lleguen varios del mismo. Si no hay
+    dispositivo de audio, queda en silencio en lugar de fallar.
+    """
+
+    def __init__(self, ficheros=FICHEROS, volumen=1.0):
+        self.sonidos = {}
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            for tipo, fichero in ficheros.items():
+                sonido = pygame.mixer.Sound(fichero)
+                sonido.set_volume(volumen)
+                self.sonidos[tipo] = sonido
+        except pygame.error as e:
+            log.warning("Sin sonido: %s", e)
+            self.sonidos = {}
+
+    def reproducir(self, eventos):
+        for tipo in {evento.tipo for evento in eventos}:
+            sonido = self.sonidos.get(tipo)
+            if sonido is not None:
+                sonido.play()
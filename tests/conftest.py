@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Los módulos del juego están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sin ventana ni audio: pygame sólo se importa en las pruebas que dibujan
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
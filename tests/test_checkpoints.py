@@ -0,0 +1,44 @@
+import copy
+import os
+import checkpoints
+from roomba import RoombaWorld
+
+def _con_seq(world, seq):
+    estado = world.estado_checkpoint()
+    estado = dict(estado, escalares=copy.deepcopy(estado["escalares"]))
+    estado["escalares"]["seq"] = seq
+    return estado
+
+def test_ejecucion_nueva_en_directorio_con_checkpoints_de_seq_mayor(tmp_path):
+    directorio = str(tmp_path)
+    viejo = RoombaWorld(verbose=False, seed=1)
+    antiguos = [checkpoints.guardar(_con_seq(viejo, seq), directorio) for seq in (4000, 5000)]
+
+    # Arranque sin restaurar: el seq vuelve a empezar desde abajo
+    world = RoombaWorld(verbose=False, seed=2)
+    for _ in range(100):
+        world.step()
+    guardado = checkpoints.GuardadoPeriodico(world, directorio, conservar=2)
+    nuevos = []
+    for _ in range(3):
+        world.step()
+        nuevos.append(guardado.guardar_ahora())
+
+    assert checkpoints.listar(directorio) == nuevos[-2:]
+    assert checkpoints.ultimo(directorio) == nuevos[-1]
+    assert not any(os.path.exists(ruta) for ruta in antiguos)
+    assert checkpoints.cargar(checkpoints.ultimo(directorio))["escalares"]["seq"] == world.seq
+
+def test_restaurar_continua_igual(tmp_path):
+    original = RoombaWorld(verbose=False, seed=3, n_mosquitos=3)
+    for _ in range(50):
+        original.step()
+    ruta = checkpoints.guardar(original.estado_checkpoint(), str(tmp_path))
+    copia = RoombaWorld(verbose=False, seed=99)
+    copia.restaurar(checkpoints.cargar(ruta))
+    for _ in range(50):
+        original.step()
+        copia.step()
+    assert copia.seq == original.seq
+    assert copia.snapshot.particulas() == original.snapshot.particulas()
+    assert copia.snapshot.mosquitos.tolist() == original.snapshot.mosquitos.tolist()
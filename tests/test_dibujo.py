@@ -0,0 +1,44 @@
+import pygame
+import pytest
+from dibujo import Escena
+
+TAM = (200, 160)
+
+@pytest.fixture(scope="module", autouse=True)
+def pantalla():
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode(TAM)
+    yield
+    pygame.quit()
+
+def _sprite():
+    # Semitransparente, para que un blit de más se note en los píxeles
+    sprite = pygame.Surface((8, 8), pygame.SRCALPHA)
+    pygame.draw.circle(sprite, (240, 200, 60, 128), (4, 4), 4)
+    return sprite
+
+def _escena(rectangulos_sucios):
+    escena = Escena(pygame.Surface(TAM), pygame.font.Font(None, 16), _sprite(), rectangulos_sucios)
+    escena.fijar_zonas({"salon": (10, 10, 120, 100)})
+    return escena
+
+def test_quitar_y_añadir_en_el_mismo_lote_igual_que_redibujar_todo():
+    # Rejilla de gente sin solapes; cada nueva cae encima de una quitada
+    iniciales = {pid: (10 + 20 * (pid % 9), 10 + 20 * (pid // 9), "salon") for pid in range(63)}
+    eliminadas = list(range(0, 63, 3))
+    añadidas = {100 + pid: (iniciales[pid][0] + 3, iniciales[pid][1] + 2, "salon") for pid in eliminadas}
+
+    incremental = _escena(True)
+    incremental.fijar_particulas(iniciales)
+    incremental.dibujar([])
+    incremental.cambiar_particulas(añadidas, eliminadas)
+    assert incremental.dibujar([]) != [incremental.screen.get_rect()]
+
+    finales = {pid: p for pid, p in iniciales.items() if pid not in eliminadas}
+    finales.update(añadidas)
+    completa = _escena(False)
+    completa.fijar_particulas(finales)
+    completa.dibujar([])
+
+    assert pygame.image.tostring(incremental.screen, "RGB") == pygame.image.tostring(completa.screen, "RGB")
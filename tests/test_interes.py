@@ -0,0 +1,47 @@
+import protocolo
+from interes import MAX_JUGADORES, RADIO_JUGADORES, AreaInteres, ReplicadorJugadores
+from roomba import RoombaWorld
+
+def _mundo_con_jugadores(posiciones):
+    world = RoombaWorld(verbose=False, seed=1)
+    world.jugadores = dict(posiciones)
+    world.publicar()
+    return world
+
+def _recibidos(trama):
+    tipo, cuerpo = next(iter(protocolo.DecodificadorTramas().alimentar(trama)))
+    assert tipo == protocolo.TIPO_JUGADORES
+    return protocolo.decodificar_jugadores(cuerpo)
+
+def test_sin_area_solo_los_cercanos_al_suyo():
+    world = _mundo_con_jugadores({1: (100, 100), 2: (100 + RADIO_JUGADORES - 1, 100),
+                                  3: (100 + RADIO_JUGADORES + 1, 100), 4: (500, 500)})
+    jugadores, eliminados = _recibidos(ReplicadorJugadores().siguiente_trama(world.snapshot, 1))
+    assert sorted(jugadores) == [1, 2]
+    assert eliminados == []
+
+def test_sin_area_y_sin_jugador_propio_no_recibe_ninguno():
+    world = _mundo_con_jugadores({2: (100, 100), 3: (110, 100)})
+    assert ReplicadorJugadores().siguiente_trama(world.snapshot, 1) is None
+
+def test_como_mucho_max_jugadores_los_mas_cercanos():
+    posiciones = {i: (300 + i, 300) for i in range(1, 3 * MAX_JUGADORES)}
+    world = _mundo_con_jugadores(posiciones)
+    propio = 2 * MAX_JUGADORES
+    area = AreaInteres(rect=(0, 0, 600, 600))
+    jugadores, _ = _recibidos(ReplicadorJugadores().siguiente_trama(world.snapshot, propio, area))
+    assert len(jugadores) == MAX_JUGADORES
+    assert propio in jugadores
+    assert max(abs(i - propio) for i in jugadores) <= MAX_JUGADORES // 2
+
+def test_solo_envia_los_que_cambian_y_los_que_salen():
+    world = _mundo_con_jugadores({1: (100, 100), 2: (120, 100), 3: (140, 100)})
+    replicador = ReplicadorJugadores()
+    replicador.siguiente_trama(world.snapshot, 1)
+    world.jugadores[2] = (125, 100)
+    world.jugadores[3] = (500, 500)
+    world.publicar()
+    jugadores, eliminados = _recibidos(replicador.siguiente_trama(world.snapshot, 1))
+    assert list(jugadores) == [2]
+    assert eliminados == [3]
+    assert replicador.siguiente_trama(world.snapshot, 1) is None
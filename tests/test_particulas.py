@@ -0,0 +1,74 @@
+import random
+import numpy as np
+from particulas import AlmacenParticulas
+
+ZONAS = ["salon", "cocina"]
+
+def _almacen(n, semilla=0):
+    rng = random.Random(semilla)
+    almacen = AlmacenParticulas(ZONAS, tam_celda=32, capacidad=8)
+    almacen.insertar_lote([rng.randrange(300) for _ in range(n)], [rng.randrange(300) for _ in range(n)],
+                          [rng.choice(ZONAS) for _ in range(n)])
+    return almacen
+
+def _contenido(almacen):
+    return {pid: (x, y, ZONAS[z]) for pid, x, y, z in zip(*(c[:almacen.n].tolist() for c in
+                                                            (almacen.ids, almacen.x, almacen.y, almacen.zona)))}
+
+def _comprobar(almacen, esperado):
+    """Columnas, conteos y rejilla coherentes entre sí y con {id: (x, y, zona)}."""
+    assert _contenido(almacen) == esperado
+    assert len(almacen) == len(esperado)
+    assert almacen.conteos_por_zona() == {z: sum(p[2] == z for p in esperado.values()) for z in ZONAS}
+    rejilla = {}
+    for fila in range(almacen.n):
+        celda = (int(almacen.x[fila]) // almacen.tam_celda, int(almacen.y[fila]) // almacen.tam_celda)
+        rejilla.setdefault(celda, set()).add(fila)
+    assert almacen._celdas == rejilla
+
+def test_filas_repetidas_se_eliminan_una_vez():
+    almacen = _almacen(20)
+    esperado = _contenido(almacen)
+    ids = almacen.ids[[3, 7]].tolist()
+    eliminadas = almacen.eliminar_filas([7, 3, 7, 3, 3])
+    assert sorted(pid for pid, _, _, _ in eliminadas) == sorted(ids)
+    for pid in ids:
+        del esperado[pid]
+    _comprobar(almacen, esperado)
+
+def test_ultima_fila():
+    almacen = _almacen(10)
+    esperado = _contenido(almacen)
+    pid = int(almacen.ids[9])
+    assert almacen.eliminar_filas([9]) == [(pid, *esperado.pop(pid))]
+    _comprobar(almacen, esperado)
+
+def test_todas_las_filas():
+    almacen = _almacen(50)
+    assert len(almacen.eliminar_filas(np.arange(50)[::-1])) == 50
+    _comprobar(almacen, {})
+    # Y se puede volver a llenar
+    ids = almacen.insertar_lote([5, 40], [5, 40], ZONAS)
+    _comprobar(almacen, {ids[0]: (5, 5, "salon"), ids[1]: (40, 40, "cocina")})
+
+def test_lotes_al_azar_con_copias_parciales():
+    rng = np.random.default_rng(1)
+    almacen = _almacen(300)
+    esperado = _contenido(almacen)
+    version, publicadas = None, None
+    for _ in range(20):
+        filas = rng.integers(0, almacen.n, size=rng.integers(1, 12))
+        for pid, x, y, zona in almacen.eliminar_filas(filas):
+            assert esperado.pop(pid) == (x, y, zona)
+        _comprobar(almacen, esperado)
+        # Las filas copiadas sobre la publicación anterior dan las columnas actuales
+        _, n, filas_copiadas, columnas = almacen.copiar_cambios(version)
+        version = almacen.version
+        if filas_copiadas is None:
+            publicadas = [columna.copy() for columna in columnas]
+        else:
+            publicadas = [columna[:n].copy() for columna in publicadas]
+            for columna, valores in zip(publicadas, columnas):
+                columna[filas_copiadas] = valores
+        for columna, actual in zip(publicadas, (almacen.x, almacen.y, almacen.zona, almacen.ids)):
+            assert (columna == actual[:almacen.n]).all()
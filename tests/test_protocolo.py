@@ -0,0 +1,79 @@
+import struct
+import numpy as np
+import pytest
+import protocolo
+
+ZONAS = {"salon": (0, 0, 300, 300), "cocina": (300, 0, 300, 300)}
+
+def _clave():
+    return protocolo.codificar_clave(7, (10.0, 20.0), (1.0, -1.0), 2, ZONAS, [2, 1],
+                                     np.array([5, 6, 400]), np.array([7, 8, 9]), np.array([1, 2, 3]),
+                                     protocolo.codificar_cola(1.5, [2, 1], 3.0))
+
+def _delta():
+    return protocolo.codificar_delta(8, 7, (11.0, 20.0), (1.0, -1.0), 2, {"salon": 0, "cocina": 1},
+                                     {4: (50, 60, "cocina")}, [2], protocolo.codificar_cola(1.55, [1, 2], 3.05))
+
+def _flujo():
+    return [protocolo.codificar_jugador(3), _clave(), protocolo.codificar_comando("MOVE LEFT"),
+            protocolo.codificar_ack(7), protocolo.enmarcar(protocolo.TIPO_EVENTOS, b""), _delta()]
+
+def _esperadas(tramas):
+    return [(trama[4], trama[5:]) for trama in tramas]
+
+def test_byte_a_byte_igual_que_de_una_vez():
+    tramas = _flujo()
+    datos = b"".join(tramas)
+    decodificador = protocolo.DecodificadorTramas()
+    recibidas = []
+    for i in range(len(datos)):
+        recibidas += decodificador.alimentar(datos[i:i + 1])
+    assert recibidas == _esperadas(tramas)
+    assert recibidas == protocolo.DecodificadorTramas().alimentar(datos)
+
+def test_trama_completa_sale_con_su_ultimo_byte():
+    trama = _clave()
+    decodificador = protocolo.DecodificadorTramas()
+    assert decodificador.alimentar(trama[:-1]) == []
+    assert decodificador.alimentar(trama[-1:]) == _esperadas([trama])
+    _, cabecera, particulas = protocolo.decodificar_clave(trama[5:])
+    assert particulas == {1: (5, 7, "salon"), 2: (6, 8, "salon"), 3: (400, 9, "cocina")}
+    assert cabecera["level"] == 2
+
+def test_longitud_demasiado_grande_con_solo_la_cabecera():
+    decodificador = protocolo.DecodificadorTramas()
+    with pytest.raises(ValueError, match="demasiado grande"):
+        decodificador.alimentar(struct.pack("!IB", protocolo.MAX_TRAMA + 1, protocolo.TIPO_CLAVE))
+
+def test_longitud_demasiado_grande_tras_tramas_validas():
+    datos = b"".join(_flujo()) + struct.pack("!IB", 0xFFFFFFFF, protocolo.TIPO_DELTA) + b"basura"
+    decodificador = protocolo.DecodificadorTramas()
+    with pytest.raises(ValueError, match="demasiado grande"):
+        for i in range(len(datos)):
+            decodificador.alimentar(datos[i:i + 1])
+
+def test_longitud_mayor_que_el_cuerpo_espera_al_resto():
+    trama = protocolo.codificar_ack(7)
+    corrupta = struct.pack("!IB", 4096, protocolo.TIPO_ACK) + trama[5:]
+    decodificador = protocolo.DecodificadorTramas()
+    assert decodificador.alimentar(corrupta + _clave()) == []
+
+def test_longitud_menor_corta_el_cuerpo_y_desalinea_lo_siguiente():
+    trama = _clave()
+    corrupta = struct.pack("!IB", 12, protocolo.TIPO_CLAVE) + trama[5:]
+    decodificador = protocolo.DecodificadorTramas()
+    tipo, cuerpo = decodificador.alimentar(corrupta[:17])[0]
+    assert (tipo, len(cuerpo)) == (protocolo.TIPO_CLAVE, 12)
+    with pytest.raises(struct.error):
+        protocolo.decodificar_clave(cuerpo)
+    # El resto del cuerpo se lee como cabecera, con una longitud absurda
+    with pytest.raises(ValueError, match="demasiado grande"):
+        decodificador.alimentar(corrupta[17:])
+
+def test_cola_sin_terminar_se_queda_pendiente():
+    # Bytes sueltos tras la última trama: no sale nada hasta completarla
+    tramas = _flujo()
+    siguiente = protocolo.codificar_ack(9)
+    decodificador = protocolo.DecodificadorTramas()
+    assert decodificador.alimentar(b"".join(tramas) + siguiente[:3]) == _esperadas(tramas)
+    assert decodificador.alimentar(siguiente[3:]) == _esperadas([siguiente])
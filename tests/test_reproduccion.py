@@ -0,0 +1,10 @@
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_se_importa_sin_pygame():
+    # El camino --servir no dibuja: no debe necesitar pygame
+    codigo = "import sys; sys.modules['pygame'] = None; import reproduccion"
+    subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, check=True)
@@ -0,0 +1,70 @@
+from benchmark import crear_mundo
+from red_cliente import ReceptorEstado
+from replicacion import ReplicadorCliente
+from salas import VIGENCIA_PEDIDOS, LoteTrabajador, SalaRemota, _tick
+
+class _Tuberia:
+    def __init__(self):
+        self.enviados = []
+
+    def send(self, mensaje):
+        self.enviados.append(mensaje)
+
+def _sala_y_trabajador(n_particulas):
+    """Una SalaRemota y una función que hace un tick como ejecutar_salas, sin procesos."""
+    world = crear_mundo(n_particulas)
+    world.level = 5
+    lote = LoteTrabajador(_Tuberia())
+    pedidos = {}
+    sala = SalaRemota("0", (world.zone_rects, world.particulas.zonas, world.particulas.tam_celda,
+                            _tick(world, pedidos, 0.0)), lote)
+
+    def tick():
+        lote.enviar()
+        for _, _, _, formatos in lote.conexion.enviados:
+            for _, formato in formatos:
+                pedidos[formato] = world.seq + (1 if formato == "clave" else VIGENCIA_PEDIDOS)
+        lote.conexion.enviados.clear()
+        world.step()
+        sala.aplicar_tick(_tick(world, pedidos, 0.0))
+    return world, sala, lote, tick
+
+def test_clientes_v3_a_distintas_frecuencias_reciben_el_mundo_exacto():
+    world, sala, _, tick = _sala_y_trabajador(3000)
+    clientes = [(ReplicadorCliente(), ReceptorEstado(), cada) for cada in (1, 4, 7)]
+    comprobados = 0
+    for i in range(1, 250):
+        tick()
+        for replicador, receptor, cada in clientes:
+            if i % cada:
+                continue
+            trama = replicador.siguiente_trama(sala.snapshot)
+            if trama is None:
+                continue
+            receptor.alimentar(bytes(trama))
+            replicador.confirmar(receptor.replica.seq)
+            if receptor.replica.seq == world.seq:
+                assert receptor.replica.particulas == world.snapshot.particulas()
+                comprobados += 1
+    assert comprobados > 250 / 7
+
+def test_sin_clientes_no_se_piden_tramas_ni_particulas():
+    world, sala, lote, tick = _sala_y_trabajador(500)
+    for _ in range(5):
+        tick()
+    assert lote.pedidos == set()
+    assert set(sala.snapshot._tramas) == {"delta"}
+
+def test_entradas_y_bajas_en_un_solo_mensaje_por_tick():
+    _, sala, lote, _ = _sala_y_trabajador(10)
+    for paso in range(3):
+        sala.entradas.acumular(7, dx=1, entrada=paso)
+    sala.entradas.baja(8)
+    assert lote.conexion.enviados == []
+    lote.enviar()
+    assert len(lote.conexion.enviados) == 1
+    _, entradas, bajas, _ = lote.conexion.enviados[0]
+    assert [e[-1] for e in entradas] == [0, 1, 2]
+    assert bajas == [("0", 8)]
+    lote.enviar()
+    assert len(lote.conexion.enviados) == 1
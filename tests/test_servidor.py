@@ -0,0 +1,32 @@
+import protocolo
+import servidor
+
+class _Escritor:
+    def get_extra_info(self, nombre):
+        return ("127.0.0.1", 0)
+
+class _Sala:
+    def __init__(self):
+        self.entradas = self
+
+    def acumular(self, *args):
+        pass
+
+def _conexion(frecuencia):
+    return servidor.Conexion(None, _Escritor(), 3, _Sala(), frecuencia)
+
+def test_rate_puede_bajar_la_frecuencia():
+    conexion = _conexion(20)
+    conexion.procesar_entrada(protocolo.codificar_comando("RATE 5"))
+    assert conexion.frecuencia == 5
+    conexion.procesar_entrada(protocolo.codificar_comando("RATE 10"))
+    assert conexion.frecuencia == 10
+
+def test_rate_no_sube_por_encima_de_la_inicial():
+    conexion = _conexion(5)
+    conexion.procesar_entrada(protocolo.codificar_comando("RATE 20"))
+    assert conexion.frecuencia == 5
+    conexion = _conexion(10)
+    conexion.procesar_entrada(protocolo.codificar_comando("RATE 5"))
+    conexion.procesar_entrada(protocolo.codificar_comando("RATE 1000"))
+    assert conexion.frecuencia == 10
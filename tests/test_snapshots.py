@@ -0,0 +1,50 @@
+import random
+from snapshots import combinar_cambios
+
+def _aplicar(estado, añadidas, eliminadas):
+    estado = dict(estado)
+    for pid in eliminadas:
+        estado.pop(pid, None)
+    estado.update(añadidas)
+    return estado
+
+def _registro(inicial, ticks, semilla=0):
+    """Registro [(seq, añadidas, eliminadas), ...] al azar y estados {id: (x, y, zona)} tras cada tick."""
+    rng = random.Random(semilla)
+    estados = [dict(inicial)]
+    registro = []
+    siguiente = max(inicial) + 1
+    for seq in range(1, ticks + 1):
+        vivas = list(estados[-1])
+        eliminadas = rng.sample(vivas, min(len(vivas), rng.randrange(4)))
+        añadidas = []
+        for _ in range(rng.randrange(4)):
+            añadidas.append((siguiente, rng.randrange(600), rng.randrange(600), rng.choice("ab")))
+            siguiente += 1
+        registro.append((seq, añadidas, eliminadas))
+        estados.append(_aplicar(estados[-1], {pid: (x, y, z) for pid, x, y, z in añadidas}, eliminadas))
+    return registro, estados
+
+def test_combinados_igual_que_uno_a_uno():
+    registro, estados = _registro({pid: (pid, pid, "a") for pid in range(20)}, 30)
+    for base in range(30):
+        for seq in range(base, 31):
+            añadidas, eliminadas = combinar_cambios(registro[:seq], base, seq)
+            # Sobre el estado de la base y sobre cualquier estado intermedio
+            for intermedio in range(base, seq + 1):
+                assert _aplicar(estados[intermedio], añadidas, eliminadas) == estados[seq]
+
+def test_añadida_y_eliminada_dentro_de_la_cadena():
+    registro = [(1, [(10, 1, 1, "a")], []),
+                (2, [(11, 2, 2, "b")], [10]),
+                (3, [], [1])]
+    añadidas, eliminadas = combinar_cambios(registro, 0, 3)
+    assert añadidas == {11: (2, 2, "b")}
+    assert sorted(eliminadas) == [1, 10]
+    assert _aplicar({1: (0, 0, "a")}, añadidas, eliminadas) == {11: (2, 2, "b")}
+
+def test_base_fuera_del_registro():
+    registro = [(5, [], [1]), (6, [], [2])]
+    assert combinar_cambios(registro, 3, 6) is None
+    assert combinar_cambios(registro, 4, 6) == ({}, [1, 2])
+    assert combinar_cambios(registro, 6, 6) == ({}, [])